@@ -59,6 +59,14 @@ class D365GeneratedItemAdmin(import_export_admin.ImportExportModelAdmin):
     ordering = ('-created_at',)
 
 
+@admin.register(models.D365WorkbookSnapshot)
+class D365WorkbookSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('path', 'status', 'file_size', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('path', 'file_mtime_ns', 'file_size', 'status', 'outputs', 'error', 'started_at', 'finished_at')
+    ordering = ('-started_at',)
+
+
 # Reference models with import/export
 @admin.register(models.HeaterMaterial)
 class HeaterMaterialAdmin(import_export_admin.ImportExportModelAdmin):
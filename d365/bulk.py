@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import Iterable, Sequence
+
+from django.db import models, transaction
+
+
+def bulk_upsert(
+    model: type[models.Model],
+    key_field: str,
+    objs: Iterable[models.Model],
+    update_fields: Sequence[str] = (),
+) -> tuple[int, int]:
+    """
+    Insert or update rows of a table keyed on a unique field.
+
+    Existing keys (with their update_fields values) are read in one query and
+    only new or changed rows are written, using a single
+    bulk_create(update_conflicts=True) inside one transaction. Later objects
+    win when the same key appears more than once.
+
+    Returns (created, updated).
+    """
+    update_fields = list(update_fields)
+    pending = {getattr(obj, key_field): obj for obj in objs}
+    if not pending:
+        return 0, 0
+
+    with transaction.atomic():
+        existing = {
+            row[0]: row[1:]
+            for row in model.objects.order_by().values_list(key_field, *update_fields)
+        }
+
+        changed: list[models.Model] = []
+        created = updated = 0
+        for key, obj in pending.items():
+            if key not in existing:
+                created += 1
+            elif existing[key] != tuple(getattr(obj, f) for f in update_fields):
+                updated += 1
+            else:
+                continue
+            changed.append(obj)
+
+        if changed:
+            if update_fields:
+                model.objects.bulk_create(
+                    changed,
+                    update_conflicts=True,
+                    unique_fields=[key_field],
+                    update_fields=update_fields,
+                )
+            else:
+                model.objects.bulk_create(changed, ignore_conflicts=True)
+
+    return created, updated
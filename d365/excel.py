@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Iterable, List, Dict, Optional, Sequence, Tuple
 
 from openpyxl import load_workbook
 from openpyxl.worksheet.worksheet import Worksheet
@@ -9,37 +9,53 @@ from openpyxl.worksheet.worksheet import Worksheet
 
 Headers = ["Item Number", "Description", "BOM", "Template", "Product Type"]
 
+MAX_ITEM_ROWS = 1000
+
 
 def load_wb_data_only(path: Path) -> object:
-    wb = load_workbook(filename=str(path), data_only=True, read_only=False)
+    # read_only streams rows instead of materialising every cell object
+    wb = load_workbook(filename=str(path), data_only=True, read_only=True)
     return wb
 
 
+def _normalize(value) -> str:
+    return str(value).strip().lower() if value is not None else ""
+
+
+def _match_headers(row: Sequence, normalized_headers: List[str]) -> Optional[int]:
+    # Return the 0-based column where the header sequence starts in this row
+    width = len(normalized_headers)
+    first = normalized_headers[0]
+    for c in range(len(row) - width + 1):
+        if _normalize(row[c]) != first:
+            continue
+        if [_normalize(v) for v in row[c:c + width]] == normalized_headers:
+            return c
+    return None
+
+
 def find_headers_region(sheet: Worksheet, headers: List[str]) -> Optional[Tuple[int, int]]:
     # Return (row_index, start_col_index) where headers start
-    max_row = sheet.max_row or 0
-    max_col = sheet.max_column or 0
     normalized_headers = [h.strip().lower() for h in headers]
-    for r in range(1, max_row + 1):
-        for c in range(1, max_col + 1):
-            values: List[str] = []
-            for offset, header in enumerate(headers):
-                cell = sheet.cell(row=r, column=c + offset)
-                values.append(str(cell.value).strip().lower() if cell.value is not None else "")
-            if values == normalized_headers:
-                return r, c
+    for r, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+        c = _match_headers(row, normalized_headers)
+        if c is not None:
+            return r, c + 1
     return None
 
 
-def read_generated_items(sheet: Worksheet) -> List[Dict[str, str]]:
-    pos = find_headers_region(sheet, Headers)
-    if not pos:
-        return []
-    header_row, start_col = pos
+def _items_from_rows(rows: Iterable[Sequence], headers: List[str]) -> List[Dict[str, str]]:
+    # Single pass: locate the header row, then read until the first blank row
+    normalized_headers = [h.strip().lower() for h in headers]
+    width = len(headers)
+    start_col: Optional[int] = None
     items: List[Dict[str, str]] = []
-    row = header_row + 1
-    while True:
-        row_vals = [sheet.cell(row=row, column=start_col + i).value for i in range(len(Headers))]
+    for row in rows:
+        if start_col is None:
+            start_col = _match_headers(row, normalized_headers)
+            continue
+        row_vals = list(row[start_col:start_col + width])
+        row_vals += [None] * (width - len(row_vals))
         if all(v in (None, "") for v in row_vals):
             break
         items.append({
@@ -49,21 +65,33 @@ def read_generated_items(sheet: Worksheet) -> List[Dict[str, str]]:
             'template': str(row_vals[3] or ''),
             'product_type': str(row_vals[4] or ''),
         })
-        row += 1
-        if row - header_row > 1000:
+        if len(items) >= MAX_ITEM_ROWS:
             break
     return items
 
 
-def read_workbook_outputs(path: Path) -> Dict[str, List[Dict[str, str]]]:
+def read_generated_items(sheet: Worksheet) -> List[Dict[str, str]]:
+    return _items_from_rows(sheet.iter_rows(values_only=True), Headers)
+
+
+def parse_workbook_outputs(path: Path) -> Dict[str, List[Dict[str, str]]]:
+    """Parse the Heater/Tank/Pump output tables straight from the workbook"""
     wb = load_wb_data_only(path)
     outputs: Dict[str, List[Dict[str, str]]] = {}
-    for name in ["Heater", "Tank", "Pump"]:
-        if name in wb.sheetnames:
-            sheet = wb[name]
-            outputs[name.lower()] = read_generated_items(sheet)
-        else:
-            outputs[name.lower()] = []
+    try:
+        for name in ["Heater", "Tank", "Pump"]:
+            if name in wb.sheetnames:
+                sheet = wb[name]
+                outputs[name.lower()] = read_generated_items(sheet)
+            else:
+                outputs[name.lower()] = []
+    finally:
+        wb.close()
     return outputs
 
 
+def workbook_signature(path: Path) -> Tuple[int, int]:
+    # Any save of the workbook changes its mtime and/or size
+    stat = Path(path).stat()
+    return stat.st_mtime_ns, stat.st_size
+
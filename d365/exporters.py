@@ -0,0 +1,176 @@
+"""
+Streaming, schema-checked export of the d365 tables.
+
+Each table is read with values_list().iterator() and written row by row to
+its own CSV while the bytes are hashed. Tables run concurrently on a thread
+pool. Each run ends with a manifest of row counts and SHA-256 checksums,
+written next to the CSVs or inside a single zip bundle.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import date
+from typing import List, Sequence, Tuple, Type
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.utils import timezone
+from import_export.resources import ModelResource
+
+from .resources import (
+    ProjectResource, D365JobResource, D365HeaterResource, D365TankResource,
+    D365PumpResource, D365StackEconomizerResource, D365GeneratedItemResource,
+)
+
+
+CHUNK_SIZE = 2000
+DEFAULT_WORKERS = 4
+MANIFEST_NAME = 'manifest.json'
+
+# (file stem, resource whose export_order defines the columns)
+EXPORT_TABLES: Sequence[Tuple[str, Type[ModelResource]]] = (
+    ('d365_projects', ProjectResource),
+    ('d365_jobs', D365JobResource),
+    ('d365_heaters', D365HeaterResource),
+    ('d365_tanks', D365TankResource),
+    ('d365_pumps', D365PumpResource),
+    ('d365_stack_economizers', D365StackEconomizerResource),
+    ('d365_generated_items', D365GeneratedItemResource),
+)
+
+
+@dataclass(frozen=True)
+class TableExport:
+    name: str
+    model: str
+    file: str
+    columns: List[str]
+    rows: int
+    sha256: str
+
+
+class _Echo:
+    """Pseudo-buffer: csv.writer hands back each formatted line"""
+
+    def write(self, value):
+        return value
+
+
+def export_columns(resource_class: Type[ModelResource]) -> List[str]:
+    meta = resource_class._meta
+    return list(meta.export_order or meta.fields)
+
+
+def check_schema(tables=EXPORT_TABLES, using='default') -> List[str]:
+    """
+    Return one message per resource column that is not a concrete model
+    field, or whose table or column is missing from the database (e.g. a
+    migration that hasn't been applied)
+    """
+    connection = connections[using]
+    errors = []
+    db_columns = {}
+    with connection.cursor() as cursor:
+        db_tables = set(connection.introspection.table_names(cursor))
+        for _, resource_class in tables:
+            model = resource_class._meta.model
+            table = model._meta.db_table
+            if table not in db_tables:
+                errors.append(f"{resource_class.__name__}: table {table} does not exist (run migrate)")
+                continue
+            if table not in db_columns:
+                db_columns[table] = {
+                    column.name for column in connection.introspection.get_table_description(cursor, table)
+                }
+            for column in export_columns(resource_class):
+                try:
+                    field = model._meta.get_field(column)
+                except FieldDoesNotExist:
+                    errors.append(f"{resource_class.__name__}: {model.__name__} has no field '{column}'")
+                    continue
+                if not field.concrete or field.many_to_many:
+                    errors.append(f"{resource_class.__name__}: '{column}' is not a column of {model.__name__}")
+                elif field.column not in db_columns[table]:
+                    errors.append(f"{resource_class.__name__}: column {table}.{field.column} does not exist (run migrate)")
+    return errors
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def write_table_csv(resource_class, path, chunk_size=CHUNK_SIZE) -> Tuple[int, str]:
+    """Stream one table to path; returns (row count, sha256 of the file)"""
+    model = resource_class._meta.model
+    columns = export_columns(resource_class)
+    writer = csv.writer(_Echo())
+    digest = hashlib.sha256()
+    rows = 0
+
+    with open(path, 'wb') as f:
+        def emit(line):
+            data = line.encode('utf-8')
+            digest.update(data)
+            f.write(data)
+
+        emit(writer.writerow(columns))
+        queryset = model.objects.order_by('pk').values_list(*columns)
+        for row in queryset.iterator(chunk_size=chunk_size):
+            emit(writer.writerow([_csv_value(value) for value in row]))
+            rows += 1
+
+    return rows, digest.hexdigest()
+
+
+def _export_table(name, resource_class, output_dir, chunk_size) -> TableExport:
+    path = os.path.join(output_dir, f"{name}.csv")
+    try:
+        rows, sha256 = write_table_csv(resource_class, path, chunk_size)
+    finally:
+        # Worker threads open their own connections; don't leave them behind
+        connections.close_all()
+    return TableExport(
+        name=name,
+        model=resource_class._meta.model.__name__,
+        file=os.path.basename(path),
+        columns=export_columns(resource_class),
+        rows=rows,
+        sha256=sha256,
+    )
+
+
+def export_tables(output_dir, workers=DEFAULT_WORKERS, chunk_size=CHUNK_SIZE,
+                  tables=EXPORT_TABLES) -> List[TableExport]:
+    """Write every table to output_dir/<name>.csv concurrently"""
+    os.makedirs(output_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [
+            pool.submit(_export_table, name, resource_class, output_dir, chunk_size)
+            for name, resource_class in tables
+        ]
+        return [future.result() for future in futures]
+
+
+def build_manifest(exports: Sequence[TableExport]) -> dict:
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'tables': [asdict(export) for export in exports],
+    }
+
+
+def write_bundle(zip_path, source_dir, exports: Sequence[TableExport], manifest: dict):
+    """Zip the exported CSVs with manifest.json"""
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for export in exports:
+            bundle.write(os.path.join(source_dir, export.file), arcname=export.file)
+        bundle.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
@@ -0,0 +1,220 @@
+"""
+Table-driven D365 item generation.
+
+Each equipment section (heater, tank, pump, ...) is described in
+item_templates.json: which model it applies to, how each placeholder is read
+and formatted from the model instance, the description format for every
+generated row and, optionally, how rows are numbered (item number, BOM and
+template patterns; DEFAULT_NUMBERING, the workbook's scheme, otherwise). The
+specs are compiled once per process; adding a new equipment type only needs
+a new entry in the JSON file.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterable
+
+from django.conf import settings
+
+
+DEFAULT_TEMPLATES_PATH = Path(__file__).with_name('item_templates.json')
+
+# D365 product type names for the labels used in the templates
+PRODUCT_TYPE_MAP = {
+    'Finished Good': 'Item',
+    'Subassembly': 'Sub Assy',
+    'Raw Material': 'Phantom',
+    'Purchased': 'Pegged Supply',
+    'Sub Assy': 'Sub Assy',
+    'Item': 'Item',
+    'Phantom': 'Phantom',
+}
+
+
+# The workbook's numbering: main row {job}-{dash} with BOM {job}-{dash}-000
+# and template FGFAB, sub rows {job}-{dash}.{seq} (or {job}-{dash}.1-{suffix}
+# for rows with an override_suffix) with template Sub Assy. A section's
+# "numbering" object overrides any of these keys. Patterns can use {job},
+# {dash}, {seq} and {suffix}; the BOM pattern also {item_number}.
+DEFAULT_NUMBERING = {
+    'default_dash': '01',
+    'main_item_number': '{job}-{dash}',
+    'sub_item_number': '{job}-{dash}.{seq}',
+    'suffix_item_number': '{job}-{dash}.1-{suffix}',
+    'bom': '{item_number}-000',
+    'main_template': 'FGFAB',
+    'sub_template': 'Sub Assy',
+    # Translate product type labels through PRODUCT_TYPE_MAP
+    'map_product_types': True,
+}
+
+
+def fmt_dim(value: float | int) -> str:
+    # Trim .0
+    try:
+        iv = int(value)
+        if float(value) == float(iv):
+            return f"{iv}"
+        return f"{value}"
+    except Exception:
+        return str(value)
+
+
+FORMATTERS: dict[str, Callable[[object], str]] = {
+    'dim': fmt_dim,
+    'upper': lambda value: (value or '').upper(),
+    'upper_strip': lambda value: (value or '').strip().upper(),
+    'text': lambda value: '' if value is None else str(value),
+}
+
+
+@dataclass(frozen=True)
+class CompiledField:
+    name: str
+    attr: str
+    fallback: str | None
+    formatter: Callable[[object], str]
+
+
+@dataclass(frozen=True)
+class CompiledRow:
+    product_type: str
+    override_suffix: str | None
+    # (conditions, bound str.format) pairs; the first matching case wins
+    cases: tuple[tuple[tuple[tuple[str, str], ...], Callable[..., str]], ...]
+
+
+@dataclass(frozen=True)
+class CompiledNumbering:
+    default_dash: str
+    main_item_number: Callable[..., str]
+    sub_item_number: Callable[..., str]
+    suffix_item_number: Callable[..., str]
+    bom: Callable[..., str]
+    main_template: Callable[..., str]
+    sub_template: Callable[..., str]
+    map_product_types: bool
+
+    def item(self, job: str, dash: str, seq: int, row: CompiledRow, description: str) -> dict:
+        placeholders = {'job': job, 'dash': dash, 'seq': seq, 'suffix': row.override_suffix or ''}
+        if seq == 0:
+            item_number = self.main_item_number(**placeholders)
+            template = self.main_template(**placeholders)
+        else:
+            number = self.suffix_item_number if row.override_suffix else self.sub_item_number
+            item_number = number(**placeholders)
+            template = self.sub_template(**placeholders)
+        product_type = row.product_type
+        if self.map_product_types:
+            product_type = PRODUCT_TYPE_MAP.get(product_type, product_type)
+        return {
+            'item_number': item_number,
+            'description': description,
+            'bom': self.bom(item_number=item_number, **placeholders),
+            'template': template,
+            'product_type': product_type or 'Item',
+        }
+
+
+@dataclass(frozen=True)
+class CompiledSection:
+    section: str
+    model: str
+    fields: tuple[CompiledField, ...]
+    rows: tuple[CompiledRow, ...]
+    numbering: CompiledNumbering
+
+    def values_for(self, instance) -> dict[str, str]:
+        values: dict[str, str] = {}
+        for field in self.fields:
+            value = getattr(instance, field.attr, None)
+            if value is None and field.fallback:
+                value = getattr(instance, field.fallback, None)
+            values[field.name] = field.formatter(value)
+        return values
+
+    def items_for(self, instance) -> list[dict]:
+        """Formatted D365 items for instance: descriptions and numbering in one pass"""
+        values = self.values_for(instance)
+        job = instance.job_number
+        dash = instance.dash_number or self.numbering.default_dash
+        items: list[dict] = []
+        for row in self.rows:
+            for conditions, fmt in row.cases:
+                if all(values.get(name) == expected for name, expected in conditions):
+                    break
+            else:
+                continue
+            items.append(self.numbering.item(job, dash, len(items), row, fmt(**values)))
+        return items
+
+
+def _compile_numbering(section: str, spec: dict) -> CompiledNumbering:
+    unknown = set(spec) - set(DEFAULT_NUMBERING)
+    if unknown:
+        raise ValueError(f"Unknown numbering keys for {section}: {', '.join(sorted(unknown))}")
+    numbering = {**DEFAULT_NUMBERING, **spec}
+    return CompiledNumbering(**{
+        key: value if key in ('default_dash', 'map_product_types') else value.format
+        for key, value in numbering.items()
+    })
+
+
+def _compile_section(section: str, spec: dict) -> CompiledSection:
+    fields = []
+    for name, field_spec in spec.get('fields', {}).items():
+        formatter = FORMATTERS.get(field_spec.get('format', 'text'))
+        if formatter is None:
+            raise ValueError(f"Unknown format '{field_spec['format']}' for {section}.{name}")
+        fields.append(CompiledField(name, field_spec['attr'], field_spec.get('fallback'), formatter))
+
+    rows = []
+    for row_spec in spec.get('rows', []):
+        description = row_spec['description']
+        if isinstance(description, str):
+            description = [{'format': description}]
+        cases = tuple(
+            (tuple((case.get('when') or {}).items()), case['format'].format)
+            for case in description
+        )
+        rows.append(CompiledRow(row_spec.get('product_type', ''), row_spec.get('override_suffix'), cases))
+
+    numbering = _compile_numbering(section, spec.get('numbering', {}))
+    return CompiledSection(section, spec['model'], tuple(fields), tuple(rows), numbering)
+
+
+@lru_cache(maxsize=None)
+def load_sections() -> dict[str, CompiledSection]:
+    """Load and compile all section specs (once per process)"""
+    path = Path(getattr(settings, 'D365_ITEM_TEMPLATES_PATH', DEFAULT_TEMPLATES_PATH))
+    with open(path, encoding='utf-8') as f:
+        specs = json.load(f)
+    return {section: _compile_section(section, spec) for section, spec in specs.items()}
+
+
+def section_for(instance) -> CompiledSection:
+    model_name = type(instance).__name__
+    for compiled in load_sections().values():
+        if compiled.model == model_name:
+            return compiled
+    raise LookupError(f"No item template defined for {model_name}")
+
+
+def generate_items(instance) -> list[dict]:
+    """Fully formatted D365 items for one equipment record"""
+    return section_for(instance).items_for(instance)
+
+
+def generate_items_many(instances: Iterable) -> list[list[dict]]:
+    """generate_items() for many records in one pass, resolving each model's spec once"""
+    compiled_by_model: dict[type, CompiledSection] = {}
+    results: list[list[dict]] = []
+    for instance in instances:
+        compiled = compiled_by_model.get(type(instance))
+        if compiled is None:
+            compiled = compiled_by_model[type(instance)] = section_for(instance)
+        results.append(compiled.items_for(instance))
+    return results
@@ -1,15 +1,16 @@
-from django.core.management.base import BaseCommand
-from django.core.files.base import ContentFile
-from d365.models import D365Job, D365Heater, D365Tank, D365Pump, D365GeneratedItem
-from d365.resources import (
-    D365JobResource, D365HeaterResource, D365TankResource, 
-    D365PumpResource, D365GeneratedItemResource
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from d365.exporters import (
+    CHUNK_SIZE, DEFAULT_WORKERS, MANIFEST_NAME,
+    build_manifest, check_schema, export_tables, write_bundle,
 )
+import json
 import os
+import tempfile
 
 
 class Command(BaseCommand):
-    help = 'Export sample data to CSV files for testing import/export functionality'
+    help = 'Export all D365 tables to CSV (or one zip bundle) with a manifest of row counts and checksums'
     
     def add_arguments(self, parser):
         parser.add_argument(
@@ -21,71 +22,55 @@ class Command(BaseCommand):
         parser.add_argument(
             '--format',
             type=str,
-            choices=['csv', 'xlsx', 'json'],
+            choices=['csv', 'zip'],
             default='csv',
-            help='Export format (default: csv)'
+            help='csv writes one file per table plus d365_manifest.json; zip writes a single bundle (default: csv)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help=f'Tables exported concurrently (default: {DEFAULT_WORKERS})'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Rows fetched from the database per round trip (default: {CHUNK_SIZE})'
         )
     
     def handle(self, *args, **options):
         output_dir = options['output_dir']
         export_format = options['format']
+        workers = options['workers']
+        chunk_size = options['chunk_size']
+        
+        # Refuse to write a backup whose columns no longer match the models or database
+        errors = check_schema()
+        if errors:
+            raise CommandError("Export columns do not match the models and database:\n  " + "\n  ".join(errors))
         
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
-        # Define resources and their corresponding models
-        resources = [
-            (D365JobResource(), D365Job, 'd365_jobs'),
-            (D365HeaterResource(), D365Heater, 'd365_heaters'),
-            (D365TankResource(), D365Tank, 'd365_tanks'),
-            (D365PumpResource(), D365Pump, 'd365_pumps'),
-            (D365GeneratedItemResource(), D365GeneratedItem, 'd365_generated_items'),
-        ]
-        
-        exported_files = []
+        if export_format == 'zip':
+            stamp = timezone.localtime().strftime('%Y%m%d_%H%M%S')
+            target = os.path.join(output_dir, f"d365_export_{stamp}.zip")
+            with tempfile.TemporaryDirectory() as staging_dir:
+                exports = export_tables(staging_dir, workers, chunk_size)
+                manifest = build_manifest(exports)
+                write_bundle(target, staging_dir, exports, manifest)
+        else:
+            exports = export_tables(output_dir, workers, chunk_size)
+            manifest = build_manifest(exports)
+            target = os.path.join(output_dir, f"d365_{MANIFEST_NAME}")
+            with open(target, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
         
-        for resource, model, filename in resources:
-            try:
-                # Get all objects from the model
-                queryset = model.objects.all()
-                
-                if queryset.exists():
-                    # Export data
-                    dataset = resource.export(queryset)
-                    
-                    # Save to file
-                    file_path = os.path.join(output_dir, f"{filename}.{export_format}")
-                    
-                    with open(file_path, 'wb') as f:
-                        if export_format == 'csv':
-                            f.write(dataset.csv.encode('utf-8'))
-                        elif export_format == 'xlsx':
-                            f.write(dataset.xlsx)
-                        elif export_format == 'json':
-                            f.write(dataset.json.encode('utf-8'))
-                    
-                    exported_files.append(file_path)
-                    self.stdout.write(
-                        self.style.SUCCESS(f"Exported {queryset.count()} {model.__name__} records to {file_path}")
-                    )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(f"No {model.__name__} records found to export")
-                    )
-                    
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f"Error exporting {model.__name__}: {str(e)}")
-                )
+        for export in exports:
+            self.stdout.write(f"  {export.model}: {export.rows} rows -> {export.file} (sha256 {export.sha256[:12]})")
         
-        if exported_files:
-            self.stdout.write(
-                self.style.SUCCESS(f"\nSuccessfully exported {len(exported_files)} files to {output_dir}/")
-            )
-            self.stdout.write("Files exported:")
-            for file_path in exported_files:
-                self.stdout.write(f"  - {file_path}")
-        else:
-            self.stdout.write(
-                self.style.WARNING("No data was exported. Make sure you have some data in your database.")
-            )
+        total = sum(export.rows for export in exports)
+        self.stdout.write(
+            self.style.SUCCESS(f"\nExported {total} rows from {len(exports)} tables to {target}")
+        )
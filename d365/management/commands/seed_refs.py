@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
+from d365.bulk import bulk_upsert
 from d365.models import (
     HeaterMaterial, HeaterDiameter, HeaterHeight, StackDiameter, StackHeight,
     FlangeInlet, HeaterModelRef, GasTrainSize, GasTrainMount, BTURating,
@@ -13,6 +15,15 @@ class Command(BaseCommand):
     help = "Seed reference tables with provided lists"
 
     def handle(self, *args, **options):
+        self.created = self.updated = 0
+        with transaction.atomic():
+            self._seed()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reference tables seeded ({self.created} created, {self.updated} updated).'
+        ))
+
+    def _seed(self):
         # Heater
         self._upsert(HeaterMaterial, [(c, c) for c in ['304', '316', 'AL6XN']], fields=('code', 'display_name'))
         self._upsert_values(HeaterDiameter, 'diameter_inch', [30, 42, 54, 60, 76, 84, 96])
@@ -47,19 +58,19 @@ class Command(BaseCommand):
         self._upsert(SystemType, [(c, c) for c in ['HW', 'TW', 'CW', 'CMF', 'RO', 'WW']], fields=('code', 'display_name'))
         self._upsert_values(Horsepower, 'hp', [0.5, 0.75, 1, 2, 3, 5, 7.5, 10, 15, 20, 25, 30, 40, 50, 60, 75, 100])
 
-        self.stdout.write(self.style.SUCCESS('Reference tables seeded.'))
+    def _record(self, counts):
+        created, updated = counts
+        self.created += created
+        self.updated += updated
 
     def _upsert_values(self, model, field, values):
-        for v in values:
-            model.objects.update_or_create(**{field: v})
+        self._record(bulk_upsert(model, field, [model(**{field: v}) for v in values]))
 
     def _upsert(self, model, pairs, fields=('code', 'display_name')):
         code_f, disp_f = fields
-        for code, disp in pairs:
-            model.objects.update_or_create(**{code_f: code}, defaults={disp_f: disp})
+        objs = [model(**{code_f: code, disp_f: disp}) for code, disp in pairs]
+        self._record(bulk_upsert(model, code_f, objs, update_fields=[disp_f]))
 
     def _upsert_pairs(self, model, key_field, value_field, pairs):
-        for k, v in pairs:
-            model.objects.update_or_create(**{key_field: k}, defaults={value_field: v})
-
-
+        objs = [model(**{key_field: k, value_field: v}) for k, v in pairs]
+        self._record(bulk_upsert(model, key_field, objs, update_fields=[value_field]))
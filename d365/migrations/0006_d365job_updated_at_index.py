@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('d365', '0005_d365generateditem'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='d365job',
+            index=models.Index(fields=['updated_at', 'id'], name='d365_d365jo_updated_c8c1e0_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('d365', '0006_d365job_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='D365WorkbookSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=512)),
+                ('file_mtime_ns', models.BigIntegerField(help_text='Workbook modification time when parsed')),
+                ('file_size', models.BigIntegerField(help_text='Workbook size in bytes when parsed')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='running', max_length=16)),
+                ('outputs', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['path', 'status', '-started_at'], name='d365_d365wo_path_9d8ed1_idx')],
+            },
+        ),
+    ]
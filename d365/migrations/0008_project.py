@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-20 09:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('d365', '0007_d365workbooksnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Project',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project_number', models.CharField(help_text='Unique project identifier', max_length=64, unique=True)),
+                ('project_name', models.CharField(help_text='Descriptive name for the project', max_length=255)),
+                ('description', models.TextField(blank=True, help_text='Optional project description', null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True, help_text='Whether this project is currently active')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['project_number'], name='d365_projec_project_0112da_idx'), models.Index(fields=['is_active'], name='d365_projec_is_acti_9ccc2e_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='d365heater',
+            name='project',
+            field=models.ForeignKey(blank=True, help_text='Project this heater belongs to', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='heaters', to='d365.project'),
+        ),
+        migrations.AddField(
+            model_name='d365job',
+            name='project',
+            field=models.ForeignKey(blank=True, help_text='Project this job belongs to', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='d365.project'),
+        ),
+        migrations.AddField(
+            model_name='d365pump',
+            name='project',
+            field=models.ForeignKey(blank=True, help_text='Project this pump belongs to', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pumps', to='d365.project'),
+        ),
+        migrations.AddField(
+            model_name='d365stackeconomizer',
+            name='project',
+            field=models.ForeignKey(blank=True, help_text='Project this stack economizer belongs to', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stack_economizers', to='d365.project'),
+        ),
+        migrations.AddField(
+            model_name='d365tank',
+            name='project',
+            field=models.ForeignKey(blank=True, help_text='Project this tank belongs to', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tanks', to='d365.project'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-20 09:40
+
+from django.db import migrations, models
+
+
+def drop_in_flight_snapshots(apps, schema_editor):
+    # Unfinished ingestions may be duplicated per workbook version, which the
+    # new constraint forbids; the next poll or page view queues them again
+    D365WorkbookSnapshot = apps.get_model('d365', 'D365WorkbookSnapshot')
+    D365WorkbookSnapshot.objects.filter(status='running').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('d365', '0008_project'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='d365workbooksnapshot',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=16),
+        ),
+        migrations.RunPython(drop_in_flight_snapshots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='d365workbooksnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('path', 'file_mtime_ns', 'file_size'), name='d365_one_ingest_per_workbook_version'),
+        ),
+    ]
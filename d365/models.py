@@ -1,6 +1,15 @@
 from django.db import models
 from django.utils import timezone
 
+from .item_templates import generate_items
+
+
+class GeneratedItemsMixin:
+    """Equipment models whose D365 items are described in item_templates.json"""
+
+    def generate_items(self) -> list[dict]:
+        return generate_items(self)
+
 
 class Project(models.Model):
     """Project model to organize BOM structures"""
@@ -23,18 +32,24 @@ class Project(models.Model):
 
 
 class D365Job(models.Model):
-    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='jobs', help_text="Project this job belongs to")
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs', help_text="Project this job belongs to")
     job_number = models.CharField(max_length=64, unique=True)
     job_name = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Backs the "most recently updated" listings and keyset pagination in jobs_list
+            models.Index(fields=['updated_at', 'id']),
+        ]
+
     def __str__(self) -> str:
         return f"{self.job_number} - {self.job_name or ''}".strip()
 
 
-class D365Heater(models.Model):
-    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='heaters', help_text="Project this heater belongs to")
+class D365Heater(GeneratedItemsMixin, models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='heaters', help_text="Project this heater belongs to")
     job_number = models.CharField(max_length=64)
     dash_number = models.CharField(max_length=32, blank=True, null=True)
 
@@ -58,75 +73,9 @@ class D365Heater(models.Model):
 
     created_at = models.DateTimeField(default=timezone.now)
 
-    def generate_items(self, stack_height: float | None = None) -> list[dict]:
-        items: list[dict] = []
-        job = self.job_number
-        dash = self.dash_number or ''
-        stack_h = stack_height if stack_height is not None else self.heater_height
-
-        def line(item_number: str, description: str, bom: str, template: str, product_type: str) -> dict:
-            return {
-                'item_number': item_number,
-                'description': description,
-                'bom': bom,
-                'template': template,
-                'product_type': product_type,
-            }
-
-        items.append(line(
-            f"{job}-HEAT-{dash}",
-            f"Heater Main Assembly {self.heater_model} {self.material}",
-            "HEATER-MAIN",
-            "HEATER-TEMPLATE",
-            "Finished Good",
-        ))
-        items.append(line(
-            f"{job}-HEAT-WELD-{dash}",
-            f"Heater Weld Assembly {self.heater_diameter}x{self.heater_height}",
-            "HEATER-WELD",
-            "HEATER-WELD-TEMPLATE",
-            "Subassembly",
-        ))
-        items.append(line(
-            f"{job}-SHELL-{dash}",
-            f"Shell {self.material} {self.heater_diameter} DIA",
-            "SHELL",
-            "SHELL-TEMPLATE",
-            "Raw Material",
-        ))
-        items.append(line(
-            f"{job}-STACK-{dash}",
-            f"Stack {self.material} {self.stack_diameter} DIA x {stack_h}",
-            "STACK",
-            "STACK-TEMPLATE",
-            "Subassembly",
-        ))
-        items.append(line(
-            f"{job}-GASTRAIN-{dash}",
-            f"Gas Train {self.gas_train_mount} {self.gas_train_size} in",
-            "GAS-TRAIN",
-            "GAS-TRAIN-TEMPLATE",
-            "Purchased",
-        ))
-        items.append(line(
-            f"{job}-MODPIPING-{dash}",
-            f"Mod Piping {self.flange_inlet} in",
-            "MOD-PIPING",
-            "MOD-PIPING-TEMPLATE",
-            "Subassembly",
-        ))
-        items.append(line(
-            f"{job}-PRECUT-{dash}",
-            f"Precut Plate for Heater",
-            "PRECUT",
-            "PRECUT-TEMPLATE",
-            "Raw Material",
-        ))
-        return items
-
-
-class D365Tank(models.Model):
-    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='tanks', help_text="Project this tank belongs to")
+
+class D365Tank(GeneratedItemsMixin, models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='tanks', help_text="Project this tank belongs to")
     job_number = models.CharField(max_length=64)
     dash_number = models.CharField(max_length=32, blank=True, null=True)
 
@@ -139,36 +88,9 @@ class D365Tank(models.Model):
 
     created_at = models.DateTimeField(default=timezone.now)
 
-    def generate_items(self) -> list[dict]:
-        job = self.job_number
-        dash = self.dash_number or ''
-        return [
-            {
-                'item_number': f"{job}-TANK-{dash}",
-                'description': f"Tank {self.material} {self.tank_diameter} DIA x {self.tank_height} ft",
-                'bom': 'TANK-MAIN',
-                'template': 'TANK-TEMPLATE',
-                'product_type': 'Finished Good',
-            },
-            {
-                'item_number': f"{job}-TANK-SHELL-{dash}",
-                'description': f"Tank Shell {self.material} {self.tank_diameter} DIA",
-                'bom': 'TANK-SHELL',
-                'template': 'TANK-SHELL-TEMPLATE',
-                'product_type': 'Raw Material',
-            },
-            {
-                'item_number': f"{job}-TANK-PRECUT-{dash}",
-                'description': "Precut Plate for Tank",
-                'bom': 'PRECUT',
-                'template': 'PRECUT-TEMPLATE',
-                'product_type': 'Raw Material',
-            },
-        ]
-
 
-class D365Pump(models.Model):
-    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='pumps', help_text="Project this pump belongs to")
+class D365Pump(GeneratedItemsMixin, models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='pumps', help_text="Project this pump belongs to")
     job_number = models.CharField(max_length=64)
     dash_number = models.CharField(max_length=32, blank=True, null=True)
 
@@ -185,43 +107,9 @@ class D365Pump(models.Model):
 
     created_at = models.DateTimeField(default=timezone.now)
 
-    def generate_items(self) -> list[dict]:
-        job = self.job_number
-        dash = self.dash_number or ''
-        thickness_map = {
-            'SIMPLEX': 0.25,
-            'DUPLEX': 0.375,
-            'TRIPLEX': 0.5,
-            'QUADPLEX': 0.5,
-        }
-        precut_thickness = thickness_map.get(self.pump_type.upper(), 0.25)
-        return [
-            {
-                'item_number': f"{job}-PUMP-{dash}",
-                'description': f"Pump {self.pump_type} {self.hp} HP {self.material}",
-                'bom': 'PUMP-MAIN',
-                'template': 'PUMP-TEMPLATE',
-                'product_type': 'Finished Good',
-            },
-            {
-                'item_number': f"{job}-SKID-{dash}",
-                'description': f"Skid {self.skid_length}x{self.skid_width}x{self.skid_height}",
-                'bom': 'SKID',
-                'template': 'SKID-TEMPLATE',
-                'product_type': 'Subassembly',
-            },
-            {
-                'item_number': f"{job}-PRECUT-{dash}",
-                'description': f"Precut Plate {precut_thickness} in",
-                'bom': 'PRECUT',
-                'template': 'PRECUT-TEMPLATE',
-                'product_type': 'Raw Material',
-            },
-        ]
-
 
-class D365StackEconomizer(models.Model):
-    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='stack_economizers', help_text="Project this stack economizer belongs to")
+class D365StackEconomizer(GeneratedItemsMixin, models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='stack_economizers', help_text="Project this stack economizer belongs to")
     job_number = models.CharField(max_length=64)
     dash_number = models.CharField(max_length=32, blank=True, null=True)
     diameter = models.IntegerField()
@@ -229,19 +117,6 @@ class D365StackEconomizer(models.Model):
     material = models.CharField(max_length=32)
     created_at = models.DateTimeField(default=timezone.now)
 
-    def generate_items(self) -> list[dict]:
-        job = self.job_number
-        dash = self.dash_number or ''
-        return [
-            {
-                'item_number': f"{job}-ECON-{dash}",
-                'description': f"Economizer {self.material} {self.diameter} DIA x {self.height}",
-                'bom': 'ECON-MAIN',
-                'template': 'ECON-TEMPLATE',
-                'product_type': 'Finished Good',
-            }
-        ]
-
 
 # Reference tables (from Excel Table Data Ref)
 
@@ -495,4 +370,45 @@ class D365GeneratedItem(models.Model):
         return f"{self.job_number} - {self.section} - {self.item_number}"
 
 
+class D365WorkbookSnapshot(models.Model):
+    """Heater/Tank/Pump output tables parsed from the import workbook by d365.tasks.ingest_workbook"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    path = models.CharField(max_length=512)
+    file_mtime_ns = models.BigIntegerField(help_text="Workbook modification time when parsed")
+    file_size = models.BigIntegerField(help_text="Workbook size in bytes when parsed")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    outputs = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['path', 'status', '-started_at']),
+        ]
+        constraints = [
+            # One queued/running ingestion per workbook version, so concurrent
+            # page views and the beat poll can't enqueue duplicates
+            models.UniqueConstraint(
+                fields=['path', 'file_mtime_ns', 'file_size'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='d365_one_ingest_per_workbook_version',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.path} ({self.status}) {self.started_at:%Y-%m-%d %H:%M}"
+
+
 # Create your models here.
@@ -1,7 +1,10 @@
 from import_export import resources, fields
+from import_export.instance_loaders import CachedInstanceLoader
 from import_export.widgets import ForeignKeyWidget, DateTimeWidget
+
+from .bulk import bulk_upsert
 from .models import (
-    D365Job, D365Heater, D365Tank, D365Pump, D365GeneratedItem,
+    Project, D365Job, D365Heater, D365Tank, D365Pump, D365StackEconomizer, D365GeneratedItem,
     HeaterMaterial, HeaterDiameter, HeaterHeight, StackDiameter, StackHeight,
     FlangeInlet, HeaterModelRef, GasTrainSize, GasTrainMount, BTURating,
     HeaterHandRef, TankMaterial, HeaterABRef, TankDiameter, TankHeight,
@@ -10,11 +13,25 @@ from .models import (
 )
 
 
+class ProjectResource(resources.ModelResource):
+    class Meta:
+        model = Project
+        fields = (
+            'id', 'project_number', 'project_name', 'description', 'is_active',
+            'created_at', 'updated_at'
+        )
+        export_order = (
+            'id', 'project_number', 'project_name', 'description', 'is_active',
+            'created_at', 'updated_at'
+        )
+        import_id_fields = ('project_number',)
+
+
 class D365JobResource(resources.ModelResource):
     class Meta:
         model = D365Job
-        fields = ('id', 'job_number', 'job_name', 'created_at', 'updated_at')
-        export_order = ('id', 'job_number', 'job_name', 'created_at', 'updated_at')
+        fields = ('id', 'project', 'job_number', 'job_name', 'created_at', 'updated_at')
+        export_order = ('id', 'project', 'job_number', 'job_name', 'created_at', 'updated_at')
         import_id_fields = ('job_number',)
 
 
@@ -22,13 +39,13 @@ class D365HeaterResource(resources.ModelResource):
     class Meta:
         model = D365Heater
         fields = (
-            'id', 'job_number', 'dash_number', 'heater_diameter', 'heater_height',
+            'id', 'project', 'job_number', 'dash_number', 'heater_diameter', 'heater_height',
             'stack_diameter', 'stack_height', 'flange_inlet', 'heater_model',
             'material', 'gas_train_size', 'gas_train_mount', 'btu', 'hand',
             'heater_ab', 'heater_single_dual', 'created_at'
         )
         export_order = (
-            'id', 'job_number', 'dash_number', 'heater_diameter', 'heater_height',
+            'id', 'project', 'job_number', 'dash_number', 'heater_diameter', 'heater_height',
             'stack_diameter', 'stack_height', 'flange_inlet', 'heater_model',
             'material', 'gas_train_size', 'gas_train_mount', 'btu', 'hand',
             'heater_ab', 'heater_single_dual', 'created_at'
@@ -40,12 +57,12 @@ class D365TankResource(resources.ModelResource):
     class Meta:
         model = D365Tank
         fields = (
-            'id', 'job_number', 'dash_number', 'tank_diameter', 'tank_height',
-            'tank_height_inches', 'tank_material', 'tank_type', 'created_at'
+            'id', 'project', 'job_number', 'dash_number', 'tank_diameter', 'tank_height',
+            'tank_inches', 'material', 'tank_type', 'created_at'
         )
         export_order = (
-            'id', 'job_number', 'dash_number', 'tank_diameter', 'tank_height',
-            'tank_height_inches', 'tank_material', 'tank_type', 'created_at'
+            'id', 'project', 'job_number', 'dash_number', 'tank_diameter', 'tank_height',
+            'tank_inches', 'material', 'tank_type', 'created_at'
         )
         import_id_fields = ('job_number', 'dash_number')
 
@@ -54,18 +71,32 @@ class D365PumpResource(resources.ModelResource):
     class Meta:
         model = D365Pump
         fields = (
-            'id', 'job_number', 'dash_number', 'pump_type', 'pump_material',
-            'pump_pressure', 'system_type', 'horsepower', 'skid_length',
+            'id', 'project', 'job_number', 'dash_number', 'pump_type', 'material',
+            'pump_pressure', 'system_type', 'hp', 'skid_length',
             'skid_width', 'skid_height', 'created_at'
         )
         export_order = (
-            'id', 'job_number', 'dash_number', 'pump_type', 'pump_material',
-            'pump_pressure', 'system_type', 'horsepower', 'skid_length',
+            'id', 'project', 'job_number', 'dash_number', 'pump_type', 'material',
+            'pump_pressure', 'system_type', 'hp', 'skid_length',
             'skid_width', 'skid_height', 'created_at'
         )
         import_id_fields = ('job_number', 'dash_number')
 
 
+class D365StackEconomizerResource(resources.ModelResource):
+    class Meta:
+        model = D365StackEconomizer
+        fields = (
+            'id', 'project', 'job_number', 'dash_number', 'diameter', 'height',
+            'material', 'created_at'
+        )
+        export_order = (
+            'id', 'project', 'job_number', 'dash_number', 'diameter', 'height',
+            'material', 'created_at'
+        )
+        import_id_fields = ('job_number', 'dash_number')
+
+
 class D365GeneratedItemResource(resources.ModelResource):
     class Meta:
         model = D365GeneratedItem
@@ -81,155 +112,209 @@ class D365GeneratedItemResource(resources.ModelResource):
 
 
 # Reference data resources
-class HeaterMaterialResource(resources.ModelResource):
+class ReferenceResource(resources.ModelResource):
+    """
+    Base for reference table resources, keyed on the table's natural key.
+
+    Imports look up every existing row in one query (CachedInstanceLoader)
+    and write new and changed rows through d365.bulk.bulk_upsert.
+    """
     class Meta:
+        use_bulk = True
+        skip_unchanged = True
+        instance_loader_class = CachedInstanceLoader
+
+    def _bulk_upsert(self, instances, using_transactions, dry_run, raise_errors, result):
+        if len(instances) > 0 and (using_transactions or not dry_run):
+            key_field = self.get_import_id_fields()[0]
+            try:
+                bulk_upsert(
+                    self._meta.model, key_field, instances,
+                    update_fields=[f for f in self.get_bulk_update_fields() if f != key_field],
+                )
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                instances.clear()
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        self._bulk_upsert(self.create_instances, using_transactions, dry_run, raise_errors, result)
+
+    def bulk_update(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        self._bulk_upsert(self.update_instances, using_transactions, dry_run, raise_errors, result)
+
+
+class HeaterMaterialResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = HeaterMaterial
-        fields = ('id', 'code', 'display_name')
-        export_order = ('id', 'code', 'display_name')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class HeaterDiameterResource(resources.ModelResource):
-    class Meta:
+class HeaterDiameterResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = HeaterDiameter
-        fields = ('id', 'diameter')
-        export_order = ('id', 'diameter')
+        fields = ('diameter_inch',)
+        export_order = ('diameter_inch',)
+        import_id_fields = ('diameter_inch',)
 
 
-class HeaterHeightResource(resources.ModelResource):
-    class Meta:
+class HeaterHeightResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = HeaterHeight
-        fields = ('id', 'height_ft')
-        export_order = ('id', 'height_ft')
+        fields = ('height_ft',)
+        export_order = ('height_ft',)
+        import_id_fields = ('height_ft',)
 
 
-class StackDiameterResource(resources.ModelResource):
-    class Meta:
+class StackDiameterResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = StackDiameter
-        fields = ('id', 'diameter')
-        export_order = ('id', 'diameter')
+        fields = ('diameter_inch',)
+        export_order = ('diameter_inch',)
+        import_id_fields = ('diameter_inch',)
 
 
-class StackHeightResource(resources.ModelResource):
-    class Meta:
+class StackHeightResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = StackHeight
-        fields = ('id', 'height_ft')
-        export_order = ('id', 'height_ft')
+        fields = ('height_ft',)
+        export_order = ('height_ft',)
+        import_id_fields = ('height_ft',)
 
 
-class FlangeInletResource(resources.ModelResource):
-    class Meta:
+class FlangeInletResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = FlangeInlet
-        fields = ('id', 'inlet')
-        export_order = ('id', 'inlet')
+        fields = ('size_inch',)
+        export_order = ('size_inch',)
+        import_id_fields = ('size_inch',)
 
 
-class HeaterModelRefResource(resources.ModelResource):
-    class Meta:
+class HeaterModelRefResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = HeaterModelRef
-        fields = ('id', 'code', 'display_name')
-        export_order = ('id', 'code', 'display_name')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class GasTrainSizeResource(resources.ModelResource):
-    class Meta:
+class GasTrainSizeResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = GasTrainSize
-        fields = ('id', 'size')
-        export_order = ('id', 'size')
+        fields = ('size_inch',)
+        export_order = ('size_inch',)
+        import_id_fields = ('size_inch',)
 
 
-class GasTrainMountResource(resources.ModelResource):
-    class Meta:
+class GasTrainMountResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = GasTrainMount
-        fields = ('id', 'mount')
-        export_order = ('id', 'mount')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class BTURatingResource(resources.ModelResource):
-    class Meta:
+class BTURatingResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = BTURating
-        fields = ('id', 'btu')
-        export_order = ('id', 'btu')
+        fields = ('value_mmbtu',)
+        export_order = ('value_mmbtu',)
+        import_id_fields = ('value_mmbtu',)
 
 
-class HeaterHandRefResource(resources.ModelResource):
-    class Meta:
+class HeaterHandRefResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = HeaterHandRef
-        fields = ('id', 'code', 'display_name')
-        export_order = ('id', 'code', 'display_name')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class TankMaterialResource(resources.ModelResource):
-    class Meta:
+class TankMaterialResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = TankMaterial
-        fields = ('id', 'code', 'display_name')
-        export_order = ('id', 'code', 'display_name')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class HeaterABRefResource(resources.ModelResource):
-    class Meta:
+class HeaterABRefResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = HeaterABRef
-        fields = ('id', 'code', 'display_name')
-        export_order = ('id', 'code', 'display_name')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class TankDiameterResource(resources.ModelResource):
-    class Meta:
+class TankDiameterResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = TankDiameter
-        fields = ('id', 'diameter')
-        export_order = ('id', 'diameter')
+        fields = ('diameter_inch',)
+        export_order = ('diameter_inch',)
+        import_id_fields = ('diameter_inch',)
 
 
-class TankHeightResource(resources.ModelResource):
-    class Meta:
+class TankHeightResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = TankHeight
-        fields = ('id', 'height_ft')
-        export_order = ('id', 'height_ft')
+        fields = ('height_ft',)
+        export_order = ('height_ft',)
+        import_id_fields = ('height_ft',)
 
 
-class TankHeightInchesResource(resources.ModelResource):
-    class Meta:
+class TankHeightInchesResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = TankHeightInches
-        fields = ('id', 'height_inches')
-        export_order = ('id', 'height_inches')
+        fields = ('height_ft', 'inches')
+        export_order = ('height_ft', 'inches')
+        import_id_fields = ('height_ft',)
 
 
-class TankTypeResource(resources.ModelResource):
-    class Meta:
+class TankTypeResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = TankType
-        fields = ('id', 'type')
-        export_order = ('id', 'type')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class PumpMaterialResource(resources.ModelResource):
-    class Meta:
+class PumpMaterialResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = PumpMaterial
-        fields = ('id', 'code', 'display_name')
-        export_order = ('id', 'code', 'display_name')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class PumpTypeRefResource(resources.ModelResource):
-    class Meta:
+class PumpTypeRefResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = PumpTypeRef
-        fields = ('id', 'code', 'display_name')
-        export_order = ('id', 'code', 'display_name')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class PumpPressureResource(resources.ModelResource):
-    class Meta:
+class PumpPressureResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = PumpPressure
-        fields = ('id', 'pressure')
-        export_order = ('id', 'pressure')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class SystemTypeResource(resources.ModelResource):
-    class Meta:
+class SystemTypeResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = SystemType
-        fields = ('id', 'type')
-        export_order = ('id', 'type')
+        fields = ('code', 'display_name')
+        export_order = ('code', 'display_name')
+        import_id_fields = ('code',)
 
 
-class HorsepowerResource(resources.ModelResource):
-    class Meta:
+class HorsepowerResource(ReferenceResource):
+    class Meta(ReferenceResource.Meta):
         model = Horsepower
-        fields = ('id', 'hp')
-        export_order = ('id', 'hp')
+        fields = ('hp',)
+        export_order = ('hp',)
+        import_id_fields = ('hp',)
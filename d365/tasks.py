@@ -0,0 +1,139 @@
+from datetime import timedelta
+from pathlib import Path
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+import logging
+
+from .excel import parse_workbook_outputs, workbook_signature
+from .models import D365WorkbookSnapshot
+
+logger = logging.getLogger(__name__)
+
+# A queued/running snapshot older than this is assumed to belong to a dead
+# worker (or a broker nobody consumes) and may be claimed again
+INGEST_STALE_AFTER = timedelta(minutes=10)
+
+IN_FLIGHT_STATUSES = (D365WorkbookSnapshot.STATUS_QUEUED, D365WorkbookSnapshot.STATUS_RUNNING)
+
+
+def default_workbook_path() -> Path:
+    return Path(getattr(settings, 'D365_IMPORT_WORKBOOK', 'd265_import.xlsx'))
+
+
+def snapshot_is_stale(snapshot) -> bool:
+    return snapshot.status in IN_FLIGHT_STATUSES and snapshot.started_at < timezone.now() - INGEST_STALE_AFTER
+
+
+def release_stale_snapshots(path: Path) -> int:
+    """Drop unfinished snapshots nobody is working on; returns how many"""
+    return D365WorkbookSnapshot.objects.filter(
+        path=str(path), status__in=IN_FLIGHT_STATUSES, started_at__lt=timezone.now() - INGEST_STALE_AFTER,
+    ).delete()[0]
+
+
+def is_snapshot_current(path: Path) -> bool:
+    """
+    Whether the workbook's current version needs no ingestion: it is parsed,
+    queued or running, or failed. A failure is final until the file changes,
+    so a broken workbook isn't re-parsed on every poll and page view.
+    """
+    release_stale_snapshots(path)
+    mtime_ns, size = workbook_signature(path)
+    return D365WorkbookSnapshot.objects.filter(path=str(path), file_mtime_ns=mtime_ns, file_size=size).exists()
+
+
+def claim_snapshot(path: Path, force=False):
+    """
+    Queue a snapshot for the workbook's current version, or return None when
+    it needs none (see is_snapshot_current) or another caller just claimed it.
+    The insert is the claim: a partial unique constraint allows one queued or
+    running snapshot per version, so only its creator enqueues the parse.
+    """
+    if force:
+        release_stale_snapshots(path)
+    elif is_snapshot_current(path):
+        return None
+    mtime_ns, size = workbook_signature(path)
+    try:
+        with transaction.atomic():
+            return D365WorkbookSnapshot.objects.create(path=str(path), file_mtime_ns=mtime_ns, file_size=size)
+    except IntegrityError:
+        return None
+
+
+def prune_snapshots(path: Path, keep) -> int:
+    """Delete finished snapshots older than keep; returns how many"""
+    return D365WorkbookSnapshot.objects.filter(path=str(path), started_at__lt=keep.started_at).exclude(
+        status__in=IN_FLIGHT_STATUSES,
+    ).delete()[0]
+
+
+def request_ingestion(path: Path) -> bool:
+    """
+    Ask a worker to ingest the workbook's current version, at most once per
+    version every INGEST_STALE_AFTER. Publishing is not retried, so a down
+    broker doesn't hold up the caller; Beat polls the workbook anyway.
+    Returns whether the task was queued.
+    """
+    mtime_ns, size = workbook_signature(path)
+    key = f"d365:ingest_requested:{Path(path).resolve()}:{mtime_ns}:{size}"
+    if not cache.add(key, True, INGEST_STALE_AFTER.total_seconds()):
+        return False
+    try:
+        ingest_workbook.apply_async((str(path),), retry=False)
+    except Exception:
+        logger.exception(f"Could not queue workbook ingestion for {path}")
+        return False
+    return True
+
+
+@shared_task
+def ingest_workbook(path=None, force=False, snapshot_id=None):
+    """
+    Parse the D365 import workbook off-request and store its outputs.
+
+    Scheduled every minute by Celery Beat as an mtime poller, and queued by
+    excel_preview when it sees a new version: the run claims a snapshot for
+    the file's current mtime and size, and is skipped when one already
+    exists, so the workbook is only re-parsed after it changes. Older
+    finished snapshots are pruned once a parse succeeds.
+    """
+    path = Path(path) if path else default_workbook_path()
+    if not path.exists():
+        logger.warning(f"Workbook not found, skipping ingestion: {path}")
+        return "Workbook not found"
+
+    if snapshot_id is None:
+        snapshot = claim_snapshot(path, force=force)
+        if snapshot is None:
+            return "Workbook unchanged"
+        snapshot_id = snapshot.id
+
+    # queued -> running; a redelivered task finds the snapshot already taken
+    snapshots = D365WorkbookSnapshot.objects.filter(id=snapshot_id)
+    started = snapshots.filter(status=D365WorkbookSnapshot.STATUS_QUEUED).update(
+        status=D365WorkbookSnapshot.STATUS_RUNNING, started_at=timezone.now(),
+    )
+    if not started:
+        return "Snapshot already ingested"
+    logger.info(f"Ingesting workbook {path}...")
+
+    try:
+        outputs = parse_workbook_outputs(path)
+    except Exception as e:
+        snapshots.update(status=D365WorkbookSnapshot.STATUS_FAILED, error=str(e), finished_at=timezone.now())
+        logger.error(f"Workbook ingestion failed: {str(e)}")
+        raise e
+
+    snapshots.update(outputs=outputs, status=D365WorkbookSnapshot.STATUS_DONE, finished_at=timezone.now())
+    pruned = prune_snapshots(path, snapshots.get())
+    if pruned:
+        logger.info(f"Pruned {pruned} old workbook snapshots")
+
+    counts = ', '.join(f"{len(rows)} {name}" for name, rows in outputs.items())
+    logger.info(f"Workbook ingestion completed: {counts}")
+    return f"Workbook ingested: {counts}"
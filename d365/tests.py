@@ -1,3 +1,496 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import tablib
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .bulk import bulk_upsert
+from .excel import MAX_ITEM_ROWS, parse_workbook_outputs
+from .exporters import check_schema
+from . import item_templates
+from .item_templates import generate_items, generate_items_many
+from .models import (
+    D365Heater, D365Job, D365Pump, D365StackEconomizer, D365Tank, D365WorkbookSnapshot, HeaterDiameter,
+    HeaterMaterial, Project,
+)
+from .resources import HeaterMaterialResource
+from .tasks import claim_snapshot, ingest_workbook, INGEST_STALE_AFTER
+
+
+class JobsListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='pw')
+        cls.project = Project.objects.create(project_number='P1', project_name='Plant one')
+        now = timezone.now()
+        for i in range(5):
+            job = D365Job.objects.create(
+                job_number=f"J{i}", job_name=f"Job {i}", project=cls.project if i < 2 else None,
+            )
+            # auto_now would give every job the same instant; spread them out
+            D365Job.objects.filter(pk=job.pk).update(updated_at=now - timedelta(minutes=i))
+        D365Job.objects.create(job_number='X9', job_name='Other')
+        D365Job.objects.filter(job_number='X9').update(updated_at=now - timedelta(hours=1))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('d365_jobs_list')
+
+    def test_without_limit_returns_the_default_page(self):
+        with mock.patch('d365.views.JOBS_PAGE_SIZE', 4):
+            page = self.client.get(self.url).json()
+        self.assertEqual([job['job_number'] for job in page['results']], ['J0', 'J1', 'J2', 'J3'])
+        self.assertIsNotNone(page['next_cursor'])
+
+    def test_cursor_walks_every_job_once(self):
+        seen = []
+        params = {'limit': 2}
+        while True:
+            page = self.client.get(self.url, params).json()
+            seen += [job['job_number'] for job in page['results']]
+            if not page['next_cursor']:
+                break
+            params = {'limit': 2, 'cursor': page['next_cursor']}
+        self.assertEqual(seen, ['J0', 'J1', 'J2', 'J3', 'J4', 'X9'])
+
+    def test_cursor_is_stable_when_updated_at_ties(self):
+        D365Job.objects.update(updated_at=timezone.now())
+        first = self.client.get(self.url, {'limit': 3}).json()
+        second = self.client.get(self.url, {'limit': 3, 'cursor': first['next_cursor']}).json()
+        numbers = [job['job_number'] for job in first['results'] + second['results']]
+        self.assertEqual(sorted(numbers), ['J0', 'J1', 'J2', 'J3', 'J4', 'X9'])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_prefix_and_project_filters(self):
+        page = self.client.get(self.url, {'prefix': 'X'}).json()
+        self.assertEqual([job['job_number'] for job in page['results']], ['X9'])
+        page = self.client.get(self.url, {'project': 'P1', 'limit': 10}).json()
+        self.assertEqual([job['job_number'] for job in page['results']], ['J0', 'J1'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_listing_revalidates(self):
+        etag = self.client.get(self.url, {'limit': 2})['ETag']
+        self.assertEqual(self.client.get(self.url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        D365Job.objects.create(job_number='J9')
+        self.assertEqual(self.client.get(self.url, {'limit': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ItemTemplateTests(SimpleTestCase):
+    """Rows must match the hand-written builders the templates replaced"""
+
+    def heater(self, **kwargs):
+        fields = dict(
+            job_number='K1', dash_number=None, heater_diameter=72, heater_height=12.0, stack_diameter=18,
+            stack_height=None, flange_inlet=2.5, heater_model='gp', material='304', gas_train_size=1.5,
+            gas_train_mount='fm', btu=4.0, hand='lh', heater_ab='', heater_single_dual='SINGLE',
+        )
+        fields.update(kwargs)
+        return D365Heater(**fields)
+
+    def test_heater_rows(self):
+        items = generate_items(self.heater())
+        self.assertEqual([(item['item_number'], item['description'], item['product_type']) for item in items], [
+            ('K1-01', 'HEATER, FAB, 72X12, 304, GP', 'Item'),
+            ('K1-01.1', 'HEATER, WELD, 72X12, 304', 'Pegged Supply'),
+            ('K1-01.2', 'HEATER, SHELL, 72X12, 304', 'Phantom'),
+            ('K1-01.3', 'HEATER, STACK, 18X12, W/2.5FL', 'Phantom'),
+            ('K1-01.4', 'GAS TRAIN, 1.5, FM, SIEMENS, 4MBTU, LH', 'Pegged Supply'),
+            ('K1-01.5', 'HEATER, MOD PIPING, GP', 'Phantom'),
+            ('K1-01.1-A', 'PRECUT HTR72, 18STACK, 11GA, 304', 'Phantom'),
+        ])
+        self.assertEqual(items[0]['bom'], 'K1-01-000')
+        self.assertEqual([item['template'] for item in items[:2]], ['FGFAB', 'Sub Assy'])
+
+    def test_heater_ab_and_stack_height(self):
+        descriptions = [item['description'] for item in generate_items(self.heater(heater_ab=' b ', stack_height=10.5))]
+        self.assertEqual(descriptions[0], 'HEATER B, FAB, 72X12, 304, GP')
+        self.assertEqual(descriptions[3], 'HEATER B, STACK, 18X10.5, W/2.5FL')
+        self.assertEqual(descriptions[4], 'GAS TRAIN, HTR B, 1.5, FM, SIEMENS, 4MBTU, LH')
+        self.assertEqual(descriptions[6], 'PRECUT HTRB72, 18STACK, 11GA, 304')
+
+    def test_tank_rows(self):
+        tank = D365Tank(
+            job_number='K1', dash_number='03', tank_diameter=96, tank_height=12, tank_inches=144.25,
+            material='304', tank_type='hw',
+        )
+        self.assertEqual([(item['item_number'], item['description']) for item in generate_items(tank)], [
+            ('K1-03', 'TANK, 96X12, HW, 304'),
+            ('K1-03.1', 'TANK, SHELL, 96X144.25, 304'),
+            ('K1-03.1-A', 'PRECUT TANK96X12, 11GA, 304'),
+        ])
+
+    def test_pump_pressure_and_type_cases(self):
+        def pump(pressure, pump_type):
+            return D365Pump(
+                job_number='K1', dash_number='02', pump_type=pump_type, pump_pressure=pressure, system_type='hw',
+                hp=7.5, material='316', skid_length=120.0, skid_width=48, skid_height=24.5,
+            )
+
+        simplex = [item['description'] for item in generate_items(pump('lp', 'simplex'))]
+        self.assertEqual(simplex, [
+            'PUMP, SIMPLEX, HW, 7.5HP', 'PUMP SKID, SIMPLEX, 120X48X24.5, 316', 'PRECUT, SIMPLEX PUMP SKID, 11GA',
+        ])
+        duplex = [item['description'] for item in generate_items(pump('MP', 'DUPLEX'))]
+        self.assertEqual(duplex[0], 'PUMP, DUPLEX, MP, HW, 7.5HP')
+        self.assertEqual(duplex[2], 'PRECUT, DUPLEX PUMP SKID, 3/16PL')
+
+    def test_many_matches_one_at_a_time(self):
+        tank = D365Tank(
+            job_number='K2', dash_number='01', tank_diameter=60, tank_height=8, tank_inches=96,
+            material='ss', tank_type='cw',
+        )
+        records = [self.heater(), tank, self.heater(heater_ab='A', dash_number='02')]
+        self.assertEqual(generate_items_many(records), [generate_items(record) for record in records])
+
+    def test_many_resolves_each_model_once(self):
+        records = [self.heater(), self.heater(dash_number='02'), self.heater(dash_number='03')]
+        with mock.patch('d365.item_templates.section_for', wraps=item_templates.section_for) as section_for:
+            generate_items_many(records)
+        self.assertEqual(section_for.call_count, 1)
+
+    def test_economizer_numbering_comes_from_json(self):
+        economizer = D365StackEconomizer(job_number='K1', dash_number='04', diameter=24, height=60, material='316')
+        self.assertEqual(economizer.generate_items(), [{
+            'item_number': 'K1-ECON-04',
+            'description': 'Economizer 316 24 DIA x 60',
+            'bom': 'ECON-MAIN',
+            'template': 'ECON-TEMPLATE',
+            'product_type': 'Finished Good',
+        }])
+        no_dash = D365StackEconomizer(job_number='K1', diameter=24, height=60, material='316')
+        self.assertEqual(no_dash.generate_items()[0]['item_number'], 'K1-ECON-')
+
+
+class ItemTemplateSpecTests(SimpleTestCase):
+    """A new product type needs only a JSON entry"""
+
+    def load(self, specs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'item_templates.json'
+        path.write_text(json.dumps(specs), encoding='utf-8')
+        settings_override = override_settings(D365_ITEM_TEMPLATES_PATH=path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        item_templates.load_sections.cache_clear()
+        self.addCleanup(item_templates.load_sections.cache_clear)
+
+    def test_numbering_patterns(self):
+        self.load({'tank': {
+            'model': 'D365Tank',
+            'numbering': {
+                'default_dash': '09', 'main_item_number': '{job}-T{dash}', 'sub_item_number': '{job}-T{dash}-{seq}',
+                'bom': 'BOM-{item_number}', 'sub_template': 'TANK-SUB',
+            },
+            'fields': {'d': {'attr': 'tank_diameter', 'format': 'dim'}},
+            'rows': [
+                {'product_type': 'Finished Good', 'description': 'TANK {d}'},
+                {'product_type': 'Purchased', 'description': 'SHELL {d}'},
+                {'product_type': 'Raw Material', 'override_suffix': 'A', 'description': 'PRECUT {d}'},
+            ],
+        }})
+        tank = D365Tank(job_number='K1', tank_diameter=96, tank_height=12, tank_inches=144, material='304', tank_type='hw')
+        self.assertEqual(generate_items(tank), [
+            {'item_number': 'K1-T09', 'description': 'TANK 96', 'bom': 'BOM-K1-T09', 'template': 'FGFAB', 'product_type': 'Item'},
+            {'item_number': 'K1-T09-1', 'description': 'SHELL 96', 'bom': 'BOM-K1-T09-1', 'template': 'TANK-SUB', 'product_type': 'Pegged Supply'},
+            {'item_number': 'K1-09.1-A', 'description': 'PRECUT 96', 'bom': 'BOM-K1-09.1-A', 'template': 'TANK-SUB', 'product_type': 'Phantom'},
+        ])
+
+    def test_unknown_numbering_key_is_rejected(self):
+        self.load({'tank': {'model': 'D365Tank', 'numbering': {'item_prefix': 'T'}, 'rows': []}})
+        with self.assertRaisesMessage(ValueError, 'Unknown numbering keys for tank: item_prefix'):
+            item_templates.load_sections()
+
+
+class JobItemsViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='pw')
+        D365Job.objects.create(job_number='K1', job_name='Kettle')
+        D365Tank.objects.create(
+            job_number='K1', dash_number='03', tank_diameter=96, tank_height=12, tank_inches=144.25,
+            material='304', tank_type='hw',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_payload_items_for_present_sections_only(self):
+        payload = self.client.get(reverse('d365_load_job_by_number', args=['K1'])).json()
+        self.assertEqual(payload['heater_items'], [])
+        self.assertEqual(payload['pump_items'], [])
+        self.assertEqual([item['item_number'] for item in payload['tank_items']], ['K1-03', 'K1-03.1', 'K1-03.1-A'])
+
+    def test_print_honours_selected_sections(self):
+        response = self.client.get(reverse('d365_print_job', args=['K1']), {'sections': 'heater,pump'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['tank_items'], [])
+        response = self.client.get(reverse('d365_print_job', args=['K1']), {'sections': 'tank'})
+        self.assertEqual(len(response.context['tank_items']), 3)
+
+
+class WorkbookIngestionTests(TestCase):
+    OUTPUTS = {'heater': [{'item_number': 'K1-01'}], 'tank': [], 'pump': []}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'import.xlsx'
+        self.path.write_bytes(b'v1')
+        settings_override = override_settings(D365_IMPORT_WORKBOOK=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('tester', password='pw')
+        self.client.force_login(self.user)
+
+    def change_workbook(self):
+        self.path.write_bytes(b'version 2')
+
+    def test_one_claim_per_workbook_version(self):
+        self.assertIsNotNone(claim_snapshot(self.path))
+        self.assertIsNone(claim_snapshot(self.path))
+        self.change_workbook()
+        self.assertIsNotNone(claim_snapshot(self.path))
+
+    def preview(self):
+        return self.client.get(reverse('d365_excel_preview'))
+
+    @mock.patch('d365.tasks.ingest_workbook.apply_async')
+    def test_page_views_only_read_and_enqueue_once(self, apply_async):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                self.assertTrue(self.preview().context['in_progress'])
+        self.assertEqual(apply_async.call_count, 1)
+        self.assertEqual(D365WorkbookSnapshot.objects.count(), 0)
+        writes = [q['sql'] for q in queries if 'd365_workbooksnapshot' in q['sql'] and not q['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+    @mock.patch('d365.tasks.ingest_workbook.apply_async', side_effect=OSError('no broker'))
+    def test_down_broker_shows_pending(self, apply_async):
+        with self.assertLogs('d365.tasks', 'ERROR') as logs:
+            response = self.preview()
+        self.assertTrue(response.context['in_progress'])
+        self.assertIn('Could not queue workbook ingestion', logs.output[0])
+        self.assertEqual(apply_async.call_args.kwargs, {'retry': False})
+        self.preview()
+        self.assertEqual(apply_async.call_count, 1)
+
+    @mock.patch('d365.tasks.parse_workbook_outputs', return_value=OUTPUTS)
+    @mock.patch('d365.tasks.ingest_workbook.apply_async')
+    def test_abandoned_claim_is_retried(self, apply_async, parse):
+        claim_snapshot(self.path)
+        D365WorkbookSnapshot.objects.update(started_at=timezone.now() - INGEST_STALE_AFTER - timedelta(seconds=1))
+        self.assertTrue(self.preview().context['in_progress'])
+        self.assertEqual(apply_async.call_count, 1)
+
+        ingest_workbook()
+        response = self.preview()
+        self.assertFalse(response.context['in_progress'])
+        self.assertEqual(response.context['snapshot'].outputs, self.OUTPUTS)
+        self.assertEqual(D365WorkbookSnapshot.objects.count(), 1)
+
+    @mock.patch('d365.tasks.ingest_workbook.apply_async')
+    @mock.patch('d365.tasks.parse_workbook_outputs', side_effect=ValueError('corrupt workbook'))
+    def test_failure_is_final_until_the_workbook_changes(self, parse, apply_async):
+        with self.assertLogs('d365.tasks', 'ERROR'), self.assertRaises(ValueError):
+            ingest_workbook()
+        response = self.preview()
+        self.assertEqual(response.context['last_run'].status, D365WorkbookSnapshot.STATUS_FAILED)
+        self.assertContains(response, 'corrupt workbook')
+        self.assertEqual(ingest_workbook(), 'Workbook unchanged')
+        apply_async.assert_not_called()
+
+        self.change_workbook()
+        self.assertTrue(self.preview().context['in_progress'])
+        self.assertEqual(apply_async.call_count, 1)
+
+    def test_successful_parse_prunes_older_snapshots(self):
+        with mock.patch('d365.tasks.parse_workbook_outputs', return_value=self.OUTPUTS):
+            ingest_workbook()
+        self.change_workbook()
+        with self.assertLogs('d365.tasks', 'ERROR'), self.assertRaises(ValueError), \
+                mock.patch('d365.tasks.parse_workbook_outputs', side_effect=ValueError('corrupt workbook')):
+            ingest_workbook()
+        self.assertEqual(D365WorkbookSnapshot.objects.count(), 2)
+
+        self.path.write_bytes(b'version 3')
+        with mock.patch('d365.tasks.parse_workbook_outputs', return_value=self.OUTPUTS):
+            ingest_workbook()
+        self.assertEqual(list(D365WorkbookSnapshot.objects.values_list('file_size', 'status')), [(9, 'done')])
+
+    @mock.patch('d365.tasks.parse_workbook_outputs', return_value=OUTPUTS)
+    def test_redelivered_task_does_not_parse_twice(self, parse):
+        snapshot = claim_snapshot(self.path)
+        ingest_workbook(str(self.path), snapshot_id=snapshot.id)
+        self.assertEqual(ingest_workbook(str(self.path), snapshot_id=snapshot.id), 'Snapshot already ingested')
+        self.assertEqual(parse.call_count, 1)
+
+    def test_missing_workbook_names_the_configured_path(self):
+        os.remove(self.path)
+        response = self.client.get(reverse('d365_excel_preview'))
+        self.assertContains(response, f"Workbook {self.path} not found")
+
+
+class WorkbookParserTests(SimpleTestCase):
+    """Outputs must match the old cell-by-cell reader"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'import.xlsx'
+
+    def save(self, sheets):
+        wb = Workbook()
+        wb.remove(wb.active)
+        for name, rows in sheets.items():
+            sheet = wb.create_sheet(name)
+            for row in rows:
+                sheet.append(row)
+        wb.save(self.path)
+
+    def test_table_found_anywhere_and_read_to_first_blank_row(self):
+        self.save({
+            'Heater': [
+                ['Job', 'K1'],
+                [],
+                [None, 'notes', 'ITEM NUMBER ', 'Description', 'bom', 'Template', 'Product Type'],
+                [None, None, 'K1-01', 'HEATER, FAB', 'K1-01-000', 'FGFAB', 'Item'],
+                [None, None, 'K1-01.1', None, 7, 'Sub Assy', 'Phantom'],
+                [None, None, None, '', None, None, None],
+                [None, None, 'after-blank', 'ignored', None, None, None],
+            ],
+            'Tank': [['Item Number', 'Description', 'BOM']],
+        })
+        self.assertEqual(parse_workbook_outputs(self.path), {
+            'heater': [
+                {'item_number': 'K1-01', 'description': 'HEATER, FAB', 'bom': 'K1-01-000', 'template': 'FGFAB', 'product_type': 'Item'},
+                {'item_number': 'K1-01.1', 'description': '', 'bom': '7', 'template': 'Sub Assy', 'product_type': 'Phantom'},
+            ],
+            'tank': [],
+            'pump': [],
+        })
+
+    def test_rows_are_capped(self):
+        header = ['Item Number', 'Description', 'BOM', 'Template', 'Product Type']
+        rows = [[f"K1-{i}", 'x', 'b', 't', 'p'] for i in range(MAX_ITEM_ROWS + 5)]
+        self.save({'Pump': [header] + rows})
+        self.assertEqual(len(parse_workbook_outputs(self.path)['pump']), MAX_ITEM_ROWS)
+
+
+class BulkUpsertTests(TestCase):
+    def materials(self, *pairs):
+        return [HeaterMaterial(code=code, display_name=name) for code, name in pairs]
+
+    def test_only_new_and_changed_rows_are_written(self):
+        self.assertEqual(bulk_upsert(HeaterMaterial, 'code', self.materials(('304', '304'), ('316', '316')), ['display_name']), (2, 0))
+        counts = bulk_upsert(HeaterMaterial, 'code', self.materials(('304', '304'), ('316', '316 SS'), ('AL', 'AL6XN')), ['display_name'])
+        self.assertEqual(counts, (1, 1))
+        self.assertEqual(dict(HeaterMaterial.objects.values_list('code', 'display_name')), {'304': '304', '316': '316 SS', 'AL': 'AL6XN'})
+
+    def test_repeat_run_is_a_no_op(self):
+        objs = self.materials(('304', '304'), ('316', '316'))
+        bulk_upsert(HeaterMaterial, 'code', objs, ['display_name'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(bulk_upsert(HeaterMaterial, 'code', self.materials(('304', '304'), ('316', '316')), ['display_name']), (0, 0))
+        self.assertFalse([q for q in queries if q['sql'].startswith(('INSERT', 'UPDATE'))])
+
+    def test_later_duplicate_key_wins(self):
+        bulk_upsert(HeaterMaterial, 'code', self.materials(('304', 'first'), ('304', 'second')), ['display_name'])
+        self.assertEqual(list(HeaterMaterial.objects.values_list('display_name', flat=True)), ['second'])
+
+    def test_key_only_tables(self):
+        self.assertEqual(bulk_upsert(HeaterDiameter, 'diameter_inch', [HeaterDiameter(diameter_inch=d) for d in (30, 42, 30)]), (2, 0))
+        self.assertEqual(bulk_upsert(HeaterDiameter, 'diameter_inch', [HeaterDiameter(diameter_inch=42)]), (0, 0))
+        self.assertEqual(HeaterDiameter.objects.count(), 2)
+
+    def test_seed_refs_twice(self):
+        call_command('seed_refs', stdout=StringIO())
+        counts = {model: model.objects.count() for model in (HeaterMaterial, HeaterDiameter)}
+        out = StringIO()
+        call_command('seed_refs', stdout=out)
+        self.assertIn('(0 created, 0 updated)', out.getvalue())
+        self.assertEqual({model: model.objects.count() for model in counts}, counts)
+
+    def test_resource_import_is_idempotent(self):
+        dataset = tablib.Dataset(['304', '304'], ['316', '316 SS'], headers=['code', 'display_name'])
+        HeaterMaterialResource().import_data(dataset, raise_errors=True)
+        result = HeaterMaterialResource().import_data(dataset, raise_errors=True)
+        self.assertEqual(result.totals['new'], 0)
+        self.assertEqual(result.totals['update'], 0)
+        self.assertEqual(HeaterMaterial.objects.count(), 2)
+
+        dataset = tablib.Dataset(['316', '316L'], headers=['code', 'display_name'])
+        HeaterMaterialResource().import_data(dataset, raise_errors=True)
+        self.assertEqual(HeaterMaterial.objects.get(code='316').display_name, '316L')
+
+
+class ExportTests(TransactionTestCase):
+    # Tables are exported on worker threads with their own connections, which
+    # only see committed rows
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output_dir = directory.name
+        project = Project.objects.create(project_number='P1', project_name='Plant one')
+        D365Job.objects.create(job_number='K1', project=project)
+        D365Job.objects.create(job_number='K2')
+        D365Tank.objects.create(
+            job_number='K1', dash_number='03', tank_diameter=96, tank_height=12, tank_inches=144.25,
+            material='304', tank_type='hw',
+        )
+
+    def test_schema_matches_migrated_database(self):
+        self.assertEqual(check_schema(), [])
+
+    def test_missing_column_is_reported(self):
+        introspection = connection.introspection
+        describe = introspection.get_table_description
+
+        def without_project(cursor, table):
+            return [column for column in describe(cursor, table) if column.name != 'project_id']
+
+        with mock.patch.object(introspection, 'get_table_description', side_effect=without_project):
+            errors = check_schema()
+        self.assertIn('D365JobResource: column d365_d365job.project_id does not exist (run migrate)', errors)
+        with mock.patch('d365.management.commands.export_sample_data.check_schema', return_value=errors):
+            with self.assertRaises(CommandError):
+                call_command('export_sample_data', output_dir=self.output_dir, stdout=StringIO())
+
+    def test_csv_export_and_manifest(self):
+        call_command('export_sample_data', output_dir=self.output_dir, workers=2, stdout=StringIO())
+        with open(os.path.join(self.output_dir, 'd365_manifest.json')) as f:
+            tables = {table['name']: table for table in json.load(f)['tables']}
+        self.assertEqual(tables['d365_projects']['rows'], 1)
+        self.assertEqual(tables['d365_jobs']['rows'], 2)
+        self.assertEqual(tables['d365_tanks']['rows'], 1)
+        with open(os.path.join(self.output_dir, 'd365_jobs.csv'), newline='') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'id,project,job_number,job_name,created_at,updated_at')
+        self.assertEqual(len(lines), 3)
+
+    def test_zip_bundle(self):
+        call_command('export_sample_data', output_dir=self.output_dir, format='zip', stdout=StringIO())
+        [bundle] = [name for name in os.listdir(self.output_dir) if name.endswith('.zip')]
+        with zipfile.ZipFile(os.path.join(self.output_dir, bundle)) as archive:
+            manifest = json.loads(archive.read('manifest.json'))
+            for table in manifest['tables']:
+                self.assertIn(table['file'], archive.namelist())
@@ -1,35 +1,55 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import JsonResponse, HttpRequest, HttpResponse
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_http_methods, condition
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Max, Q
 from .models import (
-    D365Job, D365Heater, D365Tank, D365Pump, D365GeneratedItem,
+    D365Job, D365Heater, D365Tank, D365Pump, D365GeneratedItem, D365WorkbookSnapshot,
     HeaterMaterial, HeaterDiameter, HeaterHeight, StackDiameter, StackHeight,
     FlangeInlet, HeaterModelRef, GasTrainSize, GasTrainMount, BTURating,
     HeaterHandRef, HeaterABRef,
     TankMaterial, TankDiameter, TankHeight, TankHeightInches, TankType,
     PumpMaterial, PumpTypeRef, PumpPressure, SystemType, Horsepower,
 )
-from .excel import read_workbook_outputs
-from pathlib import Path
+from .excel import workbook_signature
+from .tasks import IN_FLIGHT_STATUSES, default_workbook_path, request_ingestion, snapshot_is_stale
+from .item_templates import generate_items, generate_items_many
+from datetime import datetime
+from kemco_portal import metrics
+import base64
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+GENERATED_ITEMS_SAVED = metrics.counter(
+    'd365_generated_items_saved_total', 'Generated items written by save_generated_items', ['section'],
+)
+SAVE_GENERATED_SECONDS = metrics.histogram(
+    'd365_save_generated_items_duration_seconds', 'save_generated_items wall time', ['section'],
+)
 
 
 def save_generated_items(job_number: str, section: str, items: list[dict]):
     """Save generated items to database, replacing existing ones for this job/section"""
-    # Delete existing items for this job/section
-    D365GeneratedItem.objects.filter(job_number=job_number, section=section).delete()
-    
-    # Save new items
-    for item in items:
-        D365GeneratedItem.objects.create(
-            job_number=job_number,
-            section=section,
-            item_number=item['item_number'],
-            description=item['description'],
-            bom=item['bom'],
-            template=item['template'],
-            product_type=item['product_type']
-        )
+    with SAVE_GENERATED_SECONDS.time(section=section):
+        # Delete existing items for this job/section
+        D365GeneratedItem.objects.filter(job_number=job_number, section=section).delete()
+        
+        # Save new items in one INSERT
+        D365GeneratedItem.objects.bulk_create([
+            D365GeneratedItem(
+                job_number=job_number,
+                section=section,
+                item_number=item['item_number'],
+                description=item['description'],
+                bom=item['bom'],
+                template=item['template'],
+                product_type=item['product_type']
+            )
+            for item in items
+        ])
+    GENERATED_ITEMS_SAVED.inc(len(items), section=section)
 
 
 def load_generated_items(job_number: str) -> dict:
@@ -185,11 +205,7 @@ def generate_all(request: HttpRequest) -> HttpResponse:
                     heater_ab=(request.POST.get('heater_ab') or ''),
                     heater_single_dual=(request.POST.get('heater_single_dual') or 'S'),
                 )
-                heater_items = _format_items(
-                    job_number,
-                    heater.dash_number or '01',
-                    _build_heater_rows(heater, heater.stack_height),
-                )
+                heater_items = generate_items(heater)
                 context['heater_items'] = heater_items
                 context['heater_initial'] = heater
                 context['heater_dash_value'] = heater_dash or (heater.dash_number or '01')
@@ -216,11 +232,7 @@ def generate_all(request: HttpRequest) -> HttpResponse:
                     material=material,
                     tank_type=ttype,
                 )
-                tank_items = _format_items(
-                    job_number,
-                    tank.dash_number or '01',
-                    _build_tank_rows(tank),
-                )
+                tank_items = generate_items(tank)
                 context['tank_items'] = tank_items
                 context['tank_initial'] = tank
                 context['tank_dash_value'] = tank_dash or (tank.dash_number or '01')
@@ -252,11 +264,7 @@ def generate_all(request: HttpRequest) -> HttpResponse:
                     skid_width=sw,
                     skid_height=sh,
                 )
-                pump_items = _format_items(
-                    job_number,
-                    pump.dash_number or '01',
-                    _build_pump_rows(pump),
-                )
+                pump_items = generate_items(pump)
                 context['pump_items'] = pump_items
                 context['pump_initial'] = pump
                 context['pump_dash_value'] = pump_dash or (pump.dash_number or '01')
@@ -374,9 +382,7 @@ def generate_selected(request: HttpRequest) -> HttpResponse:
                     heater_ab=(request.POST.get('heater_ab') or ''),
                     heater_single_dual=(request.POST.get('heater_single_dual') or 'S'),
                 )
-                heater_items = _format_items(
-                    job_number, heater_dash or '01', _build_heater_rows(heater, heater.stack_height)
-                )
+                heater_items = generate_items(heater)
                 context['heater_items'] = heater_items
                 context['heater_initial'] = heater
                 context['heater_dash_value'] = heater_dash or '01'
@@ -401,7 +407,7 @@ def generate_selected(request: HttpRequest) -> HttpResponse:
                     material=material,
                     tank_type=tank_type,
                 )
-                tank_items = _format_items(job_number, tank_dash or '01', _build_tank_rows(tank))
+                tank_items = generate_items(tank)
                 context['tank_items'] = tank_items
                 context['tank_initial'] = tank
                 context['tank_dash_value'] = tank_dash or '01'
@@ -432,7 +438,7 @@ def generate_selected(request: HttpRequest) -> HttpResponse:
                     skid_width=sw,
                     skid_height=sh,
                 )
-                pump_items = _format_items(job_number, pump_dash or '01', _build_pump_rows(pump))
+                pump_items = generate_items(pump)
                 context['pump_items'] = pump_items
                 context['pump_initial'] = pump
                 context['pump_dash_value'] = pump_dash or '01'
@@ -581,9 +587,7 @@ def generate_section(request: HttpRequest, section: str) -> HttpResponse:
                     heater_ab=(request.POST.get('heater_ab') or ''),
                     heater_single_dual=(request.POST.get('heater_single_dual') or 'S'),
                 )
-                context['heater_items'] = _format_items(
-                    job_number, heater_dash or '01', _build_heater_rows(heater, heater.stack_height)
-                )
+                context['heater_items'] = generate_items(heater)
                 context['heater_initial'] = heater
                 context['heater_dash_value'] = heater_dash or '01'
             else:
@@ -623,7 +627,7 @@ def generate_section(request: HttpRequest, section: str) -> HttpResponse:
                     material=material,
                     tank_type=tank_type,
                 )
-                context['tank_items'] = _format_items(job_number, tank_dash or '01', _build_tank_rows(tank))
+                context['tank_items'] = generate_items(tank)
                 context['tank_initial'] = tank
                 context['tank_dash_value'] = tank_dash or '01'
             else:
@@ -661,7 +665,7 @@ def generate_section(request: HttpRequest, section: str) -> HttpResponse:
                     skid_width=sw,
                     skid_height=sh,
                 )
-                pump_items = _format_items(job_number, pump_dash or '01', _build_pump_rows(pump))
+                pump_items = generate_items(pump)
                 context['pump_items'] = pump_items
                 context['pump_initial'] = pump
                 context['pump_dash_value'] = pump_dash or '01'
@@ -714,22 +718,119 @@ def save_job(request: HttpRequest) -> JsonResponse:
     return JsonResponse({'success': True, 'message': 'Saved' if created else 'Updated', 'job_id': job.id})
 
 
+def _requested_job(request: HttpRequest, job_id: int = None, job_number: str = None) -> D365Job:
+    # Fetched once for the ETag and Last-Modified checks and the view
+    if not hasattr(request, '_requested_job'):
+        lookup = {'id': job_id} if job_id is not None else {'job_number': job_number}
+        request._requested_job = get_object_or_404(D365Job, **lookup)
+    return request._requested_job
+
+
+def _job_etag(request: HttpRequest, **kwargs) -> str:
+    # Every generate/save path goes through update_or_create on the job, so
+    # updated_at moves whenever the payload's sections or items change
+    job = _requested_job(request, **kwargs)
+    return hashlib.md5(f"{job.id}|{job.updated_at.isoformat()}".encode()).hexdigest()
+
+
+def _job_last_modified(request: HttpRequest, **kwargs):
+    return _requested_job(request, **kwargs).updated_at
+
+
 @login_required
+@condition(etag_func=_job_etag, last_modified_func=_job_last_modified)
 def load_job_by_id(request: HttpRequest, job_id: int) -> JsonResponse:
-    job = get_object_or_404(D365Job, id=job_id)
-    return _job_payload(job)
+    return _job_payload(_requested_job(request, job_id=job_id))
 
 
 @login_required
+@condition(etag_func=_job_etag, last_modified_func=_job_last_modified)
 def load_job_by_number(request: HttpRequest, job_number: str) -> JsonResponse:
-    job = get_object_or_404(D365Job, job_number=job_number)
-    return _job_payload(job)
+    return _job_payload(_requested_job(request, job_number=job_number))
+
+
+JOBS_PAGE_SIZE = 50
+JOBS_MAX_PAGE_SIZE = 200
+
+
+def _filtered_jobs(request: HttpRequest):
+    """Jobs matching the ?prefix= (job number) and ?project= (project number) filters"""
+    jobs = D365Job.objects.all()
+    prefix = request.GET.get('prefix', '').strip()
+    if prefix:
+        jobs = jobs.filter(job_number__startswith=prefix)
+    project = request.GET.get('project', '').strip()
+    if project:
+        jobs = jobs.filter(project__project_number=project)
+    return jobs
+
+
+def _jobs_fingerprint(request: HttpRequest) -> dict:
+    # One aggregate query shared by the ETag and Last-Modified checks
+    if not hasattr(request, '_jobs_fingerprint'):
+        request._jobs_fingerprint = _filtered_jobs(request).aggregate(
+            last_modified=Max('updated_at'), count=Count('id'),
+        )
+    return request._jobs_fingerprint
+
+
+def _jobs_etag(request: HttpRequest) -> str:
+    fp = _jobs_fingerprint(request)
+    last = fp['last_modified'].isoformat() if fp['last_modified'] else ''
+    raw = f"{fp['count']}|{last}|{request.GET.urlencode()}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _jobs_last_modified(request: HttpRequest):
+    return _jobs_fingerprint(request)['last_modified']
+
+
+def _encode_cursor(updated_at, job_id: int) -> str:
+    raw = f"{updated_at.isoformat()}|{job_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, job_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(updated_at), int(job_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
 
 
 @login_required
+@condition(etag_func=_jobs_etag, last_modified_func=_jobs_last_modified)
 def jobs_list(request: HttpRequest) -> JsonResponse:
-    jobs = list(D365Job.objects.order_by('-updated_at').values('id', 'job_number', 'job_name', 'updated_at'))
-    return JsonResponse(jobs, safe=False)
+    """Cursor-paginated job listing, newest first.
+
+    Query params: prefix (job number prefix), project (project number),
+    limit (page size, default JOBS_PAGE_SIZE, max JOBS_MAX_PAGE_SIZE) and
+    cursor (from next_cursor). Always returns {results, next_cursor}.
+    """
+    jobs = _filtered_jobs(request).order_by('-updated_at', '-id')
+    try:
+        limit = int(request.GET.get('limit', JOBS_PAGE_SIZE))
+    except ValueError:
+        limit = JOBS_PAGE_SIZE
+    limit = max(1, min(limit, JOBS_MAX_PAGE_SIZE))
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        position = _decode_cursor(cursor)
+        if position is None:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        updated_at, job_id = position
+        jobs = jobs.filter(Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=job_id))
+
+    # Fetch one extra row to know whether another page exists
+    rows = list(jobs.values('id', 'job_number', 'job_name', 'updated_at')[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]['updated_at'], rows[-1]['id'])
+
+    return JsonResponse({'results': rows, 'next_cursor': next_cursor})
 
 
 @login_required
@@ -744,6 +845,14 @@ def delete_job(request: HttpRequest, job_id: int) -> HttpResponse:
     return redirect('d365_home')
 
 
+def _section_items(records: dict) -> dict:
+    """Generated items per section for a job's records, in one pass over the templates"""
+    items = {'heater': [], 'tank': [], 'pump': []}
+    present = {section: record for section, record in records.items() if record}
+    items.update(zip(present, generate_items_many(present.values())))
+    return items
+
+
 @login_required
 def print_job(request: HttpRequest, job_number: str) -> HttpResponse:
     job = get_object_or_404(D365Job, job_number=job_number)
@@ -755,24 +864,17 @@ def print_job(request: HttpRequest, job_number: str) -> HttpResponse:
     selected_sections = request.GET.get('sections', 'heater,tank,pump').split(',')
     
     # Use the same formatting logic as the generator
-    heater_items = []
-    tank_items = []
-    pump_items = []
-    
-    if 'heater' in selected_sections and heater:
-        heater_items = _format_items(job_number, heater.dash_number or '01', _build_heater_rows(heater, heater.stack_height))
-    
-    if 'tank' in selected_sections and tank:
-        tank_items = _format_items(job_number, tank.dash_number or '01', _build_tank_rows(tank))
-    
-    if 'pump' in selected_sections and pump:
-        pump_items = _format_items(job_number, pump.dash_number or '01', _build_pump_rows(pump))
+    items = _section_items({
+        section: record
+        for section, record in (('heater', heater), ('tank', tank), ('pump', pump))
+        if section in selected_sections
+    })
 
     return render(request, 'd365/print.html', {
         'job': job,
-        'heater_items': heater_items,
-        'tank_items': tank_items,
-        'pump_items': pump_items,
+        'heater_items': items['heater'],
+        'tank_items': items['tank'],
+        'pump_items': items['pump'],
         'selected_sections': selected_sections,
     })
 
@@ -790,218 +892,52 @@ def _job_payload(job: D365Job) -> JsonResponse:
         return data
 
     # Use the same formatting logic as the generator
-    heater_items = []
-    tank_items = []
-    pump_items = []
-    
-    if heater:
-        heater_items = _format_items(job_number, heater.dash_number or '01', _build_heater_rows(heater, heater.stack_height))
-    
-    if tank:
-        tank_items = _format_items(job_number, tank.dash_number or '01', _build_tank_rows(tank))
-    
-    if pump:
-        pump_items = _format_items(job_number, pump.dash_number or '01', _build_pump_rows(pump))
+    items = _section_items({'heater': heater, 'tank': tank, 'pump': pump})
 
     payload = {
         'job': {'id': job.id, 'job_number': job.job_number, 'job_name': job.job_name, 'updated_at': job.updated_at},
         'heater': model_to_dict(heater),
         'tank': model_to_dict(tank),
         'pump': model_to_dict(pump),
-        'heater_items': heater_items,
-        'tank_items': tank_items,
-        'pump_items': pump_items,
+        'heater_items': items['heater'],
+        'tank_items': items['tank'],
+        'pump_items': items['pump'],
     }
     return JsonResponse(payload)
 
 
 @login_required
 def excel_preview(request: HttpRequest) -> HttpResponse:
-    # Path to workbook in project root as per user-provided file
-    workbook_path = Path('d265_import.xlsx')
-    outputs = {}
-    if workbook_path.exists():
-        outputs = read_workbook_outputs(workbook_path)
-    return render(request, 'd365/excel_preview.html', {
-        'has_file': workbook_path.exists(),
-        'outputs': outputs,
-    })
-
-
-def _format_items(job_number: str, dash: str, items: list[dict]) -> list[dict]:
-    formatted: list[dict] = []
-    for seq, row in enumerate(items):
-        product_type = row.get('product_type', '')
-        type_map = {
-            'Finished Good': 'Item',
-            'Subassembly': 'Sub Assy',
-            'Raw Material': 'Phantom',
-            'Purchased': 'Pegged Supply',
-            'Sub Assy': 'Sub Assy',
-            'Item': 'Item',
-            'Phantom': 'Phantom',
-        }
-        pt = type_map.get(product_type, product_type)
-
-        # Excel formula: =CONCATENATE($I$2,"-",$I$3) for main items
-        if seq == 0:
-            item_number = f"{job_number}-{dash}"
+    """
+    Show the last ingested workbook snapshot. Read-only: claiming, parsing and
+    cleanup happen in d365.tasks.ingest_workbook; a new workbook version only
+    queues that task and shows as pending until a worker picks it up.
+    """
+    workbook_path = default_workbook_path()
+    has_file = workbook_path.exists()
+
+    snapshots = D365WorkbookSnapshot.objects.filter(path=str(workbook_path))
+    snapshot = snapshots.filter(status=D365WorkbookSnapshot.STATUS_DONE).first()
+    last_run = snapshots.first()
+
+    in_progress = False
+    if has_file:
+        mtime_ns, size = workbook_signature(workbook_path)
+        current = snapshots.filter(file_mtime_ns=mtime_ns, file_size=size).first()
+        if current is None or snapshot_is_stale(current):
+            request_ingestion(workbook_path)
+            in_progress = True
         else:
-            # Allow special override like '-A' for certain rows (e.g., Tank precut)
-            suffix = row.get('override_suffix')
-            if suffix:
-                item_number = f"{job_number}-{dash}.1-{suffix}"
-            else:
-                # Excel formula: =CONCATENATE($I$2,"-",$I$3,".1") for sub-items
-                item_number = f"{job_number}-{dash}.{seq}"
-        
-        # Excel formula: =CONCATENATE($I$2,"-",$I$3,"-000") for main items
-        # Excel formula: =CONCATENATE($I$2,"-",$I$3,".1","-000") for sub-items
-        bom = f"{item_number}-000"
-        
-        # Template logic: main items (-01) are "FGFAB", sub-items (.1, .2, etc.) are "Sub Assy"
-        template = "FGFAB" if seq == 0 else "Sub Assy"
-
-        formatted.append({
-            'item_number': item_number,
-            'description': row.get('description', ''),
-            'bom': bom,
-            'template': template,
-            'product_type': pt or 'Item',
-        })
-    return formatted
-
-
-def _fmt_dim(value: float | int) -> str:
-    # Trim .0
-    try:
-        iv = int(value)
-        if float(value) == float(iv):
-            return f"{iv}"
-        return f"{value}"
-    except Exception:
-        return str(value)
-
-
-def _build_heater_rows(heater: D365Heater, stack_height: float | None) -> list[dict]:
-    d = _fmt_dim(heater.heater_diameter)
-    h = _fmt_dim(heater.heater_height)
-    sd = _fmt_dim(heater.stack_diameter)
-    sh = _fmt_dim(stack_height if stack_height is not None else heater.heater_height)
-    model = (heater.heater_model or '').upper()
-    material = (heater.material or '').upper()
-    hand = (heater.hand or '').upper()
-    mount = (heater.gas_train_mount or '').upper()
-    gts = _fmt_dim(heater.gas_train_size)
-    btu = _fmt_dim(heater.btu)
-    ab = (heater.heater_ab or '').strip().upper()
-    fi = _fmt_dim(heater.flange_inlet)
-
-    rows: list[dict] = []
-    
-    # Excel formula: =IF(I14=0,CONCATENATE("HEATER, FAB, ",I4,"X",I5,", ",I8,", ",I9),CONCATENATE("HEATER ",I14,", FAB, ",I4,"X",I5,", ",I8,", ",I9))
-    if not ab:
-        desc0 = f"HEATER, FAB, {d}X{h}, {material}, {model}"
-    else:
-        desc0 = f"HEATER {ab}, FAB, {d}X{h}, {material}, {model}"
-    rows.append({'description': desc0, 'product_type': 'Finished Good'})
-
-    # Excel formula: =IF(I14=0,CONCATENATE("HEATER, WELD, ",I4,"X",I5,", ",I9),CONCATENATE("HEATER ",I14,", WELD, ",I4,"X",I5,", ",I9))
-    if not ab:
-        desc1 = f"HEATER, WELD, {d}X{h}, {material}"
-    else:
-        desc1 = f"HEATER {ab}, WELD, {d}X{h}, {material}"
-    rows.append({'description': desc1, 'product_type': 'Pegged Supply'})
-    
-    # Excel formula: =IF(I14=0,CONCATENATE("HEATER, SHELL, ",I4,"X",I5,", ",I9),CONCATENATE("HEATER ",I14,", SHELL, ",I4,"X",I5,", ",I9))
-    if not ab:
-        desc2 = f"HEATER, SHELL, {d}X{h}, {material}"
-    else:
-        desc2 = f"HEATER {ab}, SHELL, {d}X{h}, {material}"
-    rows.append({'description': desc2, 'product_type': 'Raw Material'})
-    
-    # Excel formula: =IF(I14=0,CONCATENATE("HEATER, STACK, ",I6,"X",I16,", W/",I7,"FL"),CONCATENATE("HEATER ",I14,", STACK, ",I6,"X",I16,", W/",I7,"FL"))
-    if not ab:
-        desc3 = f"HEATER, STACK, {sd}X{sh}, W/{fi}FL"
-    else:
-        desc3 = f"HEATER {ab}, STACK, {sd}X{sh}, W/{fi}FL"
-    rows.append({'description': desc3, 'product_type': 'Raw Material'})
-    
-    # Excel formula: =IF(I14=0,CONCATENATE("GAS TRAIN, ",I10,", ",I11,", ","SIEMENS",", ",I12,"MBTU, ",I13),CONCATENATE("GAS TRAIN, HTR ",I14, ", ",I10,", ",I11,", ","SIEMENS",", ",I12,"MBTU, ",I13))
-    if not ab:
-        desc4 = f"GAS TRAIN, {gts}, {mount}, SIEMENS, {btu}MBTU, {hand}"
-    else:
-        desc4 = f"GAS TRAIN, HTR {ab}, {gts}, {mount}, SIEMENS, {btu}MBTU, {hand}"
-    rows.append({'description': desc4, 'product_type': 'Pegged Supply'})
-    
-    # Excel formula: =IF(I15="SINGLE",I17,I18)
-    # This should be a proper description, not just the ab value
-    if heater.heater_single_dual == 'SINGLE':
-        mod_piping_desc = f"HEATER, MOD PIPING, {model}"
-    else:
-        mod_piping_desc = f"HEATER, MOD PIPING, {model}"
-    rows.append({'description': mod_piping_desc, 'product_type': 'Raw Material'})
-    
-    # Excel formula: =IF(I14=0,CONCATENATE("PRECUT HTR",I4,", ",I6,"STACK, 11GA, ",I9),CONCATENATE("PRECUT HTR",I14,I4,", ",I6,"STACK, 11GA, ",I9))
-    if not ab:
-        precut_desc = f"PRECUT HTR{d}, {sd}STACK, 11GA, {material}"
-    else:
-        precut_desc = f"PRECUT HTR{ab}{d}, {sd}STACK, 11GA, {material}"
-    rows.append({'description': precut_desc, 'product_type': 'Raw Material', 'override_suffix': 'A'})
-    
-    return rows
-
+            in_progress = current.status in IN_FLIGHT_STATUSES
 
-def _build_tank_rows(tank: D365Tank) -> list[dict]:
-    d = _fmt_dim(tank.tank_diameter)
-    h = _fmt_dim(tank.tank_height)
-    material = (tank.material or '').upper()
-    ttype = (tank.tank_type or '').upper()
-    ti = _fmt_dim(tank.tank_inches)
-    
-    rows: list[dict] = []
-    
-    # Excel formula: =CONCATENATE("TANK, ",H4,"X",H5,", ",H7,", ",H6)
-    rows.append({'description': f"TANK, {d}X{h}, {ttype}, {material}", 'product_type': 'Finished Good'})
-    
-    # Excel formula: =CONCATENATE("TANK, SHELL, ",H4,"X",H8,", ",H6)
-    rows.append({'description': f"TANK, SHELL, {d}X{ti}, {material}", 'product_type': 'Raw Material'})
-    
-    # Excel formula: =CONCATENATE("PRECUT TANK",H4,"X",H5,", 11GA, ",H6)
-    rows.append({'description': f"PRECUT TANK{d}X{h}, 11GA, {material}", 'product_type': 'Raw Material', 'override_suffix': 'A'})
-    
-    return rows
-
-
-def _build_pump_rows(pump: D365Pump) -> list[dict]:
-    ptype = (pump.pump_type or '').upper()
-    ppress = (pump.pump_pressure or '').upper()
-    stype = (pump.system_type or '').upper()
-    hp = _fmt_dim(pump.hp)
-    material = (pump.material or '').upper()
-    sl = _fmt_dim(pump.skid_length)
-    sw = _fmt_dim(pump.skid_width)
-    sh = _fmt_dim(pump.skid_height)
-    
-    rows: list[dict] = []
-    
-    # Excel formula: =IF(G4="LP",CONCATENATE("PUMP, ",G3,", ",G5,", ",G6,"HP"),CONCATENATE("PUMP, ",G3,", ",G4,", ",G5,", ",G6,"HP"))
-    if ppress == "LP":
-        pump_desc = f"PUMP, {ptype}, {stype}, {hp}HP"
-    else:
-        pump_desc = f"PUMP, {ptype}, {ppress}, {stype}, {hp}HP"
-    rows.append({'description': pump_desc, 'product_type': 'Finished Good'})
-    
-    # Excel formula: =CONCATENATE("PUMP SKID, ",G3,", ",G8,"X",G9,"X",G10,", ",G7)
-    rows.append({'description': f"PUMP SKID, {ptype}, {sl}X{sw}X{sh}, {material}", 'product_type': 'Raw Material'})
-    
-    # Excel formula: =IF(G3="SIMPLEX",CONCATENATE("PRECUT, ",G3," PUMP SKID",","," 11GA"),CONCATENATE("PRECUT, ",G3," PUMP SKID",","," 3/16PL"))
-    if ptype == "SIMPLEX":
-        precut_desc = f"PRECUT, {ptype} PUMP SKID, 11GA"
-    else:
-        precut_desc = f"PRECUT, {ptype} PUMP SKID, 3/16PL"
-    rows.append({'description': precut_desc, 'product_type': 'Raw Material', 'override_suffix': 'A'})
-    
-    return rows
+    outputs = snapshot.outputs if snapshot else {}
+    return render(request, 'd365/excel_preview.html', {
+        'has_file': has_file,
+        'snapshot': snapshot,
+        'last_run': last_run,
+        'workbook_path': workbook_path,
+        'in_progress': in_progress,
+        'sections': [(key, outputs.get(key, [])) for key in ('heater', 'tank', 'pump')],
+    })
 
 # Create your views here.
@@ -1,16 +1,125 @@
+import hashlib
+from datetime import timedelta
+from statistics import median
+
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from import_export import admin as import_export_admin
-from .models import Part, SearchHistory
+from .metrics import record_cache_lookup
+from .models import Part, SearchHistory, SyncRun
 from .resources import PartResource
+from .search_index import (
+    bump_catalog_version, catalog_generation, filter_values, refresh_search_vectors, trigram_ranked,
+    use_postgres_search,
+)
+from .views import build_search_conditions
+
+
+class CachedValuesFilter(admin.SimpleListFilter):
+    """Free-text filter with a datalist of cached distinct values instead of a link per value"""
+    template = 'admin/dynamics_search/datalist_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        # Other filters, search and ordering survive submitting this filter's form
+        self.preserved_params = [
+            (name, value)
+            for name, values in request.GET.lists()
+            if name not in (self.parameter_name, 'p')
+            for value in values
+        ]
+
+    @cached_property
+    def values(self):
+        return filter_values(self.field_name)
+
+    def lookups(self, request, model_admin):
+        # Only the selected value becomes a choice; the rest are offered by the datalist
+        value = self.value()
+        return [(value, value)] if value else []
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.field_name: self.value()})
+        return queryset
+
+
+class SizeFilter(CachedValuesFilter):
+    title = 'size'
+    parameter_name = 'size'
+    field_name = 'size'
+
+
+class ProductGroupFilter(CachedValuesFilter):
+    title = 'product group id'
+    parameter_name = 'product_group_id'
+    field_name = 'product_group_id'
+
+
+class VendorNameFilter(CachedValuesFilter):
+    title = 'vendor name'
+    parameter_name = 'vendor_name'
+    field_name = 'vendor_name'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids COUNT(*) over the whole parts table.
+
+    Unfiltered changelists on PostgreSQL use the planner's row estimate;
+    everything else caches the exact count until the catalog changes (or for
+    a short while at most).
+    """
+    ESTIMATE_THRESHOLD = 10000
+    COUNT_CACHE_TIMEOUT = 60
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if use_postgres_search() and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.ESTIMATE_THRESHOLD:
+                return row[0]
+
+        try:
+            sql = str(queryset.query)
+        except Exception:
+            return super().count
+        key = f"dynamics_search:admin_count:{catalog_generation()}:{hashlib.md5(sql.encode('utf-8')).hexdigest()}"
+        count = cache.get(key)
+        record_cache_lookup('admin_count', count is not None)
+        if count is None:
+            count = super().count
+            cache.set(key, count, self.COUNT_CACHE_TIMEOUT)
+        return count
 
 
 @admin.register(Part)
 class PartAdmin(import_export_admin.ImportExportModelAdmin):
     resource_class = PartResource
     list_display = ['item_number', 'description_short', 'size', 'product_group_id', 'unit_cost', 'vendor_name', 'last_updated']
-    list_filter = ['last_updated', 'size', 'product_group_id', 'vendor_name']
+    list_filter = ['last_updated', SizeFilter, ProductGroupFilter, VendorNameFilter]
     search_fields = ['item_number', 'description', 'size', 'product_group_id', 'vendor_name', 'vendor_product_number']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ['last_updated', 'content_hash', 'search_vector']
     ordering = ['-last_updated']
     
@@ -55,14 +164,33 @@ class PartAdmin(import_export_admin.ImportExportModelAdmin):
         """Optimize queryset for admin"""
         return super().get_queryset(request).select_related()
     
+    def get_search_results(self, request, queryset, search_term):
+        """Same matching as the public search (search_api), plus vendor part numbers"""
+        if not search_term.strip():
+            return queryset, False
+        conditions = build_search_conditions(search_term) | Q(vendor_product_number__icontains=search_term.strip())
+        if use_postgres_search():
+            return trigram_ranked(queryset, search_term, conditions), False
+        return queryset.filter(conditions), False
+    
+    # Edits here change the catalog like a sync does
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_catalog_version()
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_catalog_version()
+    
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_catalog_version()
+    
     actions = ['refresh_search_vectors']
     
     def refresh_search_vectors(self, request, queryset):
         """Refresh search vectors for selected parts"""
-        updated = 0
-        for part in queryset:
-            part.save()  # This will update the search_vector
-            updated += 1
+        updated = refresh_search_vectors(queryset)
         
         self.message_user(
             request,
@@ -109,4 +237,97 @@ class SearchHistoryAdmin(admin.ModelAdmin):
             request,
             f"Successfully deleted {count} old search history entries."
         )
-    clear_old_history.short_description = "Clear old history (30+ days)"
\ No newline at end of file
+    clear_old_history.short_description = "Clear old history (30+ days)"
+
+@admin.register(SyncRun)
+class SyncRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'source', 'status', 'started_at', 'duration_seconds', 'stages_display', 'rows_read', 'rows_created', 'rows_updated', 'rows_deleted', 'peak_memory_mib']
+    list_filter = ['source', 'status', 'started_at']
+    ordering = ['-started_at']
+    change_list_template = 'admin/dynamics_search/syncrun/change_list.html'
+    
+    # Runs compared against when flagging a slow latest run on the dashboard
+    BASELINE_RUNS = 10
+    SLOW_FACTOR = 1.5
+    
+    # Written by the syncs only
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def stages_display(self, obj):
+        return ', '.join(f"{s['stage']} {s['seconds']:.1f}s" for s in obj.stages) or '-'
+    stages_display.short_description = 'Stages'
+    
+    def get_urls(self):
+        urls = [
+            path('trends/', self.admin_site.admin_view(self.trends_view), name='dynamics_search_syncrun_trends'),
+        ]
+        return urls + super().get_urls()
+    
+    def trends_view(self, request):
+        """Charts of sync duration, rows changed, stage timings and peak memory over time"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            days = max(1, int(request.GET.get('days', 30)))
+        except ValueError:
+            days = 30
+        
+        runs = list(
+            SyncRun.objects.filter(started_at__gte=timezone.now() - timedelta(days=days))
+            .exclude(status__in=[SyncRun.STATUS_RUNNING, SyncRun.STATUS_SKIPPED])
+            .order_by('started_at')
+        )
+        series = {}
+        for run in runs:
+            series.setdefault(run.get_source_display(), []).append({
+                'started_at': run.started_at.isoformat(),
+                'status': run.status,
+                'duration': run.duration_seconds,
+                'rows_changed': run.rows_changed,
+                'peak_memory': run.peak_memory_mib,
+            })
+        recent = [run for run in runs if run.stages][-20:]
+        trend_data = {
+            'series': series,
+            'stages': [
+                {'label': f"#{run.id} {run.get_source_display()}", 'stages': run.stages}
+                for run in recent
+            ],
+        }
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Sync trends',
+            'days': days,
+            'run_count': len(runs),
+            'trend_data': trend_data,
+            'latest_runs': self.latest_against_baseline(),
+        }
+        return TemplateResponse(request, 'admin/dynamics_search/syncrun/trends.html', context)
+    
+    def latest_against_baseline(self):
+        """Each source's latest successful run against the median of the runs before it"""
+        rows = []
+        for source, label in SyncRun.SOURCE_CHOICES:
+            durations = list(
+                SyncRun.objects.filter(source=source, status=SyncRun.STATUS_SUCCESS, duration_seconds__isnull=False)
+                .order_by('-started_at').values_list('id', 'duration_seconds')[:self.BASELINE_RUNS + 1]
+            )
+            if not durations:
+                continue
+            run_id, latest = durations[0]
+            baseline = median([d for _, d in durations[1:]]) if len(durations) > 1 else None
+            rows.append({
+                'source': label,
+                'run_id': run_id,
+                'latest': latest,
+                'baseline': baseline,
+                'baseline_runs': len(durations) - 1,
+                'slow': baseline is not None and latest > baseline * self.SLOW_FACTOR,
+            })
+        return rows
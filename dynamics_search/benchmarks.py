@@ -0,0 +1,157 @@
+"""
+Helpers shared by the benchmark commands (benchmark_search, benchmark_sync).
+
+Benchmarks run against a separate test database, never the configured one.
+They write their results as JSON under benchmarks/, so two runs can be
+compared with --compare.
+"""
+from __future__ import annotations
+
+import json
+import math
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, setup_test_environment, teardown_test_environment,
+)
+from django.utils import timezone
+
+
+BENCHMARK_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for no values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_ms(seconds: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max of durations given in seconds, reported in ms"""
+    ms = [s * 1000 for s in seconds]
+    return {
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+        'mean_ms': round(sum(ms) / len(ms), 3) if ms else 0.0,
+        'max_ms': round(max(ms), 3) if ms else 0.0,
+    }
+
+
+class StageRecorder:
+    """Wall time, SQL query count and peak traced memory per named stage"""
+
+    def __init__(self, track_memory: bool = True):
+        self.track_memory = track_memory
+        self.stages: List[dict] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.track_memory:
+            tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                yield
+                elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if self.track_memory else 0
+        finally:
+            if self.track_memory:
+                tracemalloc.stop()
+        self.stages.append({
+            'stage': name,
+            'seconds': round(elapsed, 4),
+            'queries': len(queries),
+            'peak_mib': round(peak / 1024 / 1024, 2),
+        })
+
+
+@contextmanager
+def benchmark_database(name: str, keepdb: bool = False):
+    """
+    Point the default connection at a migrated test database while active.
+
+    On SQLite the database is a file under benchmarks/ rather than the
+    in-memory default, so numbers resemble the real deployment and keepdb
+    can reuse a seeded catalog between runs.
+    """
+    if connection.vendor == 'sqlite':
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if not test_settings.get('NAME'):
+            BENCHMARK_DIR.mkdir(exist_ok=True)
+            test_settings['NAME'] = str(BENCHMARK_DIR / f'{name}.sqlite3')
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb,
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip()
+    except Exception:
+        return ''
+
+
+def run_metadata(**extra) -> dict:
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'platform': platform.platform(),
+        **extra,
+    }
+
+
+def write_results(kind: str, payload: dict, output: Optional[str] = None) -> Path:
+    """Save payload as JSON; defaults to benchmarks/<kind>-<timestamp>.json"""
+    if output:
+        path = Path(output)
+    else:
+        BENCHMARK_DIR.mkdir(exist_ok=True)
+        path = BENCHMARK_DIR / f"{kind}-{timezone.now().strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2), encoding='utf-8')
+    return path
+
+
+def compare_results(rows: Iterable[dict], previous_path: str, key_fields: Sequence[str],
+                    metric: str) -> List[str]:
+    """One line per matching row: previous -> current value of metric and % change"""
+    previous = json.loads(Path(previous_path).read_text(encoding='utf-8'))
+    baseline = {tuple(row.get(k) for k in key_fields): row for row in previous.get('results', [])}
+
+    lines = []
+    for row in rows:
+        key = tuple(row.get(k) for k in key_fields)
+        old = baseline.get(key, {}).get(metric)
+        if old is None:
+            continue
+        new = row[metric]
+        change = (new - old) / old * 100 if old else 0.0
+        label = ' / '.join(str(k) for k in key)
+        lines.append(f"{label}: {metric} {old} -> {new} ({change:+.1f}%)")
+    return lines
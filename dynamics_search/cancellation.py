@@ -0,0 +1,50 @@
+"""
+Stop abandoned queries in async views.
+
+Under ASGI, Django cancels a view's task when the client disconnects, for
+example when HTMX aborts a search request because a newer keystroke
+replaced it. The async ORM runs the SQL in a worker thread that
+cancellation doesn't reach, so the query would otherwise run to completion.
+cancellable() interrupts the query on the database connection instead:
+sqlite3's interrupt() or psycopg's cancel().
+"""
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+
+async def request_connection(alias=DEFAULT_DB_ALIAS):
+    """The connection used by this request's async ORM calls"""
+    # Async ORM calls of one request run in the same thread-sensitive worker,
+    # so the connection fetched there is the one their queries use
+    return await sync_to_async(lambda: connections[alias])()
+
+
+def interrupt(connection):
+    """Abort the statement currently running on connection, from any thread"""
+    raw = connection.connection
+    if raw is None:
+        return
+    if connection.vendor == 'sqlite':
+        raw.interrupt()
+    elif connection.vendor == 'postgresql':
+        raw.cancel()
+
+
+async def cancellable(awaitable, connection):
+    """Await an async ORM call; if the request is cancelled, interrupt its SQL first"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        interrupt(connection)
+        # Let the worker thread finish before the connection is reused
+        try:
+            await task
+        except Exception as e:
+            logger.debug(f"Interrupted query: {e}")
+        raise
@@ -0,0 +1,123 @@
+"""
+Cut duplicate and stale work out of live search.
+
+While a user types, HTMX fires a search_api request per pause in typing, and
+several users often search for the same thing. Two mechanisms keep that from
+turning into one full query per request:
+
+- SingleFlight runs identical in-flight searches once. The first request
+  (the leader) queries the database; identical requests arriving before it
+  finishes await its result. If the leader is cancelled, a waiting request
+  takes over. Coalescing works within one event loop, i.e. per ASGI worker.
+- A per-session "latest wins" token, kept in the default cache. Each HTMX
+  search_api request (HX-Request header) from an existing session takes the
+  next token for its session, and a request whose token is no longer the
+  latest is superseded: unless_superseded() cancels its query (interrupting
+  the SQL, see cancellation.py) and the view returns 204, which HTMX ignores.
+  Other clients may fetch several pages in parallel, so they are never
+  superseded, and no session is created just to hold a token.
+"""
+import asyncio
+import logging
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import SEARCH_COALESCED, SEARCH_SUPERSEDED
+
+logger = logging.getLogger(__name__)
+
+
+class Superseded(Exception):
+    """A newer request from the same session replaced this one"""
+
+
+class _LeaderCancelled(Exception):
+    """The leader of a coalesced call was cancelled before it finished"""
+
+
+class SingleFlight:
+    """Share one execution of an async call between concurrent identical callers"""
+
+    def __init__(self, name):
+        self.name = name
+        # Futures belong to their event loop, so calls are tracked per loop
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, fn):
+        """Await fn(), or the result of an identical call already in flight"""
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        while key in calls:
+            SEARCH_COALESCED.inc(call=self.name, role='follower')
+            try:
+                # shield: a follower giving up must not cancel the leader's work
+                return await asyncio.shield(calls[key])
+            except _LeaderCancelled:
+                continue
+
+        SEARCH_COALESCED.inc(call=self.name, role='leader')
+        future = asyncio.get_running_loop().create_future()
+        calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del calls[key]
+            # Mark the exception retrieved when nobody was waiting for it
+            if future.done() and not future.cancelled():
+                future.exception()
+
+
+def _token_key(session_key):
+    return f'dynamics_search:latest_search:{session_key}'
+
+
+# Cache calls go to the shared thread pool: the request's own sync thread may
+# be busy running the query that is being checked
+@sync_to_async(thread_sensitive=False)
+def next_token(session_key):
+    """Claim the newest search token for session_key"""
+    key = _token_key(session_key)
+    cache.add(key, 0, settings.SEARCH_SUPERSEDE_TOKEN_TIMEOUT)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, 1, settings.SEARCH_SUPERSEDE_TOKEN_TIMEOUT)
+        return 1
+
+
+@sync_to_async(thread_sensitive=False)
+def is_superseded(session_key, token):
+    latest = cache.get(_token_key(session_key))
+    return latest is not None and latest != token
+
+
+async def unless_superseded(awaitable, session_key, token, endpoint):
+    """Await awaitable, cancelling it and raising Superseded once a newer token exists"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.SEARCH_SUPERSEDE_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await is_superseded(session_key, token):
+                SEARCH_SUPERSEDED.inc(endpoint=endpoint)
+                raise Superseded()
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception) as e:
+                logger.debug(f"Stopped superseded search: {e!r}")
@@ -0,0 +1,148 @@
+"""
+Streaming writers for Part exports.
+
+Rows come from values_list().iterator(), and each writer consumes them one
+at a time, so memory stays flat however many parts are exported.
+stream_lines() is the async counterpart for StreamingHttpResponse under
+ASGI: each chunk of rows is fetched in one sync_to_async call.
+"""
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .resources import PartResource
+
+
+EXPORT_FIELDS = PartResource.Meta.fields
+DEFAULT_CHUNK_SIZE = 2000
+
+# The search page's CSV layout: friendly headers, "$12.50" costs, m/d/yyyy dates
+DISPLAY_COLUMNS = (
+    ('Item Number', 'item_number'),
+    ('Description', 'description'),
+    ('Size', 'size'),
+    ('Vendor Name', 'vendor_name'),
+    ('Unit Cost', 'unit_cost'),
+    ('Unit Cost Date', 'unit_cost_date'),
+    ('Vendor Product Number', 'vendor_product_number'),
+    ('Vendor Product Description', 'vendor_product_description'),
+    ('Vendor Phone', 'vendor_phone'),
+    ('Product Group ID', 'product_group_id'),
+    ('Last Updated', 'last_updated'),
+)
+DISPLAY_HEADERS = [header for header, _ in DISPLAY_COLUMNS]
+DISPLAY_FIELDS = [field for _, field in DISPLAY_COLUMNS]
+
+
+class Echo:
+    """Pseudo-buffer: csv.writer hands back each formatted line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def _local(value):
+    # Same wall-clock time PartResource's DateTimeWidget exports
+    if timezone.is_aware(value):
+        value = timezone.make_naive(value)
+    return value
+
+
+def _csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return _local(value).strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def _display_cell(value):
+    if not value:
+        return ''
+    if isinstance(value, Decimal):
+        return f"${value:.2f}"
+    if isinstance(value, datetime):
+        value = _local(value)
+        return f"{value.month}/{value.day}/{value.year}"
+    return value
+
+
+def _xlsx_cell(value):
+    # openpyxl rejects tz-aware datetimes
+    if isinstance(value, datetime):
+        return _local(value)
+    return value
+
+
+def iter_rows(queryset, fields=EXPORT_FIELDS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream value tuples for fields, chunk_size rows per database fetch"""
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def csv_line(cell=_csv_cell):
+    """Function formatting one row as a CSV line, each value through cell"""
+    writer = csv.writer(Echo())
+    return lambda row: writer.writerow([cell(value) for value in row])
+
+
+def display_csv_line():
+    """csv_line() for the DISPLAY_COLUMNS layout"""
+    return csv_line(_display_cell)
+
+
+def ndjson_line(fields):
+    """Function formatting one row as a JSON object line (NDJSON)"""
+    return lambda row: json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def csv_lines(rows, headers):
+    """Yield the CSV header line, then one line per row"""
+    line = csv_line()
+    yield line(headers)
+    for row in rows:
+        yield line(row)
+
+
+def ndjson_lines(rows, fields):
+    """Yield one JSON object per line (NDJSON)"""
+    line = ndjson_line(fields)
+    for row in rows:
+        yield line(row)
+
+
+async def stream_lines(queryset, fields, line, header=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Async iterator of export text: header, if given, then each chunk of rows
+    rendered with line(). Every fetch of chunk_size rows is one sync_to_async
+    call on the same cursor, so an ASGI server streams the export instead of
+    buffering it, and the cursor is closed if the client goes away.
+    """
+    if header is not None:
+        yield header
+    rows = iter_rows(queryset, fields, chunk_size)
+    fetch = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    try:
+        while chunk := await fetch():
+            yield ''.join(line(row) for row in chunk)
+    finally:
+        await sync_to_async(rows.close)()
+
+
+def write_xlsx(fileobj, rows, headers) -> int:
+    """Write rows to fileobj with openpyxl's write-only mode; returns the row count"""
+    wb = Workbook(write_only=True)
+    sheet = wb.create_sheet('Parts')
+    sheet.append(list(headers))
+    count = 0
+    for row in rows:
+        sheet.append([_xlsx_cell(value) for value in row])
+        count += 1
+    wb.save(fileobj)
+    return count
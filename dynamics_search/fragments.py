@@ -0,0 +1,58 @@
+"""
+Cached HTML fragments for search result pages.
+
+A part's row in search_results.html only changes when the part does, so rows
+are rendered once and cached under (part id, hash of the part's fields,
+searched columns, match badge). A results page is assembled from the cached
+rows and only the misses go through the template engine. The hash covers the
+values the row is rendered from, so any change to a part moves it to a new
+key, however it was written (bulk syncs don't always touch last_updated);
+old rows expire.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.defaultfilters import floatformat
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from .metrics import CACHE_LOOKUPS
+
+ROW_TEMPLATE = 'dynamics_search/includes/result_row.html'
+# Bump when result_row.html changes so cached rows aren't served in the old markup
+ROW_TEMPLATE_VERSION = 1
+
+
+def row_cache_key(part, columns):
+    """Cache key for the row of a search_api result dict"""
+    searched = ','.join(sorted(columns)) or 'all'
+    # The match badge is the only query-dependent markup in a row
+    match = floatformat(part['similarity'], 0)
+    fields = {name: value for name, value in part.items() if name != 'similarity'}
+    content = hashlib.md5(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+    return f"dynamics_search:row:v{ROW_TEMPLATE_VERSION}:{part['id']}:{content}:{searched}:{match}"
+
+
+def render_result_rows(results, columns):
+    """HTML for each search_api result dict, from the cache where possible"""
+    keys = [row_cache_key(part, columns) for part in results]
+    cached = cache.get_many(keys)
+
+    rows = []
+    missing = {}
+    template = get_template(ROW_TEMPLATE)
+    for key, part in zip(keys, results):
+        if key in cached:
+            rows.append(mark_safe(cached[key]))
+        else:
+            row = template.render({'part': part})
+            missing[key] = str(row)
+            rows.append(row)
+
+    if missing:
+        cache.set_many(missing, settings.SEARCH_ROW_CACHE_TIMEOUT)
+    CACHE_LOOKUPS.inc(len(results) - len(missing), cache='search_row', result='hit')
+    CACHE_LOOKUPS.inc(len(missing), cache='search_row', result='miss')
+    return rows
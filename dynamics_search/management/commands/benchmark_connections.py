@@ -0,0 +1,170 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from dynamics_search.benchmarks import (
+    benchmark_database, compare_results, run_metadata, summarize_ms, write_results,
+)
+from dynamics_search.models import Part
+from dynamics_search.search_index import refresh_item_search_vectors
+from dynamics_search.synthetic import generate_parts
+
+
+# mode -> settings applied to the default database for that run
+MODES = {
+    'per_request': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'persistent': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True},
+    'pool': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {'pool': True}},
+}
+
+
+def pool_available():
+    """Django's pool option needs PostgreSQL and psycopg_pool"""
+    if connections['default'].vendor != 'postgresql':
+        return False
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request, persistent and pooled database connections under concurrent requests'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Concurrent client threads (default: 8)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Requests per thread and mode (default: 200)'
+        )
+        parser.add_argument(
+            '--url',
+            type=str,
+            default='/search/suggestions/?q=valve',
+            help='Path requested by every thread (default: /search/suggestions/?q=valve)'
+        )
+        parser.add_argument(
+            '--modes',
+            type=str,
+            default=','.join(MODES),
+            help=f'Modes to run (default: {",".join(MODES)}); pool is skipped without PostgreSQL and psycopg_pool'
+        )
+        parser.add_argument(
+            '--parts',
+            type=int,
+            default=5000,
+            help='Synthetic parts seeded into the benchmark database (default: 5000)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Where to write the JSON results (default: benchmarks/connections-<timestamp>.json)'
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='Previous results JSON to compare mean latency against'
+        )
+    
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+        
+        results = []
+        with benchmark_database('connections_bench'):
+            Part.objects.all().delete()
+            for chunk in generate_parts(options['parts'], chunk_size=5000):
+                Part.objects.bulk_create(chunk, batch_size=2000)
+                refresh_item_search_vectors(part.item_number for part in chunk)
+            
+            for mode in modes:
+                if mode == 'pool' and not pool_available():
+                    self.stdout.write(self.style.WARNING('Skipping pool: needs PostgreSQL and psycopg[pool]'))
+                    continue
+                row = self.run_mode(mode, options)
+                results.append(row)
+                self.stdout.write(
+                    f"  {mode:<12} mean {row['mean_ms']:>7.2f}ms  p95 {row['p95_ms']:>7.2f}ms  "
+                    f"{row['requests_per_second']:>8.1f} req/s  connections opened {row['connections_opened']}"
+                )
+            metadata = run_metadata(threads=options['threads'], url=options['url'])
+        
+        path = write_results('connections', {'meta': metadata, 'results': results}, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
+        
+        if options['compare']:
+            self.stdout.write("\nCompared with previous run:")
+            for line in compare_results(results, options['compare'], ('mode',), 'mean_ms'):
+                self.stdout.write(f"  {line}")
+    
+    def run_mode(self, mode, options):
+        # New thread-local connections are built from this shared settings dict
+        connections.close_all()
+        db_settings = connections.settings['default']
+        saved = {key: db_settings.get(key) for key in MODES[mode]}
+        for key, value in MODES[mode].items():
+            db_settings[key] = {**db_settings.get('OPTIONS', {}), **value} if key == 'OPTIONS' else value
+        
+        opened = []
+        lock = threading.Lock()
+        
+        def count_connection(sender, **kwargs):
+            with lock:
+                opened.append(1)
+        
+        def worker(_):
+            client = Client()
+            durations = []
+            try:
+                for _ in range(options['requests']):
+                    started = time.perf_counter()
+                    # The test client skips the request_started/finished
+                    # connection handling that the WSGI handler does
+                    close_old_connections()
+                    response = client.get(options['url'])
+                    close_old_connections()
+                    durations.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise CommandError(f"{options['url']} returned {response.status_code}")
+            finally:
+                connections.close_all()
+            return durations
+        
+        connection_created.connect(count_connection)
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                durations = [d for thread_durations in pool.map(worker, range(options['threads']))
+                             for d in thread_durations]
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count_connection)
+            for key, value in saved.items():
+                if value is None:
+                    db_settings.pop(key, None)
+                else:
+                    db_settings[key] = value
+            connections.close_all()
+        
+        return {
+            'mode': mode,
+            'threads': options['threads'],
+            'requests': len(durations),
+            **summarize_ms(durations),
+            'requests_per_second': round(len(durations) / elapsed, 1),
+            'connections_opened': len(opened),
+        }
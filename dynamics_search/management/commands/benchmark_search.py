@@ -0,0 +1,191 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from dynamics_search.benchmarks import (
+    benchmark_database, compare_results, run_metadata, summarize_ms, write_results,
+)
+from dynamics_search.models import Part
+from dynamics_search.search_index import bump_catalog_version, refresh_item_search_vectors
+from dynamics_search.synthetic import (
+    DEFAULT_SEED, ITEM_NUMBER_BASE, MATERIALS, PART_TYPES, generate_parts,
+)
+
+
+QUERY_KINDS = ['exact', 'multi_term', 'multi_wildcard', 'column_scoped', 'deep_page', 'suggestions']
+
+
+def build_requests(kind, count, catalog_size, rng):
+    """(url name, GET params) pairs for one query kind, drawn from the synthetic vocabulary"""
+    requests = []
+    for _ in range(count):
+        part_type = rng.choice(list(PART_TYPES))
+        material = rng.choice(MATERIALS).lower()
+        word = part_type.split()[0].lower()
+        if kind == 'exact':
+            params = {'q': str(ITEM_NUMBER_BASE + rng.randrange(catalog_size))}
+        elif kind == 'multi_term':
+            params = {'q': f"{material} {word}"}
+        elif kind == 'multi_wildcard':
+            params = {'q': f"*{material}*{word}*"}
+        elif kind == 'column_scoped':
+            params = {'q': word, 'columns': [rng.choice(['description', 'size', 'vendor_name'])]}
+        elif kind == 'deep_page':
+            params = {'q': word, 'page': rng.randint(20, 200)}
+        else:
+            requests.append(('dynamics_search:search_suggestions', {'q': word[:rng.randint(2, 4)]}))
+            continue
+        requests.append(('dynamics_search:search_api', params))
+    return requests
+
+
+class Command(BaseCommand):
+    help = 'Benchmark search_api and search_suggestions latency on seeded catalogs of several sizes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            default='10000,100000,1000000',
+            help='Comma-separated catalog sizes, seeded incrementally (default: 10000,100000,1000000)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Measured requests per query kind and size (default: 50)'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Unmeasured requests per query kind before timing (default: 5)'
+        )
+        parser.add_argument(
+            '--kinds',
+            type=str,
+            default=','.join(QUERY_KINDS),
+            help=f'Query kinds to run (default: {",".join(QUERY_KINDS)})'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=DEFAULT_SEED,
+            help=f'Seed for the catalog and the query mix (default: {DEFAULT_SEED})'
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the benchmark database (and its seeded catalog) for the next run'
+        )
+        parser.add_argument(
+            '--no-alloc',
+            action='store_true',
+            help='Skip the tracemalloc pass that measures allocations per request'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Where to write the JSON results (default: benchmarks/search-<timestamp>.json)'
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='Previous results JSON to compare p95 latency against'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        kinds = [kind.strip() for kind in options['kinds'].split(',') if kind.strip()]
+        unknown = set(kinds) - set(QUERY_KINDS)
+        if unknown:
+            raise CommandError(f"Unknown query kinds: {', '.join(sorted(unknown))}")
+        
+        seed = options['seed']
+        results = []
+        
+        with benchmark_database('search_bench', keepdb=options['keepdb']):
+            for size in sizes:
+                self.seed_catalog(size, seed)
+                for kind in kinds:
+                    row = self.run_kind(kind, size, seed, options)
+                    results.append(row)
+                    self.stdout.write(
+                        f"  {size:>8} {kind:<15} p50 {row['p50_ms']:>8.2f}ms  p95 {row['p95_ms']:>8.2f}ms  "
+                        f"p99 {row['p99_ms']:>8.2f}ms  queries {row['queries_mean']:.1f}  "
+                        f"alloc {row['alloc_peak_kib_mean']:.0f}KiB"
+                    )
+            metadata = run_metadata(seed=seed, sizes=sizes, requests=options['requests'])
+        
+        path = write_results('search', {'meta': metadata, 'results': results}, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
+        
+        if options['compare']:
+            self.stdout.write("\nCompared with previous run:")
+            for line in compare_results(results, options['compare'], ('catalog_size', 'kind'), 'p95_ms'):
+                self.stdout.write(f"  {line}")
+    
+    def seed_catalog(self, size, seed):
+        """Grow the deterministic catalog to size parts"""
+        existing = Part.objects.count()
+        if existing >= size:
+            return
+        self.stdout.write(f"Seeding catalog to {size} parts...")
+        for chunk in generate_parts(size - existing, seed=seed, start=existing, chunk_size=10000):
+            Part.objects.bulk_create(chunk, batch_size=2000, ignore_conflicts=True)
+            refresh_item_search_vectors(part.item_number for part in chunk)
+        bump_catalog_version()
+    
+    def run_kind(self, kind, size, seed, options):
+        rng = random.Random(f"{seed}-{kind}-{size}")
+        warmup = build_requests(kind, options['warmup'], size, rng)
+        measured = build_requests(kind, options['requests'], size, rng)
+        client = Client()
+        
+        def get(name, params):
+            response = client.get(reverse(name), params, HTTP_ACCEPT='application/json')
+            if response.status_code != 200:
+                raise CommandError(f"{name} {params} returned {response.status_code}")
+            return response
+        
+        for name, params in warmup:
+            get(name, params)
+        
+        # Timing pass without instrumentation
+        durations = []
+        for name, params in measured:
+            started = time.perf_counter()
+            get(name, params)
+            durations.append(time.perf_counter() - started)
+        
+        # Second pass for query counts and allocations, which would skew timings
+        query_counts = []
+        peaks = []
+        for name, params in measured:
+            if not options['no_alloc']:
+                tracemalloc.start()
+            with CaptureQueriesContext(connection) as ctx:
+                get(name, params)
+            query_counts.append(len(ctx))
+            if not options['no_alloc']:
+                peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+                tracemalloc.stop()
+        
+        return {
+            'catalog_size': size,
+            'kind': kind,
+            'endpoint': measured[0][0] if measured else '',
+            'requests': len(measured),
+            **summarize_ms(durations),
+            'queries_mean': round(sum(query_counts) / len(query_counts), 2) if query_counts else 0,
+            'queries_max': max(query_counts, default=0),
+            'alloc_peak_kib_mean': round(sum(peaks) / len(peaks), 1) if peaks else 0.0,
+        }
@@ -0,0 +1,215 @@
+import io
+import os
+import tempfile
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from dynamics_search.benchmarks import (
+    BENCHMARK_DIR, StageRecorder, compare_results, run_metadata, write_results, benchmark_database,
+)
+from dynamics_search.management.commands.sync_from_excel import SYNC_CHUNK_SIZE, Command as SyncCommand
+from dynamics_search.models import Part
+from dynamics_search.search_index import refresh_item_search_vectors
+from dynamics_search.synthetic import DEFAULT_SEED, generate_parts, make_part
+
+
+# D365 export headers; sync_from_excel normalizes them to snake_case
+WORKBOOK_COLUMNS = {
+    'Item number': 'item_number',
+    'Description': 'description',
+    'Size': 'size',
+    'Product group id': 'product_group_id',
+    'Vendor name': 'vendor_name',
+}
+
+
+def build_workbook_frame(rows, change_rate, seed):
+    """
+    The catalog of rows parts as the next export would show it.
+
+    A quarter of the changed rows disappear (soft-deleted by the sync), a
+    quarter are new item numbers, and the rest have a revised description.
+    """
+    changed = round(rows * change_rate)
+    deleted = changed // 4
+    created = changed // 4
+    updated = changed - deleted - created
+
+    indexes = list(range(rows - deleted)) + list(range(rows, rows + created))
+    records = []
+    for position, index in enumerate(indexes):
+        part = make_part(index, seed)
+        record = {header: getattr(part, field) for header, field in WORKBOOK_COLUMNS.items()}
+        if position < updated:
+            record['Description'] = f"{record['Description']} REV B"
+        records.append(record)
+    return pd.DataFrame.from_records(records, columns=list(WORKBOOK_COLUMNS))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the sync_from_excel pipeline stage by stage on generated workbooks'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=str,
+            default='10000',
+            help='Comma-separated catalog sizes (default: 10000)'
+        )
+        parser.add_argument(
+            '--change-rates',
+            type=str,
+            default='0.01,0.1,1.0',
+            help='Comma-separated fractions of rows changed between syncs (default: 0.01,0.1,1.0)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=DEFAULT_SEED,
+            help=f'Seed for the synthetic catalog (default: {DEFAULT_SEED})'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=SYNC_CHUNK_SIZE,
+            help=f'Parts written per committed transaction, as in sync_from_excel (default: {SYNC_CHUNK_SIZE})'
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the benchmark database after the run'
+        )
+        parser.add_argument(
+            '--no-memory',
+            action='store_true',
+            help='Skip tracemalloc; timings are closer to production without it'
+        )
+        parser.add_argument(
+            '--profile',
+            type=str,
+            choices=['cprofile', 'pyinstrument'],
+            help='Profile every run and save the report under benchmarks/'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Where to write the JSON results (default: benchmarks/sync-<timestamp>.json)'
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='Previous results JSON to compare stage timings against'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(rows) for rows in options['rows'].split(','))
+            rates = [float(rate) for rate in options['change_rates'].split(',')]
+        except ValueError:
+            raise CommandError('--rows must be integers and --change-rates fractions')
+        if any(not 0 <= rate <= 1 for rate in rates):
+            raise CommandError('--change-rates must be between 0 and 1')
+        
+        if options['profile'] == 'pyinstrument':
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                raise CommandError('pyinstrument is not installed. Install with: pip install pyinstrument')
+        
+        seed = options['seed']
+        results = []
+        
+        with benchmark_database('sync_bench', keepdb=options['keepdb']), \
+                tempfile.TemporaryDirectory() as work_dir:
+            for rows in sizes:
+                for rate in rates:
+                    self.stdout.write(f"\n{rows} rows, {rate:.0%} changed")
+                    stages = self.run_pipeline(rows, rate, seed, work_dir, options)
+                    for stage in stages:
+                        results.append({'rows': rows, 'change_rate': rate, **stage})
+                        self.stdout.write(
+                            f"  {stage['stage']:<14} {stage['seconds']:>9.3f}s  "
+                            f"queries {stage['queries']:>6}  peak {stage['peak_mib']:>8.2f}MiB"
+                        )
+            metadata = run_metadata(seed=seed, rows=sizes, change_rates=rates)
+        
+        path = write_results('sync', {'meta': metadata, 'results': results}, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"\nResults written to {path}"))
+        
+        if options['compare']:
+            self.stdout.write("\nCompared with previous run:")
+            for line in compare_results(results, options['compare'], ('rows', 'change_rate', 'stage'), 'seconds'):
+                self.stdout.write(f"  {line}")
+    
+    def reset_catalog(self, rows, seed):
+        """Replace the benchmark database's parts with the base catalog"""
+        Part.objects.all().delete()
+        for chunk in generate_parts(rows, seed=seed, chunk_size=10000):
+            Part.objects.bulk_create(chunk, batch_size=2000)
+            refresh_item_search_vectors(part.item_number for part in chunk)
+    
+    def run_pipeline(self, rows, rate, seed, work_dir, options):
+        self.reset_catalog(rows, seed)
+        
+        excel_path = os.path.join(work_dir, f"parts-{rows}-{rate}.xlsx")
+        csv_path = os.path.join(work_dir, f"parts-{rows}-{rate}.csv")
+        build_workbook_frame(rows, rate, seed).to_excel(excel_path, index=False)
+        
+        # The sync's own progress messages are noise here
+        sync = SyncCommand(stdout=io.StringIO())
+        recorder = StageRecorder(track_memory=not options['no_memory'])
+        profiler = self.start_profiler(options['profile'])
+        
+        with recorder.stage('excel_read'):
+            df = sync.read_excel_data(excel_path)
+        with recorder.stage('csv_write'):
+            df.to_csv(csv_path, index=False)
+        with recorder.stage('csv_load'):
+            df = sync.load_csv_data(csv_path)
+        
+        # Same sequence as sync_database(), which commits per chunk
+        with recorder.stage('load_existing'):
+            existing_parts = sync.load_existing_parts()
+        with recorder.stage('diff'):
+            to_create, to_update, processed = sync.diff_rows(df, existing_parts)
+        with recorder.stage('bulk_write'):
+            sync.write_changes(to_create, to_update, options['chunk_size'])
+        with recorder.stage('soft_delete'):
+            missing = sync.mark_missing(existing_parts, processed, chunk_size=options['chunk_size'])
+        
+        if profiler:
+            self.save_profile(profiler, options['profile'], f"sync-{rows}-{rate:g}")
+        
+        self.stdout.write(
+            f"  {len(to_create)} created, {len(to_update)} updated, {len(missing)} soft-deleted"
+        )
+        return recorder.stages
+    
+    def start_profiler(self, kind):
+        if kind == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if kind == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        return None
+    
+    def save_profile(self, profiler, kind, name):
+        BENCHMARK_DIR.mkdir(exist_ok=True)
+        if kind == 'cprofile':
+            import pstats
+            profiler.disable()
+            path = BENCHMARK_DIR / f"{name}.prof"
+            profiler.dump_stats(path)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(15)
+            self.stdout.write(stream.getvalue())
+        else:
+            profiler.stop()
+            path = BENCHMARK_DIR / f"{name}.html"
+            path.write_text(profiler.output_html(), encoding='utf-8')
+        self.stdout.write(f"  Profile saved to {path}")
@@ -1,9 +1,20 @@
 from django.core.management.base import BaseCommand
 from dynamics_search.models import Part
-from dynamics_search.resources import PartResource
+from dynamics_search.exporters import (
+    DEFAULT_CHUNK_SIZE, EXPORT_FIELDS, csv_lines, iter_rows, ndjson_lines, write_xlsx,
+)
 import os
 
 
+SAMPLE_SIZE = 5
+
+FILE_EXTENSIONS = {
+    'csv': 'csv',
+    'xlsx': 'xlsx',
+    'json': 'ndjson',
+}
+
+
 class Command(BaseCommand):
     help = 'Export parts data to CSV files for testing import/export functionality'
     
@@ -19,18 +30,25 @@ class Command(BaseCommand):
             type=str,
             choices=['csv', 'xlsx', 'json'],
             default='csv',
-            help='Export format (default: csv)'
+            help='Export format; json is written line-delimited to parts.ndjson (default: csv)'
         )
         parser.add_argument(
             '--limit',
             type=int,
             help='Limit number of records to export'
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Rows fetched from the database per round trip (default: {DEFAULT_CHUNK_SIZE})'
+        )
     
     def handle(self, *args, **options):
         output_dir = options['output_dir']
         export_format = options['format']
         limit = options.get('limit')
+        chunk_size = options['chunk_size']
         
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
@@ -43,36 +61,50 @@ class Command(BaseCommand):
                 queryset = queryset[:limit]
             
             if queryset.exists():
-                # Export data
-                resource = PartResource()
-                dataset = resource.export(queryset)
+                # Rows are streamed straight into the file; the first few are kept for the summary
+                sample = []
                 
-                # Save to file
-                file_path = os.path.join(output_dir, f"parts.{export_format}")
+                def rows():
+                    for row in iter_rows(queryset, EXPORT_FIELDS, chunk_size):
+                        if len(sample) < SAMPLE_SIZE:
+                            sample.append(row)
+                        yield row
                 
-                with open(file_path, 'wb') as f:
+                file_path = os.path.join(output_dir, f"parts.{FILE_EXTENSIONS[export_format]}")
+                
+                if export_format == 'xlsx':
+                    with open(file_path, 'wb') as f:
+                        count = write_xlsx(f, rows(), EXPORT_FIELDS)
+                else:
                     if export_format == 'csv':
-                        f.write(dataset.csv.encode('utf-8'))
-                    elif export_format == 'xlsx':
-                        f.write(dataset.xlsx)
-                    elif export_format == 'json':
-                        f.write(dataset.json.encode('utf-8'))
+                        lines = csv_lines(rows(), EXPORT_FIELDS)
+                        header_lines = 1
+                    else:
+                        lines = ndjson_lines(rows(), EXPORT_FIELDS)
+                        header_lines = 0
+                    
+                    count = -header_lines
+                    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+                        for line in lines:
+                            f.write(line)
+                            count += 1
                 
                 self.stdout.write(
-                    self.style.SUCCESS(f"Exported {queryset.count()} parts to {file_path}")
+                    self.style.SUCCESS(f"Exported {count} parts to {file_path}")
                 )
                 
                 # Show sample of exported data
                 self.stdout.write("\nSample exported data:")
-                sample_data = queryset[:5]
-                for part in sample_data:
-                    self.stdout.write(f"  - {part.item_number}: {part.description[:50]}...")
-                
+                item_index = EXPORT_FIELDS.index('item_number')
+                description_index = EXPORT_FIELDS.index('description')
+                for row in sample:
+                    self.stdout.write(f"  - {row[item_index]}: {(row[description_index] or '')[:50]}...")
+            
             else:
                 self.stdout.write(
                     self.style.WARNING("No parts found to export. Run 'python manage.py seed_parts' first.")
                 )
-                
+        
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f"Error exporting parts: {str(e)}")
@@ -1,7 +1,9 @@
 from django.core.management.base import BaseCommand
 from django.core.files.base import ContentFile
-from dynamics_search.models import Part
+from dynamics_search.models import Part, SyncRun
 from dynamics_search.resources import PartResource
+from dynamics_search.sync_runs import heartbeat, stage, sync_run
+from contextlib import nullcontext
 import os
 import csv
 
@@ -44,166 +46,189 @@ class Command(BaseCommand):
             )
             return
         
-        # Create resource instance
-        resource = PartResource()
-        
-        # Read and process CSV file
-        try:
-            # Try different encodings
-            encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1']
-            file_content = None
-            
-            for encoding in encodings:
-                try:
-                    with open(csv_file, 'r', encoding=encoding) as f:
-                        file_content = f.read()
-                    self.stdout.write(f"Successfully read file with {encoding} encoding")
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            if file_content is None:
-                self.stdout.write(
-                    self.style.ERROR(f"Could not read file with any supported encoding. Tried: {', '.join(encodings)}")
-                )
-                return
-            
-            # Process the file content
-            from io import StringIO
-            f = StringIO(file_content)
+        # Dry runs don't write, so they don't need the sync lock
+        with nullcontext() if dry_run else sync_run(SyncRun.SOURCE_CSV) as run:
+            # Create resource instance
+            resource = PartResource()
             
-            # Detect delimiter
-            sample = f.read(1024)
-            f.seek(0)
-            sniffer = csv.Sniffer()
-            delimiter = sniffer.sniff(sample).delimiter
-            
-            # Read CSV
-            reader = csv.DictReader(f, delimiter=delimiter)
-            
-            # Map CSV columns to model fields
-            field_mapping = {
-                'Item': 'item_number',
-                'ItemNumber': 'item_number', 
-                'ProductDescription': 'description',
-                'ProductGroupId': 'product_group_id',
-                'UnitCost': 'unit_cost',
-                'UnitCostDate': 'unit_cost_date',
-                'VendorName': 'vendor_name',
-                'VendorProductNumber': 'vendor_product_number',
-                'VendorProductDescription': 'vendor_product_description',
-                'VendorPhone': 'vendor_phone'
-            }
-            
-            imported_count = 0
-            error_count = 0
-            skipped_count = 0
-            
-            self.stdout.write(f"Processing CSV file: {csv_file}")
-            self.stdout.write(f"Delimiter detected: '{delimiter}'")
-            self.stdout.write(f"Dry run: {dry_run}")
-            self.stdout.write("-" * 50)
-            
-            batch = []
-            for row_num, row in enumerate(reader, 1):
-                try:
-                    # Map CSV fields to model fields
-                    mapped_row = {}
-                    for csv_field, model_field in field_mapping.items():
-                        if csv_field in row:
-                            mapped_row[model_field] = row[csv_field]
-                    
-                    # Skip empty rows
-                    if not mapped_row.get('item_number'):
-                        skipped_count += 1
-                        continue
-                    
-                    if dry_run:
-                        self.stdout.write(f"Row {row_num}: {mapped_row['item_number']} - {mapped_row.get('description', 'No description')[:50]}")
-                    else:
-                        batch.append(mapped_row)
-                        
-                        # Process batch when it reaches batch_size
-                        if len(batch) >= batch_size:
-                            # Create a dataset from the batch
-                            from tablib import Dataset
-                            dataset = Dataset()
-                            # Remove duplicate item_number from headers
-                            unique_headers = []
-                            for field in field_mapping.values():
-                                if field not in unique_headers:
-                                    unique_headers.append(field)
-                            dataset.headers = unique_headers
-                            for row_data in batch:
-                                dataset.append([row_data.get(field, '') for field in unique_headers])
+            # Read and process CSV file
+            try:
+                # Try different encodings
+                encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1']
+                file_content = None
+                
+                with stage(run, 'read_file'):
+                    for encoding in encodings:
+                        try:
+                            with open(csv_file, 'r', encoding=encoding) as f:
+                                file_content = f.read()
+                            self.stdout.write(f"Successfully read file with {encoding} encoding")
+                            break
+                        except UnicodeDecodeError:
+                            continue
+                
+                if file_content is None:
+                    self.stdout.write(
+                        self.style.ERROR(f"Could not read file with any supported encoding. Tried: {', '.join(encodings)}")
+                    )
+                    if run is not None:
+                        run.status = SyncRun.STATUS_FAILED
+                        run.error = 'Unsupported file encoding'
+                    return
+                
+                # Process the file content
+                from io import StringIO
+                f = StringIO(file_content)
+                
+                # Detect delimiter
+                sample = f.read(1024)
+                f.seek(0)
+                sniffer = csv.Sniffer()
+                delimiter = sniffer.sniff(sample).delimiter
+                
+                # Read CSV
+                reader = csv.DictReader(f, delimiter=delimiter)
+                
+                # Map CSV columns to model fields
+                field_mapping = {
+                    'Item': 'item_number',
+                    'ItemNumber': 'item_number', 
+                    'ProductDescription': 'description',
+                    'ProductGroupId': 'product_group_id',
+                    'UnitCost': 'unit_cost',
+                    'UnitCostDate': 'unit_cost_date',
+                    'VendorName': 'vendor_name',
+                    'VendorProductNumber': 'vendor_product_number',
+                    'VendorProductDescription': 'vendor_product_description',
+                    'VendorPhone': 'vendor_phone'
+                }
+                
+                imported_count = 0
+                error_count = 0
+                skipped_count = 0
+                
+                self.stdout.write(f"Processing CSV file: {csv_file}")
+                self.stdout.write(f"Delimiter detected: '{delimiter}'")
+                self.stdout.write(f"Dry run: {dry_run}")
+                self.stdout.write("-" * 50)
+                
+                with stage(run, 'import'):
+                    batch = []
+                    row_num = 0  # stays 0 for a file with only a header row
+                    for row_num, row in enumerate(reader, 1):
+                        try:
+                            # Map CSV fields to model fields
+                            mapped_row = {}
+                            for csv_field, model_field in field_mapping.items():
+                                if csv_field in row:
+                                    mapped_row[model_field] = row[csv_field]
+                            
+                            # Skip empty rows
+                            if not mapped_row.get('item_number'):
+                                skipped_count += 1
+                                continue
                             
-                            result = resource.import_data(dataset, dry_run=False)
-                            if result.has_errors():
+                            if dry_run:
+                                self.stdout.write(f"Row {row_num}: {mapped_row['item_number']} - {mapped_row.get('description', 'No description')[:50]}")
+                            else:
+                                batch.append(mapped_row)
+                                
+                                # Process batch when it reaches batch_size
+                                if len(batch) >= batch_size:
+                                    # Create a dataset from the batch
+                                    from tablib import Dataset
+                                    dataset = Dataset()
+                                    # Remove duplicate item_number from headers
+                                    unique_headers = []
+                                    for field in field_mapping.values():
+                                        if field not in unique_headers:
+                                            unique_headers.append(field)
+                                    dataset.headers = unique_headers
+                                    for row_data in batch:
+                                        dataset.append([row_data.get(field, '') for field in unique_headers])
+                                    
+                                    result = resource.import_data(dataset, dry_run=False)
+                                    self.count_rows(run, result)
+                                    heartbeat(run)
+                                    if result.has_errors():
+                                        self.stdout.write(
+                                            self.style.WARNING(f"Errors in batch starting at row {row_num - batch_size + 1}:")
+                                        )
+                                        for error in result.row_errors():
+                                            self.stdout.write(f"  Row {error[0]}: {error[1]}")
+                                            error_count += 1
+                                    else:
+                                        imported_count += len(batch)
+                                    
+                                    batch = []
+                            
+                        except Exception as e:
+                            error_count += 1
+                            if skip_errors:
                                 self.stdout.write(
-                                    self.style.WARNING(f"Errors in batch starting at row {row_num - batch_size + 1}:")
+                                    self.style.WARNING(f"Error processing row {row_num}: {str(e)}")
                                 )
-                                for error in result.row_errors():
-                                    self.stdout.write(f"  Row {error[0]}: {error[1]}")
-                                    error_count += 1
+                                continue
                             else:
-                                imported_count += len(batch)
-                            
-                            batch = []
+                                self.stdout.write(
+                                    self.style.ERROR(f"Error processing row {row_num}: {str(e)}")
+                                )
+                                if not dry_run:
+                                    break
                     
-                except Exception as e:
-                    error_count += 1
-                    if skip_errors:
-                        self.stdout.write(
-                            self.style.WARNING(f"Error processing row {row_num}: {str(e)}")
-                        )
-                        continue
-                    else:
-                        self.stdout.write(
-                            self.style.ERROR(f"Error processing row {row_num}: {str(e)}")
-                        )
-                        if not dry_run:
-                            break
-            
-            # Process remaining batch
-            if not dry_run and batch:
-                # Create a dataset from the batch
-                from tablib import Dataset
-                dataset = Dataset()
-                # Remove duplicate item_number from headers
-                unique_headers = []
-                for field in field_mapping.values():
-                    if field not in unique_headers:
-                        unique_headers.append(field)
-                dataset.headers = unique_headers
-                for row_data in batch:
-                    dataset.append([row_data.get(field, '') for field in unique_headers])
-                
-                result = resource.import_data(dataset, dry_run=False)
-                if result.has_errors():
+                    # Process remaining batch
+                    if not dry_run and batch:
+                        # Create a dataset from the batch
+                        from tablib import Dataset
+                        dataset = Dataset()
+                        # Remove duplicate item_number from headers
+                        unique_headers = []
+                        for field in field_mapping.values():
+                            if field not in unique_headers:
+                                unique_headers.append(field)
+                        dataset.headers = unique_headers
+                        for row_data in batch:
+                            dataset.append([row_data.get(field, '') for field in unique_headers])
+                        
+                        result = resource.import_data(dataset, dry_run=False)
+                        self.count_rows(run, result)
+                        heartbeat(run)
+                        if result.has_errors():
+                            self.stdout.write(
+                                self.style.WARNING(f"Errors in final batch:")
+                            )
+                            for error in result.row_errors():
+                                self.stdout.write(f"  Row {error[0]}: {error[1]}")
+                                error_count += 1
+                        else:
+                            imported_count += len(batch)
+                    
+                # Summary
+                self.stdout.write("-" * 50)
+                if dry_run:
                     self.stdout.write(
-                        self.style.WARNING(f"Errors in final batch:")
+                        self.style.SUCCESS(f"Dry run completed. Would import {row_num - skipped_count} rows")
                     )
-                    for error in result.row_errors():
-                        self.stdout.write(f"  Row {error[0]}: {error[1]}")
-                        error_count += 1
                 else:
-                    imported_count += len(batch)
-            
-            # Summary
-            self.stdout.write("-" * 50)
-            if dry_run:
-                self.stdout.write(
-                    self.style.SUCCESS(f"Dry run completed. Would import {row_num - skipped_count} rows")
-                )
-            else:
+                    self.stdout.write(
+                        self.style.SUCCESS(f"Import completed!")
+                    )
+                    self.stdout.write(f"  Imported: {imported_count} parts")
+                    self.stdout.write(f"  Errors: {error_count} rows")
+                    self.stdout.write(f"  Skipped: {skipped_count} empty rows")
+                    run.rows_read = row_num - skipped_count
+                    if error_count:
+                        run.error = f"{error_count} rows failed to import"
+                    
+            except Exception as e:
                 self.stdout.write(
-                    self.style.SUCCESS(f"Import completed!")
+                    self.style.ERROR(f"Error reading CSV file: {str(e)}")
                 )
-                self.stdout.write(f"  Imported: {imported_count} parts")
-                self.stdout.write(f"  Errors: {error_count} rows")
-                self.stdout.write(f"  Skipped: {skipped_count} empty rows")
-                
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f"Error reading CSV file: {str(e)}")
-            )
+                if run is not None:
+                    run.status = SyncRun.STATUS_FAILED
+                    run.error = str(e)
+    
+    def count_rows(self, run, result):
+        """Add an import_data() result's created/updated totals to the sync run"""
+        run.rows_created += result.totals.get('new', 0)
+        run.rows_updated += result.totals.get('update', 0)
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from dynamics_search.models import Part
+from dynamics_search.search_index import DEFAULT_CHUNK_SIZE, refresh_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Recompute Part.search_vector for the whole catalog with chunked set-based UPDATEs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Number of parts updated per statement (default: {DEFAULT_CHUNK_SIZE})'
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only refresh parts whose search vector is empty'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        queryset = Part.objects.all()
+        if options['missing_only']:
+            queryset = queryset.filter(search_vector__isnull=True)
+
+        total = queryset.count()
+        self.stdout.write(f"Refreshing search vectors for {total} parts (chunk size {chunk_size})...")
+        started = time.monotonic()
+
+        def progress(done):
+            elapsed = time.monotonic() - started
+            rate = done / elapsed if elapsed else 0
+            self.stdout.write(f"  {done}/{total} parts ({rate:.0f}/s)")
+
+        updated = refresh_search_vectors(queryset, chunk_size=chunk_size, progress=progress)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Refreshed search vectors for {updated} parts in {time.monotonic() - started:.1f}s"
+            )
+        )
@@ -1,10 +1,16 @@
 import requests
 import json
 import hashlib
+from contextlib import nullcontext
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
+from django.utils import timezone
 from django.conf import settings
-from dynamics_search.models import Part
+from dynamics_search.metrics import SYNC_ROWS, SYNC_SECONDS
+from dynamics_search.models import Part, SyncRun
+from dynamics_search.management.commands.sync_from_excel import SYNC_CHUNK_SIZE
+from dynamics_search.search_index import bump_catalog_version, refresh_item_search_vectors
+from dynamics_search.sync_runs import heartbeat, stage, sync_run
 
 
 class Command(BaseCommand):
@@ -40,6 +46,15 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be synced without making changes'
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=SYNC_CHUNK_SIZE,
+            help=(
+                f'Parts written per committed transaction (default: {SYNC_CHUNK_SIZE}). '
+                'A failed sync keeps the chunks it already committed; rerun it to finish.'
+            )
+        )
     
     def handle(self, *args, **options):
         company = options['company']
@@ -47,6 +62,10 @@ class Command(BaseCommand):
         client_secret = options['client_secret']
         tenant_id = options['tenant_id']
         dry_run = options['dry_run']
+        chunk_size = options['chunk_size']
+        
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1')
         
         if not all([client_id, client_secret, tenant_id]):
             raise CommandError(
@@ -57,32 +76,38 @@ class Command(BaseCommand):
         
         self.stdout.write(f"Starting parts sync for {company}...")
         
-        try:
-            # Get OAuth token
-            token = self.get_oauth_token(client_id, client_secret, tenant_id)
-            
-            # Fetch parts from Dynamics 365
-            parts_data = self.fetch_parts(company, token)
-            
-            if dry_run:
-                self.stdout.write(f"DRY RUN: Would sync {len(parts_data)} parts")
-                for part in parts_data[:5]:  # Show first 5
-                    self.stdout.write(f"  - {part.get('item_number', 'N/A')}: {part.get('description', 'N/A')[:50]}")
-                if len(parts_data) > 5:
-                    self.stdout.write(f"  ... and {len(parts_data) - 5} more")
-                return
-            
-            # Sync parts to database
-            created_count, updated_count = self.sync_parts(parts_data)
-            
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Sync completed: {created_count} created, {updated_count} updated"
+        # Dry runs only read, so they don't need the sync lock
+        with nullcontext() if dry_run else sync_run(SyncRun.SOURCE_ODATA) as run:
+            try:
+                # Get OAuth token
+                with stage(run, 'oauth_token'):
+                    token = self.get_oauth_token(client_id, client_secret, tenant_id)
+                
+                # Fetch parts from Dynamics 365
+                with stage(run, 'fetch'):
+                    parts_data = self.fetch_parts(company, token)
+                
+                if dry_run:
+                    self.stdout.write(f"DRY RUN: Would sync {len(parts_data)} parts")
+                    for part in parts_data[:5]:  # Show first 5
+                        self.stdout.write(f"  - {part.get('item_number', 'N/A')}: {part.get('description', 'N/A')[:50]}")
+                    if len(parts_data) > 5:
+                        self.stdout.write(f"  ... and {len(parts_data) - 5} more")
+                    return
+                
+                # Sync parts to database
+                run.rows_read = len(parts_data)
+                created_count, updated_count = self.sync_parts(parts_data, run, chunk_size)
+                run.rows_created, run.rows_updated = created_count, updated_count
+                
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Sync completed: {created_count} created, {updated_count} updated"
+                    )
                 )
-            )
-            
-        except Exception as e:
-            raise CommandError(f"Sync failed: {str(e)}")
+                
+            except Exception as e:
+                raise CommandError(f"Sync failed: {str(e)}")
     
     def get_oauth_token(self, client_id, client_secret, tenant_id):
         """Get OAuth 2.0 access token from Azure AD"""
@@ -131,62 +156,90 @@ class Command(BaseCommand):
         
         return all_parts
     
-    def sync_parts(self, parts_data):
-        """Sync parts data to database using bulk operations"""
+    def sync_parts(self, parts_data, run=None, chunk_size=SYNC_CHUNK_SIZE):
+        """
+        Sync parts data to database using bulk operations.
+        
+        Writes are committed in chunks of chunk_size, so a failed run leaves
+        the committed chunks in place; rerunning the sync finishes the job.
+        """
         created_count = 0
         updated_count = 0
         
         # Get existing parts for comparison
-        existing_parts = {
-            part.item_number: part 
-            for part in Part.objects.all()
-        }
+        with stage(run, 'load_existing'):
+            existing_parts = {
+                part.item_number: part 
+                for part in Part.objects.all()
+            }
         
         parts_to_create = []
         parts_to_update = []
         
-        for part_data in parts_data:
-            item_number = part_data.get('item_number', '').strip()
-            if not item_number:
-                continue
-            
-            description = part_data.get('description', '').strip()
-            size = part_data.get('size', '').strip()
-            
-            # Generate content hash for change detection
-            content_hash = hashlib.md5(f"{description}|{size}".encode()).hexdigest()
-            
-            if item_number in existing_parts:
-                existing_part = existing_parts[item_number]
+        with stage(run, 'diff'):
+            for part_data in parts_data:
+                item_number = part_data.get('item_number', '').strip()
+                if not item_number:
+                    continue
                 
-                # Check if content has changed
-                if existing_part.content_hash != content_hash:
-                    existing_part.description = description
-                    existing_part.size = size
-                    parts_to_update.append(existing_part)
-            else:
-                # New part
-                new_part = Part(
-                    item_number=item_number,
-                    description=description,
-                    size=size
-                )
-                parts_to_create.append(new_part)
+                description = part_data.get('description', '').strip()
+                size = part_data.get('size', '').strip()
+                
+                # Generate content hash for change detection, over the synced fields only
+                content_hash = hashlib.md5(f"{description}|{size}".encode()).hexdigest()
+                
+                if item_number in existing_parts:
+                    existing_part = existing_parts[item_number]
+                    existing_hash = hashlib.md5(
+                        f"{existing_part.description or ''}|{existing_part.size or ''}".encode()
+                    ).hexdigest()
+                    
+                    # Check if content has changed
+                    if existing_hash != content_hash:
+                        existing_part.description = description
+                        existing_part.size = size
+                        # bulk_update() skips auto_now, so set it here
+                        existing_part.last_updated = timezone.now()
+                        parts_to_update.append(existing_part)
+                else:
+                    # New part
+                    new_part = Part(
+                        item_number=item_number,
+                        description=description,
+                        size=size,
+                        last_updated=timezone.now()
+                    )
+                    parts_to_create.append(new_part)
         
-        # Bulk operations
-        with transaction.atomic():
-            if parts_to_create:
-                Part.objects.bulk_create(parts_to_create, batch_size=1000)
-                created_count = len(parts_to_create)
+        # Bulk operations, committed in short chunks so searches keep serving
+        with SYNC_SECONDS.time(source=SyncRun.SOURCE_ODATA), stage(run, 'bulk_write'):
+            for start in range(0, len(parts_to_create), chunk_size):
+                chunk = parts_to_create[start:start + chunk_size]
+                with transaction.atomic():
+                    Part.objects.bulk_create(chunk, batch_size=1000)
+                    # Bulk writes skip Part.save(), so rebuild the search index for them
+                    refresh_item_search_vectors(part.item_number for part in chunk)
+                    bump_catalog_version()
+                created_count += len(chunk)
+                SYNC_ROWS.inc(len(chunk), source=SyncRun.SOURCE_ODATA, action='created')
+                heartbeat(run)
+            if created_count:
                 self.stdout.write(f"Created {created_count} new parts")
             
-            if parts_to_update:
-                Part.objects.bulk_update(
-                    parts_to_update, 
-                    ['description', 'size', 'last_updated'],
-                    batch_size=1000
-                )
-                updated_count = len(parts_to_update)
+            for start in range(0, len(parts_to_update), chunk_size):
+                chunk = parts_to_update[start:start + chunk_size]
+                with transaction.atomic():
+                    Part.objects.bulk_update(
+                        chunk, 
+                        ['description', 'size', 'last_updated'],
+                        batch_size=1000
+                    )
+                    refresh_item_search_vectors(part.item_number for part in chunk)
+                    bump_catalog_version()
+                updated_count += len(chunk)
+                SYNC_ROWS.inc(len(chunk), source=SyncRun.SOURCE_ODATA, action='updated')
+                heartbeat(run)
+            if updated_count:
                 self.stdout.write(f"Updated {updated_count} existing parts")
         
         return created_count, updated_count
@@ -1,11 +1,14 @@
+import time
+
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from dynamics_search.models import Part
-import random
+from dynamics_search.models import Part, SearchHistory
+from dynamics_search.search_index import bump_catalog_version, refresh_item_search_vectors
+from dynamics_search.synthetic import DEFAULT_SEED, generate_parts, make_search_history
 
 
 class Command(BaseCommand):
-    help = 'Seed the database with sample parts data for testing'
+    help = 'Seed the database with a deterministic synthetic parts catalog (and search history) for testing'
     
     def add_arguments(self, parser):
         parser.add_argument(
@@ -19,78 +22,70 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing parts before seeding'
         )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=DEFAULT_SEED,
+            help=f'Random seed; the same seed always produces the same catalog (default: {DEFAULT_SEED})'
+        )
+        parser.add_argument(
+            '--start',
+            type=int,
+            default=0,
+            help='Index of the first generated part, to extend an existing catalog (default: 0)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Parts generated and inserted per transaction (default: 5000)'
+        )
+        parser.add_argument(
+            '--history',
+            type=int,
+            default=0,
+            help='Also create this many SearchHistory rows drawn from the same vocabulary (default: 0)'
+        )
     
     def handle(self, *args, **options):
         count = options['count']
         clear = options['clear']
+        seed = options['seed']
+        start = options['start']
+        chunk_size = options['chunk_size']
+        history = options['history']
         
         if clear:
             self.stdout.write("Clearing existing parts...")
             Part.objects.all().delete()
         
-        self.stdout.write(f"Creating {count} sample parts...")
-        
-        # Sample data
-        part_types = [
-            'Valve', 'Pipe', 'Fitting', 'Gasket', 'Bolt', 'Nut', 'Washer',
-            'Hose', 'Coupling', 'Flange', 'Elbow', 'Tee', 'Reducer', 'Cap',
-            'Plug', 'Union', 'Adapter', 'Filter', 'Strainer', 'Check Valve'
-        ]
-        
-        materials = [
-            'Steel', 'Stainless Steel', 'Brass', 'Copper', 'Aluminum',
-            'PVC', 'HDPE', 'Cast Iron', 'Carbon Steel', 'Alloy Steel'
-        ]
+        self.stdout.write(f"Creating {count} sample parts (seed {seed}, starting at #{start})...")
+        started = time.monotonic()
+        created = 0
         
-        sizes = [
-            '1/4"', '1/2"', '3/4"', '1"', '1.25"', '1.5"', '2"', '2.5"',
-            '3"', '4"', '6"', '8"', '10"', '12"', '16"', '20"', '24"'
-        ]
-        
-        descriptions = [
-            'High pressure', 'Low pressure', 'Standard', 'Heavy duty',
-            'Light duty', 'Corrosion resistant', 'Temperature rated',
-            'Food grade', 'Marine grade', 'Industrial grade'
-        ]
-        
-        with transaction.atomic():
-            parts_to_create = []
-            
-            for i in range(count):
-                part_type = random.choice(part_types)
-                material = random.choice(materials)
-                size = random.choice(sizes)
-                description_adj = random.choice(descriptions)
+        for chunk in generate_parts(count, seed=seed, start=start, chunk_size=chunk_size):
+            with transaction.atomic():
+                # Generated item numbers are stable, so re-running a range is a no-op
+                Part.objects.bulk_create(chunk, batch_size=1000, ignore_conflicts=True)
                 
-                # Generate item number
-                item_number = f"KMC-{random.randint(1000, 9999)}-{part_type.upper()[:3]}-{size.replace('"', '')}"
-                
-                # Generate description
-                description = f"{description_adj} {material} {part_type} {size} - {self.generate_description_details(part_type)}"
-                
-                part = Part(
-                    item_number=item_number,
-                    description=description,
-                    size=size
-                )
-                parts_to_create.append(part)
+                # bulk_create skips Part.save(), so fill in the search vectors
+                refresh_item_search_vectors(part.item_number for part in chunk)
             
-            # Bulk create
-            Part.objects.bulk_create(parts_to_create, batch_size=100)
+            created += len(chunk)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"  {created}/{count} parts ({created / elapsed if elapsed else 0:.0f}/s)")
+        
+        bump_catalog_version()
+        
+        if history:
+            self.stdout.write(f"Creating {history} search history entries...")
+            SearchHistory.objects.bulk_create(
+                make_search_history(history, seed=seed, catalog_size=start + count),
+                batch_size=1000
+            )
         
         self.stdout.write(
-            self.style.SUCCESS(f"Successfully created {count} sample parts!")
+            self.style.SUCCESS(
+                f"Successfully created {count} sample parts in {time.monotonic() - started:.1f}s!"
+            )
         )
-    
-    def generate_description_details(self, part_type):
-        """Generate additional description details based on part type"""
-        details = {
-            'Valve': ['Gate valve', 'Ball valve', 'Check valve', 'Globe valve'],
-            'Pipe': ['Schedule 40', 'Schedule 80', 'Seamless', 'Welded'],
-            'Fitting': ['Threaded', 'Socket weld', 'Butt weld', 'Flanged'],
-            'Gasket': ['Rubber', 'Cork', 'Metal', 'Spiral wound'],
-            'Bolt': ['Hex head', 'Socket head', 'Carriage', 'Machine'],
-            'Hose': ['Flexible', 'Reinforced', 'High pressure', 'Chemical resistant'],
-        }
-        
-        return random.choice(details.get(part_type, ['Standard', 'Heavy duty', 'Industrial']))
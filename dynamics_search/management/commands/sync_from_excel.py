@@ -4,16 +4,24 @@ import time
 import hashlib
 import logging
 import pandas as pd
+from contextlib import nullcontext
 from datetime import datetime
 from django.utils import timezone
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.conf import settings
-from dynamics_search.models import Part
+from dynamics_search.metrics import SYNC_ROWS, SYNC_SECONDS
+from dynamics_search.models import Part, SyncRun
+from dynamics_search.search_index import bump_catalog_version, refresh_item_search_vectors
+from dynamics_search.sync_runs import heartbeat, stage, sync_run
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Parts written per committed transaction; short transactions let searches
+# and SearchHistory writes get the database lock between chunks
+SYNC_CHUNK_SIZE = 2000
+
 class Command(BaseCommand):
     help = 'Sync parts data from Excel file with D365 refresh and CSV export'
     
@@ -46,6 +54,15 @@ class Command(BaseCommand):
             action='store_true',
             help='Enable verbose output'
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=SYNC_CHUNK_SIZE,
+            help=(
+                f'Parts written per committed transaction (default: {SYNC_CHUNK_SIZE}). '
+                'A failed sync keeps the chunks it already committed; rerun it to finish.'
+            )
+        )
     
     def handle(self, *args, **options):
         excel_path = options['excel_path']
@@ -53,6 +70,10 @@ class Command(BaseCommand):
         wait_time = options['wait_time']
         dry_run = options['dry_run']
         verbose = options['verbose']
+        chunk_size = options['chunk_size']
+        
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1')
         
         if verbose:
             logging.basicConfig(level=logging.INFO)
@@ -65,34 +86,40 @@ class Command(BaseCommand):
         self.stdout.write(f'Wait time: {wait_time} seconds')
         self.stdout.write(f'Dry run: {dry_run}')
         
-        try:
-            # Step 1: Open Excel and refresh data
-            self.stdout.write('Step 1: Opening Excel file and refreshing data...')
-            self.refresh_excel_data(excel_path, wait_time)
-            
-            # Step 2: Export to CSV
-            self.stdout.write('Step 2: Exporting to CSV...')
-            self.export_excel_to_csv(excel_path, csv_path)
-            
-            # Step 3: Process CSV data
-            self.stdout.write('Step 3: Processing CSV data...')
-            df = self.load_csv_data(csv_path)
-            
-            # Step 4: Compare and sync with database
-            self.stdout.write('Step 4: Syncing with database...')
-            if not dry_run:
-                self.sync_database(df, verbose)
-            else:
-                self.stdout.write(self.style.WARNING('DRY RUN: No database changes made'))
-                self.analyze_changes(df, verbose)
-            
-            self.stdout.write(
-                self.style.SUCCESS('Excel sync process completed successfully!')
-            )
-            
-        except Exception as e:
-            logger.error(f'Excel sync failed: {str(e)}')
-            raise CommandError(f'Sync failed: {str(e)}')
+        # Dry runs only read, so they don't need the sync lock
+        with nullcontext() if dry_run else sync_run(SyncRun.SOURCE_EXCEL) as run:
+            try:
+                # Step 1: Open Excel and refresh data
+                self.stdout.write('Step 1: Opening Excel file and refreshing data...')
+                with stage(run, 'excel_refresh'):
+                    self.refresh_excel_data(excel_path, wait_time)
+                
+                # Step 2: Export to CSV
+                self.stdout.write('Step 2: Exporting to CSV...')
+                with stage(run, 'csv_export'):
+                    self.export_excel_to_csv(excel_path, csv_path)
+                
+                # Step 3: Process CSV data
+                self.stdout.write('Step 3: Processing CSV data...')
+                with stage(run, 'csv_load'):
+                    df = self.load_csv_data(csv_path)
+                
+                # Step 4: Compare and sync with database
+                self.stdout.write('Step 4: Syncing with database...')
+                if not dry_run:
+                    run.rows_read = len(df)
+                    run.rows_created, run.rows_updated, run.rows_deleted = self.sync_database(df, verbose, chunk_size, run)
+                else:
+                    self.stdout.write(self.style.WARNING('DRY RUN: No database changes made'))
+                    self.analyze_changes(df, verbose)
+                
+                self.stdout.write(
+                    self.style.SUCCESS('Excel sync process completed successfully!')
+                )
+                
+            except Exception as e:
+                logger.error(f'Excel sync failed: {str(e)}')
+                raise CommandError(f'Sync failed: {str(e)}')
     
     def refresh_excel_data(self, excel_path, wait_time):
         """Open Excel file and refresh data from D365"""
@@ -141,15 +168,7 @@ class Command(BaseCommand):
     def export_excel_to_csv(self, excel_path, csv_path):
         """Export Excel data to CSV using pandas"""
         try:
-            self.stdout.write(f'Reading Excel file: {excel_path}')
-            
-            # Read Excel file
-            df = pd.read_excel(excel_path)
-            
-            # Clean column names (remove spaces, special characters)
-            df.columns = df.columns.str.strip().str.replace(' ', '_').str.lower()
-            
-            self.stdout.write(f'Found {len(df)} rows in Excel file')
+            df = self.read_excel_data(excel_path)
             
             # Save as CSV
             df.to_csv(csv_path, index=False)
@@ -158,6 +177,19 @@ class Command(BaseCommand):
         except Exception as e:
             raise CommandError(f'CSV export failed: {str(e)}')
     
+    def read_excel_data(self, excel_path):
+        """Read the workbook into a DataFrame with cleaned column names"""
+        self.stdout.write(f'Reading Excel file: {excel_path}')
+        
+        # Read Excel file
+        df = pd.read_excel(excel_path)
+        
+        # Clean column names (remove spaces, special characters)
+        df.columns = df.columns.str.strip().str.replace(' ', '_').str.lower()
+        
+        self.stdout.write(f'Found {len(df)} rows in Excel file')
+        return df
+    
     def load_csv_data(self, csv_path):
         """Load and validate CSV data"""
         try:
@@ -192,108 +224,27 @@ class Command(BaseCommand):
         content = f"{item_number}|{description}|{size}"
         return hashlib.md5(content.encode('utf-8')).hexdigest()
     
-    def sync_database(self, df, verbose=False):
-        """Sync CSV data with database"""
+    def sync_database(self, df, verbose=False, chunk_size=SYNC_CHUNK_SIZE, run=None):
+        """
+        Sync CSV data with database; returns (created, updated, missing) counts.
+        
+        Writes are committed in chunks of chunk_size rather than in one long
+        transaction, so readers are never locked out for the whole sync. A
+        failed run leaves the committed chunks in place; rerunning the sync
+        converges because unchanged rows are skipped.
+        """
         try:
-            with transaction.atomic():
-                # Get all existing parts
-                existing_parts = {
-                    part.item_number: part 
-                    for part in Part.objects.all()
-                }
-                
-                # Track processed item numbers
-                processed_item_numbers = set()
-                
-                # Lists for bulk operations
-                parts_to_create = []
-                parts_to_update = []
-                
-                self.stdout.write('Processing CSV rows...')
-                
-                for index, row in df.iterrows():
-                    item_number = str(row['item_number']).strip()
-                    description = str(row.get('description', '')).strip()
-                    size = str(row.get('size', '')).strip()
-                    
-                    if not item_number:
-                        continue
-                    
-                    processed_item_numbers.add(item_number)
-                    
-                    # Generate hash for this row
-                    row_hash = self.generate_hash(item_number, description, size)
-                    
-                    if item_number in existing_parts:
-                        # Check if part needs updating
-                        existing_part = existing_parts[item_number]
-                        existing_hash = self.generate_hash(
-                            existing_part.item_number,
-                            existing_part.description or '',
-                            existing_part.size or ''
-                        )
-                        
-                        if row_hash != existing_hash:
-                            # Update existing part
-                            existing_part.description = description
-                            existing_part.size = size
-                            existing_part.last_updated = timezone.now()
-                            parts_to_update.append(existing_part)
-                            
-                            if verbose:
-                                self.stdout.write(f'Updated: {item_number}')
-                    else:
-                        # Create new part
-                        new_part = Part(
-                            item_number=item_number,
-                            description=description,
-                            size=size,
-                            last_updated=timezone.now()
-                        )
-                        parts_to_create.append(new_part)
-                        
-                        if verbose:
-                            self.stdout.write(f'Created: {item_number}')
-                
-                # Bulk create new parts
-                if parts_to_create:
-                    Part.objects.bulk_create(parts_to_create, batch_size=1000)
-                    self.stdout.write(f'Created {len(parts_to_create)} new parts')
-                
-                # Bulk update existing parts
-                if parts_to_update:
-                    Part.objects.bulk_update(
-                        parts_to_update, 
-                        ['description', 'size', 'last_updated'],
-                        batch_size=1000
+            with SYNC_SECONDS.time(source=SyncRun.SOURCE_EXCEL):
+                with stage(run, 'load_existing'):
+                    existing_parts = self.load_existing_parts()
+                with stage(run, 'diff'):
+                    parts_to_create, parts_to_update, processed_item_numbers = self.diff_rows(
+                        df, existing_parts, verbose
                     )
-                    self.stdout.write(f'Updated {len(parts_to_update)} existing parts')
-                
-                # Mark missing parts as deleted
-                missing_parts = set(existing_parts.keys()) - processed_item_numbers
-                if missing_parts:
-                    # Mark missing parts as deleted
-                    missing_part_objects = [
-                        existing_parts[item_num] for item_num in missing_parts
-                    ]
-                    for part in missing_part_objects:
-                        part.is_deleted = True
-                        part.last_updated = timezone.now()
-                    
-                    Part.objects.bulk_update(
-                        missing_part_objects,
-                        ['is_deleted', 'last_updated'],
-                        batch_size=1000
-                    )
-                    
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'Marked {len(missing_parts)} parts as deleted'
-                        )
-                    )
-                    if verbose:
-                        for item_num in list(missing_parts)[:10]:  # Show first 10
-                            self.stdout.write(f'Marked as deleted: {item_num}')
+                with stage(run, 'bulk_write'):
+                    self.write_changes(parts_to_create, parts_to_update, chunk_size, run)
+                with stage(run, 'soft_delete'):
+                    missing_parts = self.mark_missing(existing_parts, processed_item_numbers, verbose, chunk_size, run)
                 
                 self.stdout.write(
                     self.style.SUCCESS(
@@ -301,10 +252,142 @@ class Command(BaseCommand):
                         f'{len(parts_to_update)} updated, {len(missing_parts)} missing'
                     )
                 )
+                return len(parts_to_create), len(parts_to_update), len(missing_parts)
                 
         except Exception as e:
             raise CommandError(f'Database sync failed: {str(e)}')
     
+    def load_existing_parts(self):
+        """All parts keyed by item number"""
+        return {
+            part.item_number: part 
+            for part in Part.objects.all()
+        }
+    
+    def diff_rows(self, df, existing_parts, verbose=False):
+        """Split rows into new and changed parts; returns (to_create, to_update, processed item numbers)"""
+        # Track processed item numbers
+        processed_item_numbers = set()
+        
+        # Lists for bulk operations
+        parts_to_create = []
+        parts_to_update = []
+        
+        self.stdout.write('Processing CSV rows...')
+        
+        for index, row in df.iterrows():
+            item_number = str(row['item_number']).strip()
+            description = str(row.get('description', '')).strip()
+            size = str(row.get('size', '')).strip()
+            
+            if not item_number:
+                continue
+            
+            processed_item_numbers.add(item_number)
+            
+            # Generate hash for this row
+            row_hash = self.generate_hash(item_number, description, size)
+            
+            if item_number in existing_parts:
+                # Check if part needs updating
+                existing_part = existing_parts[item_number]
+                existing_hash = self.generate_hash(
+                    existing_part.item_number,
+                    existing_part.description or '',
+                    existing_part.size or ''
+                )
+                
+                if row_hash != existing_hash:
+                    # Update existing part
+                    existing_part.description = description
+                    existing_part.size = size
+                    existing_part.last_updated = timezone.now()
+                    parts_to_update.append(existing_part)
+                    
+                    if verbose:
+                        self.stdout.write(f'Updated: {item_number}')
+            else:
+                # Create new part
+                new_part = Part(
+                    item_number=item_number,
+                    description=description,
+                    size=size,
+                    last_updated=timezone.now()
+                )
+                parts_to_create.append(new_part)
+                
+                if verbose:
+                    self.stdout.write(f'Created: {item_number}')
+        
+        return parts_to_create, parts_to_update, processed_item_numbers
+    
+    def write_changes(self, parts_to_create, parts_to_update, chunk_size=SYNC_CHUNK_SIZE, run=None):
+        """Bulk create/update parts and refresh their search vectors, one transaction per chunk"""
+        refreshed = 0
+        for start in range(0, len(parts_to_create), chunk_size):
+            chunk = parts_to_create[start:start + chunk_size]
+            with transaction.atomic():
+                Part.objects.bulk_create(chunk, batch_size=1000)
+                # Bulk writes skip Part.save(), so rebuild the search index for them
+                refreshed += refresh_item_search_vectors(part.item_number for part in chunk)
+                bump_catalog_version()
+            SYNC_ROWS.inc(len(chunk), source=SyncRun.SOURCE_EXCEL, action='created')
+            heartbeat(run)
+        if parts_to_create:
+            self.stdout.write(f'Created {len(parts_to_create)} new parts')
+        
+        for start in range(0, len(parts_to_update), chunk_size):
+            chunk = parts_to_update[start:start + chunk_size]
+            with transaction.atomic():
+                Part.objects.bulk_update(
+                    chunk, 
+                    ['description', 'size', 'last_updated'],
+                    batch_size=1000
+                )
+                refreshed += refresh_item_search_vectors(part.item_number for part in chunk)
+                bump_catalog_version()
+            SYNC_ROWS.inc(len(chunk), source=SyncRun.SOURCE_EXCEL, action='updated')
+            heartbeat(run)
+        if parts_to_update:
+            self.stdout.write(f'Updated {len(parts_to_update)} existing parts')
+        
+        if refreshed:
+            self.stdout.write(f'Refreshed search vectors for {refreshed} parts')
+    
+    def mark_missing(self, existing_parts, processed_item_numbers, verbose=False, chunk_size=SYNC_CHUNK_SIZE, run=None):
+        """Soft-delete parts that are no longer in the file; returns their item numbers"""
+        missing_parts = set(existing_parts.keys()) - processed_item_numbers
+        if missing_parts:
+            # Mark missing parts as deleted
+            missing_part_objects = [
+                existing_parts[item_num] for item_num in missing_parts
+            ]
+            for part in missing_part_objects:
+                part.is_deleted = True
+                part.last_updated = timezone.now()
+            
+            for start in range(0, len(missing_part_objects), chunk_size):
+                chunk = missing_part_objects[start:start + chunk_size]
+                with transaction.atomic():
+                    Part.objects.bulk_update(
+                        chunk,
+                        ['is_deleted', 'last_updated'],
+                        batch_size=1000
+                    )
+                    bump_catalog_version()
+                SYNC_ROWS.inc(len(chunk), source=SyncRun.SOURCE_EXCEL, action='deleted')
+                heartbeat(run)
+            
+            self.stdout.write(
+                self.style.WARNING(
+                    f'Marked {len(missing_parts)} parts as deleted'
+                )
+            )
+            if verbose:
+                for item_num in list(missing_parts)[:10]:  # Show first 10
+                    self.stdout.write(f'Marked as deleted: {item_num}')
+        return missing_parts
+    
     def analyze_changes(self, df, verbose=False):
         """Analyze changes without making database modifications (dry run)"""
         try:
@@ -0,0 +1,29 @@
+"""Metrics for search and parts syncs, exposed at /metrics (see kemco_portal.metrics)"""
+from kemco_portal import metrics
+
+SEARCH_REQUESTS = metrics.counter(
+    'dynamics_search_requests_total', 'Search endpoint requests', ['endpoint'],
+)
+SEARCH_SECONDS = metrics.histogram(
+    'dynamics_search_request_duration_seconds', 'Search endpoint wall time', ['endpoint'],
+)
+CACHE_LOOKUPS = metrics.counter(
+    'dynamics_search_cache_lookups_total', 'Cache lookups by cache and hit/miss', ['cache', 'result'],
+)
+SYNC_ROWS = metrics.counter(
+    'dynamics_search_sync_rows_total', 'Parts written by syncs, by SyncRun.source', ['source', 'action'],
+)
+SYNC_SECONDS = metrics.histogram(
+    'dynamics_search_sync_duration_seconds', 'Database phase of a parts sync', ['source'],
+)
+
+SEARCH_COALESCED = metrics.counter(
+    'dynamics_search_coalesced_calls_total', 'Single-flight search calls by role (leader ran the query)', ['call', 'role'],
+)
+SEARCH_SUPERSEDED = metrics.counter(
+    'dynamics_search_superseded_requests_total', 'Searches stopped because the session sent a newer one', ['endpoint'],
+)
+
+
+def record_cache_lookup(cache_name, hit):
+    CACHE_LOOKUPS.inc(cache=cache_name, result='hit' if hit else 'miss')
@@ -0,0 +1,74 @@
+from django.db import migrations, models
+
+
+# Trigram indexes match the UPPER(col::text) expression Django emits for
+# icontains, so they serve both the wildcard filters and the % operator.
+TRIGRAM_COLUMNS = ['item_number', 'description', 'size', 'vendor_name', 'product_group_id']
+
+SEARCH_VECTOR_SOURCE = ', '.join(
+    f"NULLIF(NEW.{column}, '')"
+    for column in [
+        'item_number', 'description', 'size', 'product_group_id',
+        'vendor_name', 'vendor_product_number', 'vendor_product_description',
+    ]
+)
+
+FORWARD_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    *[
+        f"CREATE INDEX IF NOT EXISTS dynamics_se_{column}_trgm "
+        f"ON dynamics_search_part USING gin (UPPER({column}::text) gin_trgm_ops)"
+        for column in TRIGRAM_COLUMNS
+    ],
+    "CREATE INDEX IF NOT EXISTS dynamics_se_search_vector_gin "
+    "ON dynamics_search_part USING gin (search_vector)",
+    f"""
+    CREATE OR REPLACE FUNCTION dynamics_search_part_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('simple', concat_ws(' ', {SEARCH_VECTOR_SOURCE}));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS dynamics_search_part_search_vector ON dynamics_search_part",
+    "CREATE TRIGGER dynamics_search_part_search_vector "
+    "BEFORE INSERT OR UPDATE ON dynamics_search_part "
+    "FOR EACH ROW EXECUTE FUNCTION dynamics_search_part_search_vector()",
+    # Fire the trigger once for existing rows
+    "UPDATE dynamics_search_part SET search_vector = NULL",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS dynamics_search_part_search_vector ON dynamics_search_part",
+    "DROP FUNCTION IF EXISTS dynamics_search_part_search_vector()",
+    "DROP INDEX IF EXISTS dynamics_se_search_vector_gin",
+    *[f"DROP INDEX IF EXISTS dynamics_se_{column}_trgm" for column in TRIGRAM_COLUMNS],
+]
+
+
+def _run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dynamics_search', '0004_searchhistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='part',
+            name='is_deleted',
+            field=models.BooleanField(default=False, help_text='Mark as deleted if not found in latest sync'),
+        ),
+        migrations.RunPython(
+            _run_on_postgresql(FORWARD_SQL),
+            _run_on_postgresql(REVERSE_SQL),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-19 19:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dynamics_search', '0005_part_is_deleted_postgres_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('excel', 'Excel workbook'), ('csv', 'CSV import'), ('odata', 'D365 OData')], max_length=16)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('success', 'Success'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='running', max_length=16)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('rows_created', models.PositiveIntegerField(default=0)),
+                ('rows_updated', models.PositiveIntegerField(default=0)),
+                ('rows_deleted', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['source', '-started_at'], name='dynamics_se_source_328f74_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('status',), name='dynamics_search_one_running_sync')],
+            },
+        ),
+    ]
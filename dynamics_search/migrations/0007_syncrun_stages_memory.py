@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dynamics_search', '0006_syncrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncrun',
+            name='stages',
+            field=models.JSONField(blank=True, default=list, help_text='[{stage, seconds}] in run order'),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='rows_read',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='peak_memory_mib',
+            field=models.FloatField(blank=True, help_text='Peak resident memory of the syncing process', null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+# search_vector is only read to rank rows already filtered through the
+# trigram indexes, so its GIN index (migration 0005) never serves a query.
+FORWARD_SQL = [
+    "DROP INDEX IF EXISTS dynamics_se_search_vector_gin",
+]
+
+REVERSE_SQL = [
+    "CREATE INDEX IF NOT EXISTS dynamics_se_search_vector_gin "
+    "ON dynamics_search_part USING gin (search_vector)",
+]
+
+
+def _run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dynamics_search', '0008_catalogversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run_on_postgresql(FORWARD_SQL),
+            _run_on_postgresql(REVERSE_SQL),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-20 14:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dynamics_search', '0009_drop_search_vector_gin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncrun',
+            name='heartbeat_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Last sign of life from the syncing process'),
+        ),
+    ]
@@ -2,16 +2,28 @@ from django.db import models
 from django.db.models import F, Value
 from django.db.models.functions import Concat
 from django.conf import settings
+from django.utils import timezone
 
 # Import PostgreSQL features only if using PostgreSQL
 try:
-    from django.contrib.postgres.indexes import GinIndex
     from django.contrib.postgres.search import SearchVectorField
     POSTGRES_AVAILABLE = True
 except ImportError:
     POSTGRES_AVAILABLE = False
 
 
+# Columns folded into Part.search_vector, in order
+SEARCH_VECTOR_FIELDS = (
+    'item_number',
+    'description',
+    'size',
+    'product_group_id',
+    'vendor_name',
+    'vendor_product_number',
+    'vendor_product_description',
+)
+
+
 class Part(models.Model):
     id = models.AutoField(primary_key=True)
     item_number = models.CharField(max_length=50, unique=True)
@@ -37,31 +49,24 @@ class Part(models.Model):
             models.Index(fields=['item_number']),
             models.Index(fields=['last_updated']),
         ]
-        
-        # Add PostgreSQL-specific indexes if available
-        if POSTGRES_AVAILABLE and 'postgresql' in settings.DATABASES['default']['ENGINE']:
-            indexes.append(GinIndex(fields=['search_vector']))
+        # PostgreSQL trigram/tsvector GIN indexes and the search_vector trigger
+        # are created by migration 0005 so the migration state is engine-independent
     
     def __str__(self):
         return f"{self.item_number} - {self.description[:50] if self.description else 'No Description'}"
     
     def save(self, *args, **kwargs):
+        if POSTGRES_AVAILABLE and 'postgresql' in settings.DATABASES['default']['ENGINE']:
+            # The database trigger builds the tsvector on insert/update
+            self.search_vector = None
+            return super().save(*args, **kwargs)
+        
         # Update search vector when saving
         search_parts = []
-        if self.item_number:
-            search_parts.append(str(self.item_number))
-        if self.description:
-            search_parts.append(str(self.description))
-        if self.size:
-            search_parts.append(str(self.size))
-        if self.product_group_id:
-            search_parts.append(str(self.product_group_id))
-        if self.vendor_name:
-            search_parts.append(str(self.vendor_name))
-        if self.vendor_product_number:
-            search_parts.append(str(self.vendor_product_number))
-        if self.vendor_product_description:
-            search_parts.append(str(self.vendor_product_description))
+        for field in SEARCH_VECTOR_FIELDS:
+            value = getattr(self, field)
+            if value:
+                search_parts.append(str(value))
         
         self.search_vector = ' '.join(search_parts)
         super().save(*args, **kwargs)
@@ -108,4 +113,76 @@ class SearchHistory(models.Model):
             'product_group_id': 'Product Group ID'
         }
         
-        return ', '.join([column_names.get(col, col) for col in self.columns])
\ No newline at end of file
+        return ', '.join([column_names.get(col, col) for col in self.columns])
+
+class SyncRun(models.Model):
+    """
+    One run of a parts sync. A running row is also the sync lock: the partial
+    unique constraint lets only one sync write to Part at a time.
+    """
+    SOURCE_EXCEL = 'excel'
+    SOURCE_CSV = 'csv'
+    SOURCE_ODATA = 'odata'
+    SOURCE_CHOICES = [
+        (SOURCE_EXCEL, 'Excel workbook'),
+        (SOURCE_CSV, 'CSV import'),
+        (SOURCE_ODATA, 'D365 OData'),
+    ]
+    
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILED = 'failed'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCESS, 'Success'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_SKIPPED, 'Skipped'),
+    ]
+    
+    source = models.CharField(max_length=16, choices=SOURCE_CHOICES)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    started_at = models.DateTimeField(default=timezone.now)
+    heartbeat_at = models.DateTimeField(default=timezone.now, help_text="Last sign of life from the syncing process")
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    stages = models.JSONField(default=list, blank=True, help_text="[{stage, seconds}] in run order")
+    rows_read = models.PositiveIntegerField(default=0)
+    rows_created = models.PositiveIntegerField(default=0)
+    rows_updated = models.PositiveIntegerField(default=0)
+    rows_deleted = models.PositiveIntegerField(default=0)
+    peak_memory_mib = models.FloatField(null=True, blank=True, help_text="Peak resident memory of the syncing process")
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['source', '-started_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['status'],
+                condition=models.Q(status='running'),
+                name='dynamics_search_one_running_sync',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_source_display()} sync ({self.status}) {self.started_at:%Y-%m-%d %H:%M}"
+    
+    @property
+    def rows_changed(self):
+        return self.rows_created + self.rows_updated + self.rows_deleted
+
+
+class CatalogVersion(models.Model):
+    """
+    Single row bumped by every write to the parts catalog (syncs, imports,
+    admin edits). Web workers key their per-process caches on it, so a change
+    made by Celery or a management command reaches them on the next request.
+    """
+    generation = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Catalog generation {self.generation} ({self.changed_at:%Y-%m-%d %H:%M})"
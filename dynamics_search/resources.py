@@ -1,5 +1,6 @@
 from import_export import resources
 from .models import Part
+from .search_index import bump_catalog_version
 
 
 class PartResource(resources.ModelResource):
@@ -77,6 +78,11 @@ class PartResource(resources.ModelResource):
         if 'vendor_phone' in row and row['vendor_phone']:
             row['vendor_phone'] = str(row['vendor_phone']).strip()
     
+    def after_import(self, dataset, result, **kwargs):
+        """Imported sizes, groups and vendors show up in the admin filters"""
+        if not kwargs.get('dry_run'):
+            bump_catalog_version()
+    
     def skip_row(self, instance, original, row, import_validation_errors=None):
         """Skip rows with validation errors"""
         if import_validation_errors:
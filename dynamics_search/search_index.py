@@ -0,0 +1,183 @@
+"""
+Set-based maintenance of Part.search_vector.
+
+The vector is recomputed in SQL (SearchVector on PostgreSQL, a
+space-joined Concat elsewhere) with chunked UPDATEs keyed on the primary
+key, instead of loading and saving every Part. The catalog generation that
+every catalog write bumps lives here too, with the caches keyed on it (the
+distinct-value lists used by the admin filters) and the search validators
+derived from it.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Q, TextField, Value, When
+from django.db.models.functions import Cast, Concat, Least, Trim, Upper
+from django.utils import timezone
+
+from .metrics import record_cache_lookup
+from .models import CatalogVersion, Part, SEARCH_VECTOR_FIELDS, POSTGRES_AVAILABLE
+
+if POSTGRES_AVAILABLE:
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramDistance
+
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# Matches to_tsvector('simple', ...) in the migration 0005 trigger
+SEARCH_CONFIG = 'simple'
+
+# Columns with a gin_trgm_ops index on UPPER(col::text) (migration 0005)
+TRIGRAM_COLUMNS = ('item_number', 'description', 'size', 'vendor_name', 'product_group_id')
+
+# Columns offered as admin filters, with their values cached per catalog generation
+FILTER_VALUES_FIELDS = ('size', 'product_group_id', 'vendor_name')
+FILTER_VALUES_CACHE_TIMEOUT = 60 * 60
+MAX_FILTER_VALUES = 2000
+
+
+def use_postgres_search() -> bool:
+    return POSTGRES_AVAILABLE and 'postgresql' in settings.DATABASES['default']['ENGINE']
+
+
+def search_vector_expression():
+    """SQL expression equivalent to the value Part.save() computes"""
+    if use_postgres_search():
+        return SearchVector(*SEARCH_VECTOR_FIELDS, config=SEARCH_CONFIG)
+
+    # Non-empty fields joined by single spaces, like ' '.join() in Part.save()
+    parts = [
+        Case(
+            When(**{field: ''}, then=Value('')),
+            default=Concat(F(field), Value(' '), output_field=TextField()),
+            output_field=TextField(),
+        )
+        for field in SEARCH_VECTOR_FIELDS
+    ]
+    return Trim(Concat(*parts, output_field=TextField()))
+
+
+def refresh_search_vectors(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None) -> int:
+    """
+    Recompute search_vector for every part in queryset (default: all parts).
+
+    Rows are updated in primary key order, chunk_size rows per UPDATE and
+    transaction. progress, if given, is called with the running total after
+    each chunk. Returns the number of rows updated.
+    """
+    if queryset is None:
+        queryset = Part.objects.all()
+    expression = search_vector_expression()
+    ids_query = queryset.order_by('pk').values_list('pk', flat=True)
+
+    updated = 0
+    last_pk = None
+    while True:
+        chunk_query = ids_query if last_pk is None else ids_query.filter(pk__gt=last_pk)
+        ids = list(chunk_query[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            updated += Part.objects.filter(pk__in=ids).update(search_vector=expression)
+        last_pk = ids[-1]
+        if progress:
+            progress(updated)
+    return updated
+
+
+def refresh_item_search_vectors(item_numbers, chunk_size=DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Post-bulk stage: recompute search_vector for the given item numbers.
+
+    bulk_create()/bulk_update() bypass Part.save(), so every sync path calls
+    this with the item numbers it wrote. Returns the number of rows updated.
+    """
+    item_numbers = list(dict.fromkeys(item_numbers))
+    expression = search_vector_expression()
+
+    updated = 0
+    for start in range(0, len(item_numbers), chunk_size):
+        chunk = item_numbers[start:start + chunk_size]
+        with transaction.atomic():
+            updated += Part.objects.filter(item_number__in=chunk).update(search_vector=expression)
+    return updated
+
+
+def trigram_ranked(queryset, query, conditions, columns=None):
+    """
+    PostgreSQL ranked search over the rows matching conditions.
+
+    The filter is conditions alone (icontains, served by the UPPER(col::text)
+    trigram indexes), so results match the other engines. Whole-word hits in
+    search_vector rank first, then the smallest <-> distance over the
+    searched columns.
+    """
+    columns = [c for c in (columns or TRIGRAM_COLUMNS) if c in TRIGRAM_COLUMNS]
+    text = query.replace('*', ' ').strip()
+    if not columns or not text:
+        return queryset.filter(conditions).order_by('item_number')
+
+    # Same expression as the index so the planner can use it
+    aliases = {f'trgm_{c}': Upper(Cast(c, output_field=TextField())) for c in columns}
+    queryset = queryset.alias(**aliases)
+
+    distances = [TrigramDistance(alias, text) for alias in aliases]
+    distance = Least(*distances) if len(distances) > 1 else distances[0]
+    return (
+        queryset.filter(conditions)
+        .annotate(
+            rank=SearchRank(F('search_vector'), SearchQuery(text, config=SEARCH_CONFIG)),
+            distance=distance,
+            similarity=1 - F('distance'),
+        )
+        .order_by('-rank', 'distance', 'item_number')
+    )
+
+
+def catalog_generation() -> int:
+    """Current CatalogVersion generation; a primary key lookup, read fresh on every call"""
+    return CatalogVersion.objects.filter(pk=1).values_list('generation', flat=True).first() or 0
+
+
+def bump_catalog_version():
+    """
+    Record a change to the parts catalog. Call it inside the writing
+    transaction: the new generation becomes visible together with the rows,
+    and every cache keyed on it (filter lists, admin counts) misses from then
+    on, in every process.
+    """
+    if not CatalogVersion.objects.filter(pk=1).update(generation=F('generation') + 1, changed_at=timezone.now()):
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'generation': 1})
+
+
+def _filter_values_cache_key(field, generation) -> str:
+    return f"dynamics_search:filter_values:{field}:{generation}"
+
+
+def filter_values(field) -> list:
+    """Sorted distinct non-empty values of field, cached until the catalog changes"""
+    key = _filter_values_cache_key(field, catalog_generation())
+    values = cache.get(key)
+    record_cache_lookup('filter_values', values is not None)
+    if values is None:
+        values = list(
+            Part.objects.exclude(**{field: ''})
+            .order_by(field)
+            .values_list(field, flat=True)
+            .distinct()[:MAX_FILTER_VALUES]
+        )
+        cache.set(key, values, FILTER_VALUES_CACHE_TIMEOUT)
+    return values
+
+
+def catalog_version() -> dict:
+    """
+    Generation and time of the last catalog change; the search validators.
+
+    Read from the CatalogVersion row on every call (one primary key lookup),
+    so a sync in another process is seen by the next request.
+    """
+    version = CatalogVersion.objects.filter(pk=1).values('generation', 'changed_at').first()
+    if version is None:
+        return {'generation': 0, 'last_modified': None}
+    return {'generation': version['generation'], 'last_modified': version['changed_at']}
@@ -0,0 +1,143 @@
+"""
+Serialize parts syncs and record each run in SyncRun.
+
+sync_run() inserts the run's SyncRun row with status "running". A partial
+unique constraint allows only one running row, so the insert doubles as a
+database-backed lock shared by every worker and process: a second sync fails
+to insert and gets SyncInProgress instead of racing the first one over the
+same Part rows. The running sync refreshes its row's heartbeat_at at every
+stage and after every committed chunk; a running row whose heartbeat is older
+than SYNC_LOCK_STALE_AFTER is taken to belong to a dead worker and is marked
+failed, releasing the lock. A long sync that keeps writing is never broken.
+
+Within a run, stage() times each step, and the run's peak memory is taken
+from the process's peak RSS, so recording costs nothing measurable (unlike
+the tracemalloc-based StageRecorder used by benchmark_sync).
+"""
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import SyncRun
+
+logger = logging.getLogger(__name__)
+
+
+class SyncInProgress(CommandError):
+    """Another sync holds the lock; .holder is its SyncRun (None if it just finished)"""
+
+    def __init__(self, holder):
+        self.holder = holder
+        if holder:
+            super().__init__(f"{holder.get_source_display()} sync #{holder.id} has been running since {holder.started_at:%Y-%m-%d %H:%M:%S}")
+        else:
+            super().__init__("Another sync is running")
+
+
+def peak_memory_mib():
+    """Peak resident memory of this process, or None where it can't be read"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return round(peak / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / 1024 / 1024, 1)
+    except (ImportError, AttributeError):
+        return None
+
+
+def heartbeat(run):
+    """
+    Show that run is still alive (a no-op when run is None, e.g. dry runs).
+    Call it outside the chunk transactions, so other processes see it at once.
+    """
+    if run is None:
+        return
+    run.heartbeat_at = timezone.now()
+    SyncRun.objects.filter(pk=run.pk).update(heartbeat_at=run.heartbeat_at)
+
+
+@contextmanager
+def stage(run, name):
+    """Record the block's wall time as a stage of run (a no-op when run is None, e.g. dry runs)"""
+    heartbeat(run)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if run is not None:
+            run.stages.append({'stage': name, 'seconds': round(time.perf_counter() - started, 4)})
+            heartbeat(run)
+
+
+def stale_after() -> timedelta:
+    return getattr(settings, 'SYNC_LOCK_STALE_AFTER', timedelta(minutes=30))
+
+
+def release_stale_runs():
+    """Fail running rows whose worker stopped sending heartbeats; returns how many"""
+    now = timezone.now()
+    released = SyncRun.objects.filter(
+        status=SyncRun.STATUS_RUNNING, heartbeat_at__lt=now - stale_after(),
+    ).update(status=SyncRun.STATUS_FAILED, finished_at=now, error='Abandoned: worker stopped without finishing')
+    if released:
+        logger.warning(f"Released {released} abandoned sync run(s)")
+    return released
+
+
+def running_sync():
+    return SyncRun.objects.filter(status=SyncRun.STATUS_RUNNING).first()
+
+
+@contextmanager
+def sync_run(source):
+    """
+    Hold the sync lock for the block and record its outcome.
+
+    Yields the SyncRun so the caller can fill in row counts and stages; raises
+    SyncInProgress without running the block when another sync holds the lock.
+    A block that handles its own errors can set the run's status to failed.
+    """
+    release_stale_runs()
+    try:
+        with transaction.atomic():
+            run = SyncRun.objects.create(source=source)
+    except IntegrityError:
+        raise SyncInProgress(running_sync())
+
+    started = time.perf_counter()
+    try:
+        yield run
+    except BaseException as e:
+        run.status = SyncRun.STATUS_FAILED
+        run.error = str(e) or e.__class__.__name__
+        raise
+    else:
+        if run.status == SyncRun.STATUS_RUNNING:
+            run.status = SyncRun.STATUS_SUCCESS
+    finally:
+        run.finished_at = timezone.now()
+        run.duration_seconds = time.perf_counter() - started
+        run.peak_memory_mib = peak_memory_mib()
+        run.save()
+
+
+def record_skipped(source, holder):
+    """Record a run that didn't start because holder was still running"""
+    now = timezone.now()
+    reason = f"Skipped: {holder.get_source_display()} sync #{holder.id} was still running" if holder else "Skipped: another sync was running"
+    return SyncRun.objects.create(
+        source=source, status=SyncRun.STATUS_SKIPPED, started_at=now, finished_at=now, duration_seconds=0, error=reason,
+    )
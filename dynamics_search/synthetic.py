@@ -0,0 +1,158 @@
+"""
+Deterministic synthetic parts catalog for seeding and benchmarks.
+
+Parts are modeled on SampleExportForDbStructuring.csv. They have numeric
+item numbers, upper-case D365-style descriptions, a handful of product
+groups, and vendors with phone numbers. Part i is a pure function of
+(seed, i), so any range can be regenerated or extended and item numbers
+never collide. The matching search workload uses the same vocabulary, so
+benchmark queries actually hit the catalog.
+"""
+from __future__ import annotations
+
+import random
+from datetime import timedelta
+from decimal import Decimal
+from typing import Iterator, List, Tuple
+
+from django.utils import timezone
+
+from .models import Part, SearchHistory
+
+
+ITEM_NUMBER_BASE = 1000000
+DEFAULT_SEED = 42
+
+PRODUCT_GROUPS = ['Sb-Assy', 'Sb-Assy', 'Sb-Assy', 'Purch', 'Purch', 'Mfg', 'Raw', 'NA']
+
+VENDORS = [
+    ('KEMCO SYSTEMS CO, LLC', '630-413-9143'),
+    ('AURORA PUMP', '630-859-7000'),
+    ('GORMAN RUPP', '419-755-1011'),
+    ('LIGHTNIN MIXERS', '585-436-5550'),
+    ('GRAINGER', '800-472-4643'),
+    ('MCMASTER-CARR', '630-833-0300'),
+    ('FERGUSON', '757-874-7795'),
+    ('JOHN CRANE', '847-967-2400'),
+    ('ASCO VALVE', '800-972-2726'),
+    ('SPIRAX SARCO', '803-714-2000'),
+]
+
+MATERIALS = ['SS316', 'SS304', 'CS', 'BRASS', 'PVC', 'CPVC', 'HDPE', 'CAST IRON', 'DUCTILE', 'ALUM']
+SIZES = [
+    '1/4"', '1/2"', '3/4"', '1"', '1.25"', '1.5"', '2"', '2.5"', '3"', '4"',
+    '6"', '8"', '10"', '12"', '16"', '20"', '24"',
+]
+PART_TYPES = {
+    'BALL VALVE': ['NPT', 'FLANGED', 'SOCKET WELD', '3-PC', 'FULL PORT'],
+    'GATE VALVE': ['NPT', 'FLANGED', 'RISING STEM'],
+    'CHECK VALVE': ['SWING', 'SPRING', 'WAFER'],
+    'PIPE': ['SCH 10', 'SCH 40', 'SCH 80', 'SEAMLESS', 'WELDED'],
+    'ELBOW 90': ['NPT', 'BUTT WELD', 'SOCKET WELD'],
+    'TEE': ['NPT', 'BUTT WELD', 'REDUCING'],
+    'FLANGE': ['150#', '300#', 'SLIP ON', 'WELD NECK', 'BLIND'],
+    'GASKET': ['EPDM', 'VITON', 'SPIRAL WOUND', 'PTFE'],
+    'MECHANICAL SEAL': ['TYPE 8B1T', 'TYPE 21', 'TANDEM', 'CARTRIDGE'],
+    'PUMP': ['CENTRIFUGAL', 'SUBMERSIBLE', 'SELF PRIMING'],
+    'MOTOR': ['TEFC', 'ODP', 'XP'],
+    'STRAINER': ['Y-TYPE', 'BASKET', '40 MESH'],
+    'HOSE': ['REINFORCED', 'CHEMICAL', 'STEAM'],
+    'BOLT': ['HEX HEAD', 'STUD', 'U-BOLT'],
+    'SENSOR': ['LEVEL', 'PRESSURE', 'TEMPERATURE', 'FLOW'],
+}
+HORSEPOWER = ['1/2HP', '1HP', '1.5HP', '3HP', '5HP', '7.5HP', '10HP', '15HP', '20HP', '30HP']
+
+HISTORY_COLUMNS = [[], [], ['item_number'], ['description'], ['description', 'size'], ['vendor_name']]
+
+
+def _rng(seed, index) -> random.Random:
+    # Independent stream per part so any range can be generated on its own
+    return random.Random(seed * 1000003 + index)
+
+
+def make_part(index, seed=DEFAULT_SEED, now=None) -> Part:
+    """Build (without saving) synthetic part number index"""
+    rng = _rng(seed, index)
+    now = now or timezone.now()
+
+    part_type = rng.choice(list(PART_TYPES))
+    detail = rng.choice(PART_TYPES[part_type])
+    material = rng.choice(MATERIALS)
+    size = rng.choice(SIZES)
+
+    if part_type in ('PUMP', 'MOTOR'):
+        description = f"{material} {part_type}, {detail}, {rng.choice(HORSEPOWER)}, {rng.randint(5, 120) * 10}GPM"
+    elif part_type == 'MECHANICAL SEAL':
+        description = f"{material} {part_type} {detail} - {rng.choice(['1.000', '1.375', '1.500', '1.750'])}"
+    else:
+        description = f"{material} {part_type} {size} {detail}"
+
+    has_vendor = rng.random() < 0.6
+    vendor_name, vendor_phone = rng.choice(VENDORS) if has_vendor else ('', '')
+    item_number = str(ITEM_NUMBER_BASE + index)
+
+    return Part(
+        item_number=item_number,
+        description=description,
+        size=size,
+        product_group_id=rng.choice(PRODUCT_GROUPS),
+        unit_cost=Decimal(f"{rng.lognormvariate(3.5, 1.5):.2f}").min(Decimal('99999999.99')),
+        unit_cost_date=now - timedelta(days=rng.randint(0, 3650)),
+        vendor_name=vendor_name,
+        vendor_product_number=f"{vendor_name[:3]}-{rng.randint(10000, 99999)}" if has_vendor else '',
+        vendor_product_description=description.title() if has_vendor and rng.random() < 0.5 else '',
+        vendor_phone=vendor_phone,
+    )
+
+
+def generate_parts(count, seed=DEFAULT_SEED, start=0, chunk_size=5000) -> Iterator[List[Part]]:
+    """Yield parts start..start+count-1 in lists of at most chunk_size"""
+    now = timezone.now()
+    for chunk_start in range(start, start + count, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, start + count)
+        yield [make_part(index, seed, now) for index in range(chunk_start, chunk_end)]
+
+
+def generate_search_queries(count, seed=DEFAULT_SEED, catalog_size=1000) -> List[Tuple[str, List[str]]]:
+    """
+    (query, columns) pairs shaped like real usage of the search page.
+
+    The mix is exact and prefix item numbers, single words, material plus
+    type, and *wildcard* patterns, drawn from the same vocabulary as
+    make_part().
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        kind = rng.random()
+        index = rng.randrange(max(1, catalog_size))
+        part_type = rng.choice(list(PART_TYPES))
+        material = rng.choice(MATERIALS)
+        if kind < 0.2:
+            query = str(ITEM_NUMBER_BASE + index)
+        elif kind < 0.35:
+            query = str(ITEM_NUMBER_BASE + index)[:5]
+        elif kind < 0.6:
+            query = part_type.split()[0].lower()
+        elif kind < 0.8:
+            query = f"{material} {part_type.split()[-1]}".lower()
+        elif kind < 0.95:
+            query = f"*{material.lower()}*{part_type.split()[0].lower()}*"
+        else:
+            query = rng.choice(VENDORS)[0].split()[0].lower()
+        queries.append((query, list(rng.choice(HISTORY_COLUMNS))))
+    return queries
+
+
+def make_search_history(count, seed=DEFAULT_SEED, catalog_size=1000, sessions=50) -> List[SearchHistory]:
+    """Build (without saving) SearchHistory rows for the query workload"""
+    rng = random.Random(seed + 1)
+    return [
+        SearchHistory(
+            query=query,
+            columns=columns,
+            result_count=rng.randint(0, 500),
+            user_session=f"bench-session-{rng.randrange(sessions):03d}",
+        )
+        for query, columns in generate_search_queries(count, seed, catalog_size)
+    ]
@@ -1,11 +1,35 @@
 from celery import shared_task
+from django.conf import settings
 from django.core.management import call_command
 import logging
 
+from .models import SyncRun
+from .sync_runs import SyncInProgress, record_skipped
+
 logger = logging.getLogger(__name__)
 
-@shared_task
-def sync_excel_data():
+
+def handle_busy(task, source, exc):
+    """
+    Another sync holds the lock. A run of the same source is a duplicate (it
+    reads the same workbook), so this one is skipped; otherwise it is queued
+    again behind the running sync.
+    """
+    holder = exc.holder
+    if holder is None or holder.source == source:
+        record_skipped(source, holder)
+        logger.warning(f"Skipping {task.name}: {exc}")
+        return f"Skipped: {exc}"
+    logger.info(f"{task.name} waiting for the running sync: {exc}")
+    raise task.retry(
+        exc=exc,
+        countdown=settings.SYNC_BUSY_RETRY_SECONDS,
+        max_retries=settings.SYNC_BUSY_MAX_RETRIES,
+    )
+
+
+@shared_task(bind=True)
+def sync_excel_data(self):
     """
     Celery task to sync data from Excel file.
     This task can be scheduled to run daily at 3 AM or hourly.
@@ -25,12 +49,14 @@ def sync_excel_data():
         logger.info("Excel sync task completed successfully")
         return "Excel sync completed successfully"
         
+    except SyncInProgress as e:
+        return handle_busy(self, SyncRun.SOURCE_EXCEL, e)
     except Exception as e:
         logger.error(f"Excel sync task failed: {str(e)}")
         raise e
 
-@shared_task
-def sync_excel_data_hourly():
+@shared_task(bind=True)
+def sync_excel_data_hourly(self):
     """
     Hourly sync task with shorter wait time for more frequent updates.
     """
@@ -49,6 +75,8 @@ def sync_excel_data_hourly():
         logger.info("Hourly Excel sync task completed successfully")
         return "Hourly Excel sync completed successfully"
         
+    except SyncInProgress as e:
+        return handle_busy(self, SyncRun.SOURCE_EXCEL, e)
     except Exception as e:
         logger.error(f"Hourly Excel sync task failed: {str(e)}")
         raise e
@@ -1,3 +1,545 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import tempfile
+from datetime import timedelta
+from importlib.util import find_spec
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from celery.exceptions import Retry
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import tasks
+from .coalescing import SingleFlight, Superseded, next_token, unless_superseded
+from .exporters import EXPORT_FIELDS, csv_line, stream_lines
+from .management.commands import run_parts_sync
+from .metrics import SYNC_ROWS
+from .models import CatalogVersion, Part, SyncRun
+from .resources import PartResource
+from .search_index import bump_catalog_version, catalog_generation, filter_values, trigram_ranked
+from .sync_runs import SyncInProgress, heartbeat, sync_run
+from .views import build_search_conditions
+
+
+def make_part(item_number, **fields):
+    return Part.objects.create(item_number=item_number, **fields)
+
+
+def bump_elsewhere():
+    """A catalog write from another process: the generation moves, this process's cache is untouched"""
+    if not CatalogVersion.objects.filter(pk=1).update(generation=F('generation') + 1):
+        CatalogVersion.objects.create(pk=1, generation=1)
+
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+
+class AdminSearchTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='pw')
+        make_part('1234567', description='SS316 TUBE', vendor_name='Acme')
+        make_part('7654321', description='PVC ELBOW', vendor_product_number='VP-998877')
+        make_part('5550000', description='SS316 STACK MEDIA')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def search(self, term):
+        response = self.client.get(reverse('admin:dynamics_search_part_changelist'), {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return sorted(part.item_number for part in response.context['cl'].result_list)
+
+    def test_partial_item_number(self):
+        self.assertEqual(self.search('12345'), ['1234567'])
+
+    def test_partial_vendor_part_number(self):
+        self.assertEqual(self.search('998877'), ['7654321'])
+
+    def test_terms_and_wildcards_match_like_the_public_search(self):
+        self.assertEqual(self.search('ss316'), ['1234567', '5550000'])
+        self.assertEqual(self.search('ss316 tube'), ['1234567'])
+        self.assertEqual(self.search('*ss316*media*'), ['5550000'])
+
+
+@skipUnless(find_spec('psycopg') or find_spec('psycopg2'), 'SearchRank needs a PostgreSQL driver')
+class TrigramRankedTests(SimpleTestCase):
+    """The PostgreSQL search filters exactly like build_search_conditions and only ranks"""
+
+    def test_filters_on_conditions_alone(self):
+        conditions = build_search_conditions('ss316*tube', ['description'])
+        queryset = trigram_ranked(Part.objects.all(), 'ss316*tube', conditions, ['description'])
+        self.assertEqual(queryset.query.where, Part.objects.filter(conditions).query.where)
+        self.assertEqual(queryset.query.order_by, ('-rank', 'distance', 'item_number'))
+        self.assertIn('rank', queryset.query.annotations)
+
+
+class CatalogGenerationTests(CatalogTestCase):
+    def test_bump_increments_generation(self):
+        self.assertEqual(catalog_generation(), 0)
+        bump_catalog_version()
+        bump_catalog_version()
+        self.assertEqual(catalog_generation(), 2)
+
+    def test_filter_values_follow_writes_from_other_processes(self):
+        make_part('A1', size='1/2')
+        self.assertEqual(filter_values('size'), ['1/2'])
+
+        Part.objects.create(item_number='A2', size='3/4')
+        self.assertEqual(filter_values('size'), ['1/2'])  # cached
+
+        bump_elsewhere()
+        self.assertEqual(filter_values('size'), ['1/2', '3/4'])
+
+    def test_admin_count_follows_writes_from_other_processes(self):
+        admin = User.objects.create_superuser('admin', password='pw')
+        self.client.force_login(admin)
+        url = reverse('admin:dynamics_search_part_changelist')
+        make_part('A1', size='1/2')
+        self.assertEqual(self.client.get(url, {'size': '1/2'}).context['cl'].result_count, 1)
+
+        make_part('A2', size='1/2')
+        bump_elsewhere()
+        self.assertEqual(self.client.get(url, {'size': '1/2'}).context['cl'].result_count, 2)
+
+    def test_admin_edit_bumps_generation(self):
+        admin = User.objects.create_superuser('admin', password='pw')
+        self.client.force_login(admin)
+        part = make_part('A1', description='OLD')
+        response = self.client.post(
+            reverse('admin:dynamics_search_part_change', args=[part.pk]),
+            {'item_number': 'A1', 'description': 'NEW'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(catalog_generation(), 1)
+
+
+class PartsSyncChunkTests(CatalogTestCase):
+    parts = [{'item_number': f'P{n}', 'description': f'PART {n}', 'size': '1/2'} for n in range(5)]
+
+    def sync(self, **options):
+        with patch.object(run_parts_sync.Command, 'get_oauth_token', return_value='token'), \
+                patch.object(run_parts_sync.Command, 'fetch_parts', return_value=self.parts):
+            call_command('run_parts_sync', client_id='id', client_secret='secret', tenant_id='tenant',
+                         stdout=StringIO(), **options)
+
+    def test_chunk_size_sets_transactions(self):
+        self.sync(chunk_size=2)
+        self.assertEqual(Part.objects.count(), 5)
+        self.assertEqual(catalog_generation(), 3)  # one bump per committed chunk
+
+    def test_chunk_size_must_be_positive(self):
+        with self.assertRaisesMessage(CommandError, '--chunk-size must be at least 1'):
+            self.sync(chunk_size=0)
+
+    def test_failed_sync_keeps_committed_chunks(self):
+        calls = []
+
+        def refresh(item_numbers):
+            calls.append(list(item_numbers))
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+            return len(calls[-1])
+
+        with patch.object(run_parts_sync, 'refresh_item_search_vectors', side_effect=refresh):
+            with self.assertRaises(CommandError):
+                self.sync(chunk_size=2)
+        self.assertEqual(sorted(Part.objects.values_list('item_number', flat=True)), ['P0', 'P1'])
+        self.assertEqual(SyncRun.objects.get().status, SyncRun.STATUS_FAILED)
+
+        self.sync(chunk_size=2)
+        self.assertEqual(Part.objects.count(), 5)
+
+    def test_rows_are_counted_under_the_sync_run_source(self):
+        before = SYNC_ROWS.values.get((SyncRun.SOURCE_ODATA, 'created'), 0)
+        self.sync()
+        self.assertEqual(SYNC_ROWS.values[(SyncRun.SOURCE_ODATA, 'created')], before + 5)
+        self.assertEqual(SyncRun.objects.get().source, SyncRun.SOURCE_ODATA)
+
+
+class PartsSyncLastUpdatedTests(CatalogTestCase):
+    def sync(self, parts):
+        with patch.object(run_parts_sync.Command, 'get_oauth_token', return_value='token'), \
+                patch.object(run_parts_sync.Command, 'fetch_parts', return_value=parts):
+            call_command('run_parts_sync', client_id='id', client_secret='secret', tenant_id='tenant',
+                         stdout=StringIO())
+        return SyncRun.objects.latest('pk')
+
+    def test_changed_rows_get_last_updated(self):
+        long_ago = timezone.now() - timedelta(days=30)
+        make_part('P1', description='OLD', size='1/2')
+        make_part('P2', description='SAME', size='1/2')
+        Part.objects.update(last_updated=long_ago)
+
+        run = self.sync([
+            {'item_number': 'P1', 'description': 'NEW', 'size': '1/2'},
+            {'item_number': 'P2', 'description': 'SAME', 'size': '1/2'},
+        ])
+        self.assertEqual(run.rows_updated, 1)
+        self.assertGreater(Part.objects.get(item_number='P1').last_updated, long_ago)
+        self.assertEqual(Part.objects.get(item_number='P2').last_updated, long_ago)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_identical_calls_share_one_execution(self):
+        flight = SingleFlight('test')
+        calls = []
+
+        async def search():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'rows'
+
+        async def main():
+            return await asyncio.gather(flight.do('q', search), flight.do('q', search), flight.do('other', search))
+
+        self.assertEqual(async_to_sync(main)(), ['rows', 'rows', 'rows'])
+        self.assertEqual(len(calls), 2)
+
+    def test_follower_takes_over_from_cancelled_leader(self):
+        flight = SingleFlight('test')
+
+        async def search():
+            await asyncio.sleep(0.01)
+            return 'rows'
+
+        async def main():
+            leader = asyncio.ensure_future(flight.do('q', search))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do('q', search))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(async_to_sync(main)(), 'rows')
+
+
+class SupersedeTests(CatalogTestCase):
+    def test_newer_token_supersedes_and_cancels(self):
+        cancelled = []
+
+        async def slow_search():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def main():
+            token = await next_token('session')
+            search = asyncio.ensure_future(unless_superseded(slow_search(), 'session', token, 'test'))
+            await asyncio.sleep(0.01)
+            await next_token('session')
+            await search
+
+        with self.assertRaises(Superseded):
+            async_to_sync(main)()
+        self.assertEqual(cancelled, [True])
+
+    def test_latest_token_finishes(self):
+        async def main():
+            token = await next_token('session')
+            return await unless_superseded(asyncio.sleep(0.01, result='rows'), 'session', token, 'test')
+
+        self.assertEqual(async_to_sync(main)(), 'rows')
+
+
+async def supersede(awaitable, *args):
+    awaitable.close()
+    raise Superseded()
+
+
+class SearchApiSupersedeTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_part('1234567', description='SS316 TUBE')
+
+    def setUp(self):
+        super().setUp()
+        session = self.client.session
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    def get(self, **headers):
+        return self.client.get(reverse('dynamics_search:search_api'), {'q': 'ss316'}, headers=headers)
+
+    @patch('dynamics_search.views.unless_superseded', side_effect=supersede)
+    def test_superseded_htmx_search_returns_204(self, unless_superseded):
+        self.assertEqual(self.get(HX_Request='true').status_code, 204)
+
+    @patch('dynamics_search.views.unless_superseded', side_effect=supersede)
+    def test_json_fetches_are_never_superseded(self, unless_superseded):
+        responses = [self.get(Accept='application/json') for page in range(3)]
+        self.assertEqual([response.status_code for response in responses], [200, 200, 200])
+        unless_superseded.assert_not_called()
+
+    @patch('dynamics_search.views.next_token')
+    def test_no_session_created_for_the_token(self, next_token):
+        self.client.cookies.clear()
+        response = self.client.get(reverse('dynamics_search:search_api'), {'q': 'no-such-part'},
+                                   headers={'HX-Request': 'true'})
+        self.assertEqual(response.status_code, 200)
+        next_token.assert_not_called()
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+
+class RowFragmentCacheTests(CatalogTestCase):
+    def search(self):
+        response = self.client.get(reverse('dynamics_search:search_api'), {'q': '1234567'})
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_rows_are_served_from_the_cache(self):
+        make_part('1234567', description='SS316 TUBE')
+        self.search()
+        with patch('dynamics_search.fragments.get_template') as get_template:
+            get_template.return_value.render.side_effect = AssertionError('row rendered again')
+            self.assertIn('SS316 TUBE', self.search())
+
+    def test_bulk_update_without_last_updated_renders_the_new_row(self):
+        part = make_part('1234567', description='SS316 TUBE')
+        self.assertIn('SS316 TUBE', self.search())
+
+        # Like a bulk sync: the row changes but last_updated stays put
+        Part.objects.filter(pk=part.pk).update(description='PVC ELBOW', last_updated=part.last_updated)
+        bump_elsewhere()
+        html = self.search()
+        self.assertIn('PVC ELBOW', html)
+        self.assertNotIn('SS316 TUBE', html)
+
+
+class SearchValidatorTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_part('1234567', description='SS316 TUBE')
+        bump_catalog_version()
+
+    def get(self, **headers):
+        return self.client.get(reverse('dynamics_search:search_api'), {'q': 'ss316'},
+                               headers={'Accept': 'application/json', **headers})
+
+    def test_validators_come_from_the_catalog_version(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        self.assertEqual(response['Last-Modified'], http_date(CatalogVersion.objects.get().changed_at.timestamp()))
+
+    def test_matching_etag_returns_304_without_searching(self):
+        etag = self.get()['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries if 'dynamics_search_part' in q['sql']])
+
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(If_Modified_Since=last_modified).status_code, 304)
+
+    def test_write_in_another_process_changes_the_etag(self):
+        etag = self.get()['ETag']
+        bump_elsewhere()
+        response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_the_query(self):
+        other = self.client.get(reverse('dynamics_search:search_api'), {'q': 'tube'},
+                                headers={'Accept': 'application/json'})
+        self.assertNotEqual(other['ETag'], self.get()['ETag'])
+
+
+class SyncLockTests(TestCase):
+    def test_second_sync_is_refused_while_one_runs(self):
+        with sync_run(SyncRun.SOURCE_EXCEL) as run:
+            with self.assertRaises(SyncInProgress) as refused:
+                with sync_run(SyncRun.SOURCE_ODATA):
+                    self.fail('ran while another sync held the lock')
+            self.assertEqual(refused.exception.holder, run)
+        self.assertEqual(SyncRun.objects.get().status, SyncRun.STATUS_SUCCESS)
+
+    def test_lock_is_released_when_a_sync_fails(self):
+        with self.assertRaises(RuntimeError):
+            with sync_run(SyncRun.SOURCE_EXCEL):
+                raise RuntimeError('workbook locked')
+        with sync_run(SyncRun.SOURCE_EXCEL):
+            pass
+        self.assertEqual(
+            list(SyncRun.objects.order_by('pk').values_list('status', 'error')),
+            [(SyncRun.STATUS_FAILED, 'workbook locked'), (SyncRun.STATUS_SUCCESS, '')],
+        )
+
+    @override_settings(SYNC_LOCK_STALE_AFTER=timedelta(minutes=30))
+    def test_silent_run_is_released(self):
+        abandoned = SyncRun.objects.create(source=SyncRun.SOURCE_ODATA)
+        SyncRun.objects.filter(pk=abandoned.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=31))
+        with self.assertLogs('dynamics_search.sync_runs', 'WARNING'):
+            with sync_run(SyncRun.SOURCE_EXCEL):
+                pass
+        abandoned.refresh_from_db()
+        self.assertEqual(abandoned.status, SyncRun.STATUS_FAILED)
+        self.assertIn('Abandoned', abandoned.error)
+
+    @override_settings(SYNC_LOCK_STALE_AFTER=timedelta(minutes=30))
+    def test_long_run_with_a_recent_heartbeat_keeps_the_lock(self):
+        busy = SyncRun.objects.create(source=SyncRun.SOURCE_ODATA)
+        SyncRun.objects.filter(pk=busy.pk).update(started_at=timezone.now() - timedelta(hours=5))
+        with self.assertRaises(SyncInProgress):
+            with sync_run(SyncRun.SOURCE_EXCEL):
+                self.fail('broke the lock of a live sync')
+        busy.refresh_from_db()
+        self.assertEqual(busy.status, SyncRun.STATUS_RUNNING)
+
+    def test_chunks_and_stages_send_heartbeats(self):
+        with patch('dynamics_search.sync_runs.heartbeat', wraps=heartbeat) as stage_heartbeat, \
+                patch.object(run_parts_sync, 'heartbeat', wraps=heartbeat) as chunk_heartbeat, \
+                patch.object(run_parts_sync.Command, 'get_oauth_token', return_value='token'), \
+                patch.object(run_parts_sync.Command, 'fetch_parts', return_value=PartsSyncChunkTests.parts):
+            call_command('run_parts_sync', client_id='id', client_secret='secret', tenant_id='tenant',
+                         chunk_size=2, stdout=StringIO())
+        self.assertEqual(chunk_heartbeat.call_count, 3)  # one per committed chunk
+        self.assertGreater(stage_heartbeat.call_count, 0)
+        run = SyncRun.objects.get()
+        self.assertGreaterEqual(run.heartbeat_at, run.started_at)
+
+    def test_command_refused_while_another_sync_runs(self):
+        SyncRun.objects.create(source=SyncRun.SOURCE_EXCEL)
+        with patch.object(run_parts_sync.Command, 'get_oauth_token') as get_oauth_token:
+            with self.assertRaises(SyncInProgress):
+                call_command('run_parts_sync', client_id='id', client_secret='secret', tenant_id='tenant',
+                             stdout=StringIO())
+        get_oauth_token.assert_not_called()
+
+
+class SyncTaskBusyTests(TestCase):
+    def busy(self, source):
+        return patch('dynamics_search.tasks.call_command',
+                     side_effect=SyncInProgress(SyncRun.objects.create(source=source)))
+
+    def test_duplicate_sync_is_skipped(self):
+        with self.busy(SyncRun.SOURCE_EXCEL), self.assertLogs('dynamics_search.tasks', 'WARNING'):
+            self.assertTrue(tasks.sync_excel_data().startswith('Skipped'))
+        self.assertTrue(SyncRun.objects.filter(source=SyncRun.SOURCE_EXCEL, status=SyncRun.STATUS_SKIPPED).exists())
+
+    def test_sync_behind_another_source_is_retried(self):
+        with self.busy(SyncRun.SOURCE_ODATA), \
+                patch.object(tasks.sync_excel_data, 'retry', side_effect=Retry()) as retry:
+            with self.assertRaises(Retry):
+                tasks.sync_excel_data()
+        self.assertEqual(retry.call_args.kwargs['countdown'], settings.SYNC_BUSY_RETRY_SECONDS)
+        self.assertFalse(SyncRun.objects.filter(status=SyncRun.STATUS_SKIPPED).exists())
+
+
+class ImportPartsCsvTests(TestCase):
+    def import_csv(self, content, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        out = StringIO()
+        call_command('import_parts_csv', f.name, stdout=out, **options)
+        return out.getvalue()
+
+    def test_header_only_file(self):
+        out = self.import_csv('ItemNumber,ProductDescription,VendorName\n')
+        self.assertIn('Imported: 0 parts', out)
+        run = SyncRun.objects.get()
+        self.assertEqual(run.status, SyncRun.STATUS_SUCCESS)
+        self.assertEqual(run.rows_read, 0)
+
+    def test_header_only_file_dry_run(self):
+        out = self.import_csv('ItemNumber,ProductDescription,VendorName\n', dry_run=True)
+        self.assertIn('Would import 0 rows', out)
+
+    def test_rows_are_imported(self):
+        self.import_csv('ItemNumber,ProductDescription,VendorName\n1234567,SS316 TUBE,Acme\n,,\n')
+        self.assertEqual(Part.objects.get().description, 'SS316 TUBE')
+        run = SyncRun.objects.get()
+        self.assertEqual((run.rows_read, run.rows_created), (1, 1))
+
+
+class SearchExportTests(TestCase):
+    """The export runs under the ASGI handler (async_client), as in production"""
+
+    @classmethod
+    def setUpTestData(cls):
+        make_part('1234567', description='SS316 TUBE', vendor_name='Acme', unit_cost='12.50')
+        make_part('5550000', description='SS316 STACK MEDIA')
+        make_part('7654321', description='PVC ELBOW')
+
+    async def export(self, **params):
+        return await self.async_client.get(reverse('dynamics_search:search_export'), params)
+
+    async def content(self, response):
+        self.assertTrue(response.streaming)
+        self.assertTrue(response.is_async)
+        return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    async def test_csv_streams_matching_parts(self):
+        response = await self.export(q='ss316')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="parts_search_ss316.csv"')
+        rows = list(csv.reader(StringIO(await self.content(response))))
+        self.assertEqual(rows[0], list(EXPORT_FIELDS))
+        self.assertEqual([row[1] for row in rows[1:]], ['1234567', '5550000'])
+
+    async def test_csv_matches_the_admin_export(self):
+        # Same cells as PartResource (django-import-export) for the same parts
+        expected = await sync_to_async(
+            lambda: PartResource().export(Part.objects.filter(description__icontains='ss316').order_by('item_number')).csv
+        )()
+        actual = await self.content(await self.export(q='ss316'))
+        self.assertEqual(list(csv.reader(StringIO(actual))), list(csv.reader(StringIO(expected))))
+
+    async def test_display_layout_matches_the_old_search_page_csv(self):
+        response = await self.export(q='ss316 tube', layout='display')
+        today = timezone.localdate()
+        self.assertEqual(
+            response['Content-Disposition'], f'attachment; filename="parts_search_ss316_tube_{today.isoformat()}.csv"',
+        )
+        rows = list(csv.reader(StringIO(await self.content(response))))
+        self.assertEqual(rows, [
+            ['Item Number', 'Description', 'Size', 'Vendor Name', 'Unit Cost', 'Unit Cost Date', 'Vendor Product Number',
+             'Vendor Product Description', 'Vendor Phone', 'Product Group ID', 'Last Updated'],
+            ['1234567', 'SS316 TUBE', '', 'Acme', '$12.50', '', '', '', '', '', f"{today.month}/{today.day}/{today.year}"],
+        ])
+
+    async def test_ndjson(self):
+        response = await self.export(q='ss316 tube', format='ndjson', fields=['item_number', 'unit_cost'])
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in (await self.content(response)).splitlines()]
+        self.assertEqual(lines, [{'item_number': '1234567', 'unit_cost': '12.50'}])
+
+    async def test_fields_and_columns(self):
+        response = await self.export(q='7654321', columns='item_number', fields=['item_number', 'bogus'])
+        self.assertEqual(await self.content(response), 'item_number\r\n7654321\r\n')
+
+    async def test_query_with_unsafe_characters_in_filename(self):
+        response = await self.export(q='*ss316*"media')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="parts_search__ss316__media.csv"')
+
+    async def test_bad_requests(self):
+        self.assertEqual((await self.export(q='')).status_code, 400)
+        self.assertEqual((await self.export(q='ss316', format='xml')).status_code, 400)
+        self.assertEqual((await self.export(q='ss316', format='ndjson', layout='display')).status_code, 400)
+
+    async def test_rows_are_fetched_one_chunk_per_call(self):
+        queryset = Part.objects.order_by('item_number')
+        chunks = [chunk async for chunk in stream_lines(queryset, ['item_number'], csv_line(), header='h\r\n', chunk_size=2)]
+        self.assertEqual(chunks, ['h\r\n', '1234567\r\n5550000\r\n', '7654321\r\n'])
\ No newline at end of file
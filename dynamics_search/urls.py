@@ -6,6 +6,7 @@ app_name = 'dynamics_search'
 urlpatterns = [
     path('', views.search_page, name='search'),
     path('api/', views.search_api, name='search_api'),
+    path('export/', views.search_export, name='search_export'),
     path('suggestions/', views.search_suggestions, name='search_suggestions'),
     path('part/<int:part_id>/', views.part_detail, name='part_detail'),
     path('history/', views.search_history_api, name='search_history_api'),
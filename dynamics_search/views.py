@@ -1,21 +1,51 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.db.models import Q, F
-from django.core.paginator import Paginator
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from django.conf import settings
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from functools import wraps
+import hashlib
 import json
+import math
 import re
 
+from .cancellation import cancellable, request_connection
+from .coalescing import SingleFlight, Superseded, next_token, unless_superseded
+from .exporters import (
+    DISPLAY_FIELDS, DISPLAY_HEADERS, EXPORT_FIELDS, csv_line, display_csv_line, ndjson_line, stream_lines,
+)
+from .fragments import render_result_rows
+from .metrics import SEARCH_REQUESTS, SEARCH_SECONDS
 from .models import Part, SearchHistory
+from .search_index import catalog_version, trigram_ranked, use_postgres_search
 
-# Import PostgreSQL features only if using PostgreSQL
-try:
-    from django.contrib.postgres.search import TrigramSimilarity, SearchQuery, SearchRank
-    POSTGRES_AVAILABLE = True
-except ImportError:
-    POSTGRES_AVAILABLE = False
+
+# Identical searches in flight at the same time run their queries once
+search_flight = SingleFlight('search_api')
+
+
+def measured(endpoint):
+    """Count requests to a search endpoint and time them"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                SEARCH_REQUESTS.inc(endpoint=endpoint)
+                with SEARCH_SECONDS.time(endpoint=endpoint):
+                    return await view(request, *args, **kwargs)
+            return async_wrapper
+        
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            SEARCH_REQUESTS.inc(endpoint=endpoint)
+            with SEARCH_SECONDS.time(endpoint=endpoint):
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
 
 
 def search_page(request):
@@ -24,8 +54,17 @@ def search_page(request):
 
 
 @require_http_methods(["GET"])
-def search_api(request):
-    """API endpoint for part search with trigram and wildcard support"""
+@measured('search_api')
+async def search_api(request):
+    """
+    API endpoint for part search with trigram and wildcard support.
+    
+    Async so a slow LIKE scan doesn't hold a worker thread under ASGI; if the
+    client goes away mid-search (HTMX aborts superseded keystrokes), the
+    running query is interrupted rather than finished. An HTMX search that a
+    newer one from the same session replaces returns 204 early, and identical
+    concurrent searches share one query (see coalescing.py).
+    """
     query = request.GET.get('q', '').strip()
     columns = request.GET.getlist('columns')  # Get list of selected columns
     
@@ -37,35 +76,40 @@ def search_api(request):
             'query': query
         })
     
+    # JSON clients revalidate against the catalog version; a match skips the search entirely
+    wants_json = request.headers.get('Accept') == 'application/json' and not request.headers.get('HX-Request')
+    if wants_json:
+        version = await sync_to_async(catalog_version)()
+        last_modified = version['last_modified']
+        etag = quote_etag(hashlib.md5(f"{version['generation']}|{request.GET.urlencode()}".encode()).hexdigest())
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return _with_validators(not_modified, etag, last_modified)
+    
+    # Only live search (HTMX) is superseded, and only for a session that
+    # already exists: parallel JSON fetches must each get their results
+    session_key = request.session.session_key
+    token = None
+    if request.headers.get('HX-Request') and session_key:
+        token = await next_token(session_key)
+    
     # Parse wildcards and build search conditions based on selected columns
     search_conditions = build_search_conditions(query, columns)
     
     # Base queryset
     queryset = Part.objects.all()
     
-    # Apply search conditions
-    if search_conditions:
-        queryset = queryset.filter(search_conditions)
-    
     # Add similarity ranking (PostgreSQL trigram or basic SQLite)
     # Only calculate similarity for the columns that were actually searched
-    if POSTGRES_AVAILABLE and 'postgresql' in settings.DATABASES['default']['ENGINE']:
-        # Use PostgreSQL trigram similarity based on selected columns
-        similarity_conditions = []
-        if not columns or 'item_number' in columns:
-            similarity_conditions.append(TrigramSimilarity('item_number', query))
-        if not columns or 'description' in columns:
-            similarity_conditions.append(TrigramSimilarity('description', query))
-        if not columns or 'size' in columns:
-            similarity_conditions.append(TrigramSimilarity('size', query))
-        if not columns or 'vendor_name' in columns:
-            similarity_conditions.append(TrigramSimilarity('vendor_name', query))
-        
-        if similarity_conditions:
-            queryset = queryset.annotate(similarity=sum(similarity_conditions)).order_by('-similarity', 'item_number')
-        else:
-            queryset = queryset.order_by('item_number')
+    if use_postgres_search():
+        # Matches come from the trigram GIN indexes (icontains), ranked by tsvector hits and <-> distance
+        queryset = trigram_ranked(queryset, query, search_conditions, columns)
     else:
+        # Apply search conditions
+        if search_conditions:
+            queryset = queryset.filter(search_conditions)
+        
         # Basic SQLite similarity based on contains matches
         # Only calculate similarity for columns that were actually searched
         similarity_case = "CASE "
@@ -94,74 +138,162 @@ def search_api(request):
             select_params=params
         ).order_by('-similarity', 'item_number')
     
-    # Pagination
+    # Pagination (Paginator.get_page() semantics: bad pages clamp into range)
     page = int(request.GET.get('page', 1))
     per_page = int(request.GET.get('per_page', 20))
     
-    paginator = Paginator(queryset, per_page)
-    page_obj = paginator.get_page(page)
+    async def run_search():
+        connection = await request_connection()
+        total = await cancellable(queryset.acount(), connection)
+        num_pages = max(1, math.ceil(total / per_page))
+        page_number = min(max(page, 1), num_pages)
+        offset = (page_number - 1) * per_page
+        
+        async def fetch_page():
+            return [part async for part in queryset[offset:offset + per_page]]
+        
+        # Format results
+        results = []
+        for part in await cancellable(fetch_page(), connection):
+            results.append({
+                'id': part.id,
+                'item_number': part.item_number,
+                'description': part.description,
+                'size': part.size,
+                'product_group_id': part.product_group_id,
+                'unit_cost': float(part.unit_cost) if part.unit_cost else None,
+                'unit_cost_date': part.unit_cost_date.isoformat() if part.unit_cost_date else None,
+                'vendor_name': part.vendor_name,
+                'vendor_product_number': part.vendor_product_number,
+                'vendor_product_description': part.vendor_product_description,
+                'vendor_phone': part.vendor_phone,
+                'similarity': round(part.similarity, 3) if hasattr(part, 'similarity') else 0,
+                'last_updated': part.last_updated.isoformat()
+            })
+        return total, num_pages, page_number, results
     
-    # Format results
-    results = []
-    for part in page_obj:
-        results.append({
-            'id': part.id,
-            'item_number': part.item_number,
-            'description': part.description,
-            'size': part.size,
-            'product_group_id': part.product_group_id,
-            'unit_cost': float(part.unit_cost) if part.unit_cost else None,
-            'unit_cost_date': part.unit_cost_date.isoformat() if part.unit_cost_date else None,
-            'vendor_name': part.vendor_name,
-            'vendor_product_number': part.vendor_product_number,
-            'vendor_product_description': part.vendor_product_description,
-            'vendor_phone': part.vendor_phone,
-            'similarity': round(part.similarity, 3) if hasattr(part, 'similarity') else 0,
-            'last_updated': part.last_updated.isoformat()
-        })
+    # Identical concurrent searches share a query, and the session's newest
+    # live search wins: this one stops (204) as soon as a newer keystroke arrives
+    key = (query, tuple(sorted(columns)), page, per_page)
+    search = search_flight.do(key, run_search)
+    if token is None:
+        total, num_pages, page_number, results = await search
+    else:
+        try:
+            total, num_pages, page_number, results = await unless_superseded(
+                search, session_key, token, 'search_api'
+            )
+        except Superseded:
+            return HttpResponse(status=204)
     
     # Save search to history (only for successful searches with results)
     if results and len(results) > 0:
         # Get or create a simple session identifier
-        session_key = request.session.session_key
         if not session_key:
-            request.session.create()
+            await request.session.acreate()
             session_key = request.session.session_key
         
         # Save search history
-        SearchHistory.objects.create(
+        await SearchHistory.objects.acreate(
             query=query,
             columns=columns,
-            result_count=paginator.count,
+            result_count=total,
             user_session=session_key
         )
     
     # Check if this is a JSON request (explicitly requested)
-    if request.headers.get('Accept') == 'application/json' and not request.headers.get('HX-Request'):
+    if wants_json:
         # Return JSON only when explicitly requested
-        return JsonResponse({
+        response = JsonResponse({
             'results': results,
-            'total': paginator.count,
+            'total': total,
             'page': page,
             'per_page': per_page,
-            'total_pages': paginator.num_pages,
-            'has_next': page_obj.has_next(),
-            'has_previous': page_obj.has_previous(),
+            'total_pages': num_pages,
+            'has_next': page_number < num_pages,
+            'has_previous': page_number > 1,
             'query': query
         })
+        return _with_validators(response, etag, last_modified)
     else:
         # Return HTML for all other requests (HTMX, direct access, etc.)
         context = {
             'results': results,
-            'total': paginator.count,
+            'total': total,
             'page': page,
             'per_page': per_page,
-            'total_pages': paginator.num_pages,
-            'has_next': page_obj.has_next(),
-            'has_previous': page_obj.has_previous(),
+            'total_pages': num_pages,
+            'has_next': page_number < num_pages,
+            'has_previous': page_number > 1,
             'query': query
         }
-        return render(request, 'dynamics_search/search_results.html', context)
+        
+        def render_page():
+            # Rows come from the fragment cache; only new or changed parts are rendered
+            context['rows'] = render_result_rows(results, columns)
+            return render(request, 'dynamics_search/search_results.html', context)
+        
+        # Context processors may touch the ORM (request.user), so render off the event loop
+        return await sync_to_async(render_page)()
+
+
+def _with_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+# format -> (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+@require_http_methods(["GET"])
+async def search_export(request):
+    """
+    Stream every part matching the search as CSV or NDJSON.
+    
+    Rows use the PartResource field names (the admin export layout), or a
+    subset picked with fields. layout=display gives the search page's CSV:
+    friendly headers, formatted costs and dates, no id. Async, and the body
+    is an async iterator, so ASGI streams it rather than buffering it.
+    """
+    query = request.GET.get('q', '').strip()
+    columns = request.GET.getlist('columns')  # Columns searched, as in search_api
+    export_format = request.GET.get('format', 'csv')
+    display = request.GET.get('layout') == 'display'
+    
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f'Unsupported format: {export_format}'}, status=400)
+    if display and export_format != 'csv':
+        return JsonResponse({'error': 'layout=display is only available for CSV'}, status=400)
+    if not query:
+        return JsonResponse({'error': 'Search query is required'}, status=400)
+    
+    queryset = Part.objects.filter(build_search_conditions(query, columns)).order_by('item_number')
+    safe_query = re.sub(r'[^a-zA-Z0-9]', '_', query)
+    content_type, extension = EXPORT_FORMATS[export_format]
+    
+    if display:
+        line = display_csv_line()
+        lines = stream_lines(queryset, DISPLAY_FIELDS, line, header=line(DISPLAY_HEADERS))
+        filename = f"parts_search_{safe_query}_{timezone.localdate().isoformat()}.{extension}"
+    else:
+        # Optional subset of output fields; defaults to the full export layout
+        fields = [f for f in request.GET.getlist('fields') if f in EXPORT_FIELDS] or list(EXPORT_FIELDS)
+        if export_format == 'csv':
+            line = csv_line()
+            lines = stream_lines(queryset, fields, line, header=line(fields))
+        else:
+            lines = stream_lines(queryset, fields, ndjson_line(fields))
+        filename = f"parts_search_{safe_query}.{extension}"
+    
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 def build_search_conditions(query, columns=None):
@@ -318,7 +450,8 @@ def _time_ago(created_at):
 
 
 @require_http_methods(["GET"])
-def search_suggestions(request):
+@measured('search_suggestions')
+async def search_suggestions(request):
     """Get search suggestions for autocomplete"""
     query = request.GET.get('q', '').strip()
     
@@ -331,11 +464,14 @@ def search_suggestions(request):
         Q(description__icontains=query)
     ).values_list('item_number', 'description')[:10]
     
+    async def fetch():
+        return [row async for row in suggestions]
+    
     # Format suggestions
     results = []
     seen = set()
     
-    for item_number, description in suggestions:
+    for item_number, description in await cancellable(fetch(), await request_connection()):
         if item_number not in seen:
             results.append({
                 'item_number': item_number,
@@ -1,5 +1,9 @@
 import os
+import time
 from celery import Celery
+from celery.signals import task_postrun, task_prerun
+
+from . import metrics
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kemco_portal.settings')
@@ -18,15 +22,41 @@ from celery.schedules import crontab
 
 app.conf.beat_schedule = {
     'sync-parts-daily': {
-        'task': 'dynamics_search.tasks.sync_parts_from_excel_task',
+        'task': 'dynamics_search.tasks.sync_excel_data',
         'schedule': crontab(hour=3, minute=0),  # Every day at 3 AM
         'args': (),
         'options': {'queue': 'default'},
     },
+    # Cheap mtime poll; the workbook is only re-parsed when it has changed
+    'ingest-d365-workbook': {
+        'task': 'd365.tasks.ingest_workbook',
+        'schedule': 60.0,
+        'args': (),
+        'options': {'queue': 'default'},
+    },
 }
 
 app.conf.timezone = 'UTC'
 
+# Task duration for every task, keyed by task name and final state
+TASK_SECONDS = metrics.histogram(
+    'celery_task_duration_seconds', 'Celery task run time', ['task', 'state'],
+)
+_task_started = {}
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_SECONDS.observe(time.perf_counter() - started, task=task.name, state=state or 'UNKNOWN')
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
@@ -0,0 +1,337 @@
+"""
+In-process counters and histograms, served in Prometheus text format at /metrics.
+
+Metrics are declared at module level with counter() and histogram() and
+updated in memory. When METRICS_DIR is set (one directory shared by every
+gunicorn worker and Celery process on the host), a background thread writes
+each process's values to METRICS_DIR/<pid>-<start>.json every
+METRICS_FLUSH_INTERVAL seconds and at exit, and /metrics sums all of those
+files so the workers report as one. <start> is the process start time (a
+random id where /proc is unavailable), so a reused PID never overwrites an
+earlier process's file. When a scrape finds the file of a process that has
+exited, it folds the values into METRICS_DIR/exited.json and deletes the file:
+counters of exited processes are kept, as counters should be, without the
+directory growing with every worker restart. Empty the directory when the
+service is restarted. Without METRICS_DIR, /metrics reports the serving
+process only.
+
+Everything is standard library, so scraping works offline with any
+Prometheus-compatible collector.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: scrapes don't lock and exited files aren't pruned
+    fcntl = None
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_lock = threading.Lock()
+_registry = {}
+EXITED_FILE = 'exited.json'
+
+
+def _process_start(pid):
+    """Start time of a process in clock ticks since boot, from /proc; None where unavailable"""
+    try:
+        stat = Path(f'/proc/{pid}/stat').read_text()
+    except OSError:
+        return None
+    # Field 22; the command name (field 2) may itself contain spaces or ')'
+    return stat.rpartition(')')[2].split()[19]
+
+
+def _process_id():
+    pid = os.getpid()
+    return f"{pid}-{_process_start(pid) or uuid.uuid4().hex}"
+
+
+_state = {'pid': os.getpid(), 'id': _process_id(), 'dirty': False, 'flusher': None}
+
+
+def _metrics_dir():
+    path = getattr(settings, 'METRICS_DIR', '')
+    return Path(path) if path else None
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def describe(self):
+        return {'kind': self.kind, 'help': self.documentation, 'labelnames': list(self.labelnames)}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            _before_update()
+            self.values[key] = self.values.get(key, 0) + amount
+        _after_update()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            _before_update()
+            # Per-bucket counts (not cumulative), then count and sum
+            state = self.values.setdefault(key, [0] * len(self.buckets) + [0, 0.0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += 1
+            state[-1] += value
+        _after_update()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def describe(self):
+        return {**super().describe(), 'buckets': list(self.buckets)}
+
+
+def _register(cls, name, *args, **kwargs):
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+        return metric
+
+
+def counter(name, documentation, labelnames=()) -> Counter:
+    return _register(Counter, name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def _before_update():
+    # A forked worker inherits its parent's values, which the parent's own
+    # file already reports; start from zero so they aren't counted twice.
+    # Called with _lock held.
+    pid = os.getpid()
+    if _state['pid'] != pid:
+        for metric in _registry.values():
+            metric.values.clear()
+        _state.update(pid=pid, id=_process_id(), dirty=False, flusher=None)
+    _state['dirty'] = True
+
+
+def _after_update():
+    if _state['flusher'] is None and _metrics_dir():
+        with _lock:
+            if _state['flusher'] is None:
+                _state['flusher'] = threading.Thread(target=_flush_periodically, daemon=True)
+                _state['flusher'].start()
+
+
+def _flush_periodically():
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+    while True:
+        time.sleep(interval)
+        flush()
+
+
+def snapshot():
+    """This process's metrics as a JSON-serializable dict"""
+    with _lock:
+        return {
+            name: {**metric.describe(), 'values': [[list(key), value] for key, value in metric.values.items()]}
+            for name, metric in _registry.items()
+        }
+
+
+def flush():
+    """Write this process's values to METRICS_DIR/<pid>-<start>.json if anything changed"""
+    directory = _metrics_dir()
+    if directory is None or not _state['dirty'] or _state['pid'] != os.getpid():
+        return
+    _state['dirty'] = False
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{_state['id']}.json"
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(snapshot()), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+atexit.register(flush)
+
+
+def _is_running(process_id):
+    """Whether the process that wrote <process_id>.json is still running"""
+    pid, _, start = process_id.partition('-')
+    try:
+        pid = int(pid)
+    except ValueError:
+        return True  # not a process file
+    if Path('/proc').is_dir():
+        return _process_start(pid) == start
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by someone else
+    return True
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None  # being replaced right now, or unreadable
+
+
+def _merge(merged, data):
+    """Add one process's snapshot() to merged, whose values are keyed by label tuple"""
+    for name, metric in data.items():
+        target = merged.setdefault(name, {**metric, 'values': {}})
+        for key, value in metric['values']:
+            key = tuple(key)
+            if metric['kind'] == 'histogram':
+                current = target['values'].get(key)
+                target['values'][key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                target['values'][key] = target['values'].get(key, 0) + value
+
+
+def _listed(merged):
+    for metric in merged.values():
+        metric['values'] = [[list(key), value] for key, value in metric['values'].items()]
+    return merged
+
+
+def _scrape_lock(directory):
+    """Serialize scrapes, so exited files are folded into exited.json once and never read half-moved"""
+    if fcntl is None:
+        return nullcontext()
+
+    @contextmanager
+    def lock():
+        with open(directory / '.lock', 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+    return lock()
+
+
+def _prune_exited(directory):
+    """Fold the files of exited processes into exited.json; called under the scrape lock"""
+    exited_path = directory / EXITED_FILE
+    exited = {}
+    done = []
+    for path in directory.glob('*-*.json'):
+        if _is_running(path.stem):
+            continue
+        data = _read(path)
+        if data is not None:
+            _merge(exited, data)
+        done.append(path)
+    if not done:
+        return
+    previous = _read(exited_path)
+    if previous:
+        _merge(exited, previous)
+    tmp_path = exited_path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(_listed(exited)), encoding='utf-8')
+    os.replace(tmp_path, exited_path)
+    for path in done:
+        path.unlink(missing_ok=True)
+
+
+def collect():
+    """Metrics summed over every process that has written to METRICS_DIR"""
+    directory = _metrics_dir()
+    if directory is None:
+        return snapshot()
+
+    flush()
+    directory.mkdir(parents=True, exist_ok=True)
+    merged = {}
+    with _scrape_lock(directory):
+        if fcntl is not None:
+            _prune_exited(directory)
+        for path in sorted(directory.glob('*.json')):
+            data = _read(path)
+            if data is not None:
+                _merge(merged, data)
+    return _listed(merged)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(metrics=None) -> str:
+    """Prometheus text exposition format (version 0.0.4)"""
+    metrics = collect() if metrics is None else metrics
+    lines = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        names = metric['labelnames']
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for key, value in sorted(metric['values']):
+            if metric['kind'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric['buckets'], value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(names, key, [('le', _number(float(bound)))])} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(names, key, [('le', '+Inf')])} {value[-2]}")
+                lines.append(f"{name}_count{_labels(names, key)} {value[-2]}")
+                lines.append(f"{name}_sum{_labels(names, key)} {_number(value[-1])}")
+            else:
+                lines.append(f"{name}{_labels(names, key)} {_number(value)}")
+    return '\n'.join(lines) + '\n'
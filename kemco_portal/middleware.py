@@ -0,0 +1,165 @@
+"""
+Per-request instrumentation for kemco_portal.
+
+RequestMetricsMiddleware measures each request's wall time, SQL query count
+and database time (through an execute wrapper put on every connection for
+the length of the request), template render time
+(through kemco_portal.templating.TimedDjangoTemplates) and response size.
+Every response carries the numbers in a Server-Timing header, so they show up
+in the browser's network panel.
+
+A sample of requests (REQUEST_METRICS_SAMPLE_RATE) is logged as one JSON line
+on the "kemco_portal.requests" logger. Requests slower than
+REQUEST_METRICS_SLOW_MS are always logged, at WARNING, together with the SQL
+they ran.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('kemco_portal.requests')
+
+_current_metrics = ContextVar('request_metrics', default=None)
+
+HTTP_REQUESTS = metrics.counter('http_requests_total', 'HTTP requests', ['view', 'method', 'status'])
+HTTP_SECONDS = metrics.histogram('http_request_duration_seconds', 'HTTP request wall time', ['view'])
+HTTP_QUERIES = metrics.counter('http_db_queries_total', 'SQL queries run by HTTP requests', ['view'])
+
+
+def current_metrics():
+    """The RequestMetrics of the request being handled, if any"""
+    return _current_metrics.get()
+
+
+class RequestMetrics:
+    """Counters for one request; also the execute_wrapper around its SQL"""
+
+    def __init__(self, max_sql=50):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.max_sql = max_sql
+        self.sql = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            # Statements only; parameters may hold customer data
+            if len(self.sql) < self.max_sql:
+                self.sql.append({'ms': round(elapsed * 1000, 2), 'sql': sql, 'many': many})
+
+    def server_timing(self, total_seconds):
+        return ', '.join([
+            f'total;dur={total_seconds * 1000:.1f}',
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+        ])
+
+
+def _wrap_connections(request_metrics):
+    """Put request_metrics around the SQL of this thread's connections until the returned stack is closed"""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(request_metrics))
+    return stack
+
+
+def _response_size(response):
+    if getattr(response, 'streaming', False):
+        return None
+    return len(response.content)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 1.0)
+        self.slow_ms = getattr(settings, 'REQUEST_METRICS_SLOW_MS', 1000)
+        self.max_sql = getattr(settings, 'REQUEST_METRICS_MAX_SQL', 50)
+        # Stay async under ASGI so async views aren't forced onto a thread
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics = RequestMetrics(self.max_sql)
+        token = _current_metrics.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            with _wrap_connections(request_metrics):
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self.finish(request, response, request_metrics, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        request_metrics = RequestMetrics(self.max_sql)
+        token = _current_metrics.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            # Connections belong to a thread, and async views run their ORM
+            # calls in the request's sync_to_async thread; wrap those
+            wrappers = await sync_to_async(_wrap_connections)(request_metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(wrappers.close)()
+        finally:
+            _current_metrics.reset(token)
+        return self.finish(request, response, request_metrics, time.perf_counter() - started)
+
+    def finish(self, request, response, request_metrics, total_seconds):
+        response['Server-Timing'] = request_metrics.server_timing(total_seconds)
+        self.record(request, response, request_metrics, total_seconds)
+        self.log(request, response, request_metrics, total_seconds)
+        return response
+
+    def record(self, request, response, request_metrics, total_seconds):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else ''
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        HTTP_SECONDS.observe(total_seconds, view=view)
+        HTTP_QUERIES.inc(request_metrics.queries, view=view)
+
+    def log(self, request, response, request_metrics, total_seconds):
+        duration_ms = total_seconds * 1000
+        slow = duration_ms >= self.slow_ms
+        if not slow and random.random() >= self.sample_rate:
+            return
+
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 1),
+            'db_ms': round(request_metrics.db_seconds * 1000, 1),
+            'queries': request_metrics.queries,
+            'template_ms': round(request_metrics.template_seconds * 1000, 1),
+            'response_bytes': _response_size(response),
+        }
+        if slow:
+            record['sql'] = request_metrics.sql
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
@@ -10,6 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so Server-Timing covers the whole middleware stack
+    'kemco_portal.middleware.RequestMetricsMiddleware',
+    # gzip (Brotli for JSON when installed); early, so it sees final response bodies
+    'kemco_portal.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,15 +63,23 @@ ROOT_URLCONF = 'kemco_portal.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to RequestMetricsMiddleware
+        'BACKEND': 'kemco_portal.templating.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process, also with DEBUG on
+            # (runserver's autoreloader clears it when a template changes)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -79,20 +94,62 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Applied on every connection open. WAL lets search requests keep
+            # reading the last committed data while a sync writes.
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'  # durable at checkpoints; safe with WAL
+                'PRAGMA mmap_size=268435456;'  # 256 MiB memory-mapped reads
+                'PRAGMA cache_size=-65536;'  # 64 MiB page cache per connection
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            # busy_timeout in seconds: writers wait for the lock instead of
+            # failing with "database is locked"
+            'timeout': 20,
+            # Take the write lock at BEGIN, so a transaction that reads then
+            # writes can't deadlock against another writer mid-way
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
-# For PostgreSQL with full-text search (uncomment and configure when ready)
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': 'kemco_portal',
-#         'USER': 'your_db_user',
-#         'PASSWORD': 'your_db_password',
-#         'HOST': 'localhost',
-#         'PORT': '5432',
-#     }
-# }
+# PostgreSQL production profile: set DJANGO_DB_ENGINE=postgresql and the
+# POSTGRES_* variables. dynamics_search migration 0005 then installs pg_trgm,
+# the trigram GIN indexes and the search_vector trigger (no-ops on SQLite).
+if os.environ.get('DJANGO_DB_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'kemco_portal'),
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        }
+    }
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+    # Optional in-process connection pool through psycopg_pool (pip install
+    # "psycopg[pool]"). Pooled connections are returned to the pool after each
+    # request, so Django's own persistence must be off.
+    if os.environ.get('DJANGO_DB_POOL') == '1':
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('DJANGO_DB_POOL_MIN', '2')),
+                'max_size': int(os.environ.get('DJANGO_DB_POOL_MAX', '10')),
+                'timeout': 10,
+            },
+        }
+
+# Persistent connections: each worker thread reuses its connection for up to
+# CONN_MAX_AGE seconds instead of reconnecting (and re-running the SQLite
+# pragmas above) on every request. Health checks replace a connection that
+# died while idle before the request uses it. DJANGO_CONN_MAX_AGE=0 restores
+# per-request connections.
+if not DATABASES['default'].get('OPTIONS', {}).get('pool'):
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_CONN_MAX_AGE', '60'))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
 
 
 # Password validation
@@ -147,9 +204,52 @@ DYNAMICS_CLIENT_ID = ''  # Azure AD Application (client) ID
 DYNAMICS_CLIENT_SECRET = ''  # Azure AD Application secret
 DYNAMICS_TENANT_ID = ''  # Azure AD Tenant ID
 
+# D365 import workbook parsed by d365.tasks.ingest_workbook for the Excel preview page
+D365_IMPORT_WORKBOOK = BASE_DIR / 'd265_import.xlsx'
+
 # Search Configuration
 SEARCH_RESULTS_PER_PAGE = 20
 SEARCH_MIN_QUERY_LENGTH = 2
+# Live search: a session's newer search_api request supersedes its older ones,
+# which stop (204) at the next check. Tokens live in the default cache, which
+# must be shared (Redis/memcached/database) when running several workers.
+SEARCH_SUPERSEDE_POLL_SECONDS = 0.05  # how often an in-flight search checks for a newer one
+SEARCH_SUPERSEDE_TOKEN_TIMEOUT = 300
+SEARCH_ROW_CACHE_TIMEOUT = 60 * 60 * 24  # cached result row fragments (dynamics_search.fragments)
+
+# Request instrumentation (kemco_portal.middleware.RequestMetricsMiddleware)
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '1.0'))  # share of requests logged
+REQUEST_METRICS_SLOW_MS = 1000  # slower requests are always logged, with their SQL
+REQUEST_METRICS_MAX_SQL = 50  # statements kept per request
+
+# Metrics registry (kemco_portal.metrics) served at /metrics. Point METRICS_DIR
+# at a directory shared by all gunicorn workers and Celery processes so their
+# values are summed; leave it empty for a single process.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 5  # seconds between writes of each process's values
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>". Without a token
+# /metrics is only served when DEBUG is on.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# manage.py test: the request logger stays quiet unless REQUEST_METRICS_LOG_LEVEL is set
+TESTING = sys.argv[1:2] == ['test']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'kemco_portal.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_METRICS_LOG_LEVEL', 'ERROR' if TESTING else 'INFO'),
+            'propagate': False,
+        },
+    },
+}
 
 # Import/Export Configuration
 IMPORT_EXPORT_USE_TRANSACTIONS = True
@@ -164,3 +264,8 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+
+# Parts syncs (dynamics_search.sync_runs): one runs at a time, recorded in SyncRun
+SYNC_LOCK_STALE_AFTER = timedelta(minutes=30)  # a "running" sync without a heartbeat for this long is assumed dead
+SYNC_BUSY_RETRY_SECONDS = 300  # a sync task blocked by another source's sync retries after this
+SYNC_BUSY_MAX_RETRIES = 6
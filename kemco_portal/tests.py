@@ -0,0 +1,134 @@
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from dynamics_search.models import Part
+
+from . import metrics
+from .middleware import HTTP_QUERIES
+
+TEST_COUNTER = metrics.counter('kemco_portal_test_events_total', 'Events counted by the tests', ['kind'])
+
+
+def counter_value(collected, name, **labels):
+    key = [str(labels[label]) for label in collected[name]['labelnames']]
+    return dict((tuple(k), v) for k, v in collected[name]['values']).get(tuple(key), 0)
+
+
+@override_settings(METRICS_TOKEN='s3cret', DEBUG=False)
+class MetricsEndpointTests(SimpleTestCase):
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+
+    def test_loopback_address_is_not_enough(self):
+        # Behind the proxy every request arrives from 127.0.0.1
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+    def test_bearer_token(self):
+        TEST_COUNTER.inc(kind='scrape')
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('kemco_portal_test_events_total{kind="scrape"}', response.content.decode())
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_token_outside_debug_is_forbidden(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+
+class MetricsDirectoryTests(SimpleTestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = Path(temporary.name)
+        override = override_settings(METRICS_DIR=str(self.directory))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def run_child(self, amount):
+        """Count in a separate, short-lived process that flushes at exit"""
+        code = (
+            'import django, os; os.environ["DJANGO_SETTINGS_MODULE"] = "kemco_portal.settings"; django.setup()\n'
+            'from kemco_portal import metrics\n'
+            f'metrics.counter("kemco_portal_test_events_total", "", ["kind"]).inc({amount}, kind="child")\n'
+        )
+        subprocess.run(
+            [sys.executable, '-c', code], check=True, cwd=Path(__file__).resolve().parent.parent,
+            env={'METRICS_DIR': str(self.directory), 'PATH': '/usr/bin:/bin'},
+        )
+
+    def test_file_name_includes_process_start(self):
+        TEST_COUNTER.inc(kind='file')
+        metrics.flush()
+        names = [path.name for path in self.directory.glob('*.json')]
+        self.assertEqual(names, [f"{metrics._state['id']}.json"])
+        self.assertRegex(names[0], r'^\d+-\w+\.json$')
+
+    def test_reused_pid_does_not_overwrite(self):
+        # An exited process that had this very PID left its file behind
+        pid_file = self.directory / f"{metrics._state['pid']}-1.json"
+        pid_file.write_text(json.dumps({'kemco_portal_test_events_total': {
+            **TEST_COUNTER.describe(), 'values': [[['old'], 5]],
+        }}))
+        collected = metrics.collect()
+        self.assertEqual(counter_value(collected, 'kemco_portal_test_events_total', kind='old'), 5)
+
+    def test_exited_processes_are_folded_and_kept(self):
+        self.run_child(2)
+        self.run_child(3)
+        collected = metrics.collect()
+        self.assertEqual(counter_value(collected, 'kemco_portal_test_events_total', kind='child'), 5)
+        # Both child files were folded into exited.json and removed; only this process's remains
+        own = f"{metrics._state['id']}.json"
+        self.assertEqual([path.name for path in self.directory.glob('*-*.json') if path.name != own], [])
+        self.assertTrue((self.directory / metrics.EXITED_FILE).exists())
+
+        self.run_child(4)
+        collected = metrics.collect()
+        self.assertEqual(counter_value(collected, 'kemco_portal_test_events_total', kind='child'), 9)
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Part.objects.create(item_number='1234567', description='SS316 TUBE')
+        cls.user = User.objects.create_user('user', password='pw')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def queries(self, response):
+        return int(response['Server-Timing'].split('desc="')[1].split(' ')[0])
+
+    def test_counts_queries_on_an_open_connection(self):
+        # The connection was opened (by the test setup) before the request,
+        # as a persistent CONN_MAX_AGE connection would be
+        self.assertIsNotNone(connection.connection)
+        before = HTTP_QUERIES.values.get(('d365_jobs_list',), 0)
+        response = self.client.get(reverse('d365_jobs_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self.queries(response), 0)
+        self.assertEqual(HTTP_QUERIES.values[('d365_jobs_list',)], before + self.queries(response))
+
+    async def test_counts_queries_of_async_views(self):
+        response = await self.async_client.get(reverse('dynamics_search:search_api'), {'q': 'ss316'})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self.queries(response), 0)
+
+    def test_wrapper_removed_after_request(self):
+        self.client.get(reverse('d365_jobs_list'))
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_request_log_is_quiet_in_tests_but_still_emitted(self):
+        self.assertFalse(logging.getLogger('kemco_portal.requests').isEnabledFor(logging.WARNING))
+        with self.assertLogs('kemco_portal.requests', 'INFO') as logs:
+            self.client.get(reverse('d365_jobs_list'))
+        self.assertEqual(json.loads(logs.records[0].getMessage())['view'], 'd365_jobs_list')
@@ -1,5 +1,25 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 
+from . import metrics as metrics_registry
+
 def home(request):
     """Main homepage for Kemco Portal with all available tools"""
     return render(request, 'home.html')
+
+
+def metrics(request):
+    """Prometheus text endpoint for the in-process metrics registry"""
+    # Behind the reverse proxy every request comes from 127.0.0.1, so the
+    # scraper is recognised by a bearer token rather than by address
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(supplied.strip().encode(), token.encode()):
+            return HttpResponseForbidden('Forbidden')
+    elif not settings.DEBUG:
+        return HttpResponseForbidden('Forbidden')
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
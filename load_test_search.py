@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""
+Load test for the live search endpoints: ASGI (uvicorn) vs WSGI (gunicorn).
+
+Each virtual user types a query from the synthetic search workload one
+keystroke at a time, like the HTMX search box. Every prefix of two or more
+characters is sent to /search/api/ (with HX-Request, so the HTML partial is
+rendered) and to /search/suggestions/.
+
+By default the script starts each server itself against the configured
+database, runs the same load on both, and prints throughput and latency
+side by side:
+
+    python load_test_search.py --servers asgi,wsgi --users 32 --duration 20
+
+To load an already running server instead:
+
+    python load_test_search.py --url http://127.0.0.1:8000 --users 32
+
+Needs uvicorn and/or gunicorn installed for the servers being started.
+Seed a catalog first (python manage.py seed_parts --count 100000).
+"""
+
+import argparse
+import http.client
+from http.cookies import SimpleCookie
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kemco_portal.settings')
+django.setup()
+
+from dynamics_search.benchmarks import run_metadata, summarize_ms, write_results  # noqa: E402
+from dynamics_search.synthetic import generate_search_queries  # noqa: E402
+
+PORT = 8765
+
+SERVERS = {
+    'asgi': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'kemco_portal.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers), '--log-level', 'warning',
+    ],
+    'wsgi': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', 'kemco_portal.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', '8', '--log-level', 'warning',
+    ],
+}
+
+
+def keystrokes(query):
+    """Every prefix the search box would send while typing query"""
+    return [query[:end] for end in range(2, len(query) + 1)]
+
+
+def wait_until_ready(base_url, timeout=30):
+    parts = urlsplit(base_url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=2)
+            conn.request('GET', '/search/suggestions/?q=ok')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+
+def run_load(base_url, users, duration, seed):
+    """Drive base_url with users concurrent typists for duration seconds"""
+    parts = urlsplit(base_url)
+    queries = generate_search_queries(500, seed=seed, catalog_size=100000)
+    durations = []
+    errors = []
+    superseded = []
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def user(index):
+        rng = random.Random(seed + index)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        local_durations, local_errors, local_superseded = [], 0, 0
+        cookies = SimpleCookie()
+        while time.time() < stop_at:
+            query, columns = rng.choice(queries)
+            for prefix in keystrokes(query):
+                for path, headers in (
+                    ('/search/api/', {'HX-Request': 'true'}),
+                    ('/search/suggestions/', {}),
+                ):
+                    url = f"{path}?{urlencode({'q': prefix, 'columns': columns}, doseq=True)}"
+                    if cookies:
+                        # Keep the session, so latest-wins applies per user
+                        headers = {**headers, 'Cookie': '; '.join(f'{k}={v.value}' for k, v in cookies.items())}
+                    started = time.perf_counter()
+                    try:
+                        conn.request('GET', url, headers=headers)
+                        response = conn.getresponse()
+                        response.read()
+                        cookies.load(response.getheader('Set-Cookie') or '')
+                        if response.status >= 400:
+                            local_errors += 1
+                        elif response.status == 204:
+                            local_superseded += 1
+                    except (OSError, http.client.HTTPException):
+                        local_errors += 1
+                        conn.close()
+                        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+                        continue
+                    local_durations.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            durations.extend(local_durations)
+            errors.append(local_errors)
+            superseded.append(local_superseded)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(durations),
+        'errors': sum(errors),
+        'superseded': sum(superseded),
+        'requests_per_second': round(len(durations) / elapsed, 1),
+        **summarize_ms(durations),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', default='asgi,wsgi', help='Servers to start and compare (default: asgi,wsgi)')
+    parser.add_argument('--url', help='Load an already running server instead of starting one')
+    parser.add_argument('--users', type=int, default=32, help='Concurrent typing users (default: 32)')
+    parser.add_argument('--duration', type=int, default=20, help='Seconds of load per server (default: 20)')
+    parser.add_argument('--workers', type=int, default=2, help='Server worker processes (default: 2)')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the query mix (default: 42)')
+    parser.add_argument('--output', help='Where to write the JSON results (default: benchmarks/load-<timestamp>.json)')
+    args = parser.parse_args()
+
+    results = []
+    if args.url:
+        targets = [('url', None)]
+    else:
+        targets = [(name.strip(), SERVERS[name.strip()]) for name in args.servers.split(',') if name.strip()]
+
+    for name, command in targets:
+        base_url = args.url or f"http://127.0.0.1:{PORT}"
+        server = None
+        if command:
+            print(f"Starting {name} server...")
+            server = subprocess.Popen(command(PORT, args.workers), cwd=os.path.dirname(os.path.abspath(__file__)))
+        try:
+            wait_until_ready(base_url)
+            print(f"Loading {base_url} with {args.users} users for {args.duration}s...")
+            row = {'server': name, 'users': args.users, **run_load(base_url, args.users, args.duration, args.seed)}
+        finally:
+            if server:
+                server.terminate()
+                server.wait(timeout=30)
+        results.append(row)
+        print(
+            f"  {name:<5} {row['requests_per_second']:>8.1f} req/s  p50 {row['p50_ms']:.1f}ms  "
+            f"p95 {row['p95_ms']:.1f}ms  p99 {row['p99_ms']:.1f}ms  errors {row['errors']}  superseded {row['superseded']}"
+        )
+
+    path = write_results('load', {'meta': run_metadata(users=args.users, duration=args.duration), 'results': results},
+                         args.output)
+    print(f"Results written to {path}")
+
+
+if __name__ == '__main__':
+    main()